@@ -0,0 +1,137 @@
+"""
+Compares chunking strategies (src/chunking.py) on a folder of documents. The
+folder is indexed once per strategy into a fresh database, and the report
+gives the row count, database size, mean tokens per row, ingest time and
+retrieval quality: file recall@limit and mean reciprocal rank.
+
+    python benchmarks/bench_chunking.py test_docs --queries queries.jsonl
+    python benchmarks/bench_chunking.py test_docs --max-tokens 256 --json chunking.json
+
+queries.jsonl holds one {"query": "...", "file": "space.txt"} per line; a
+result counts when its path ends with "file". Without --queries, sentences
+sampled from the corpus are used as queries for their own file. That checks
+self-retrieval only and favours the "sentence" strategy, so prefer real
+queries when choosing a strategy.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from config import Config  # noqa: E402
+from chunking import CHUNK_STRATEGIES, Chunker  # noqa: E402
+from document_parser import DocumentParser  # noqa: E402
+from embedding_model import EmbeddingModel  # noqa: E402
+from vector_db import VectorDB  # noqa: E402
+from app import initialize_database  # noqa: E402
+
+
+def read_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [(item["query"], item["file"]) for item in map(json.loads, f) if item.get("query")]
+
+
+def sample_queries(folder_path, count, seed=0):
+    """Reservoir-samples (sentence, its file) pairs from the corpus."""
+    rng = random.Random(seed)
+    sample = []
+    for seen, (file_path, sentence) in enumerate(DocumentParser().iter_folder(folder_path, workers=1)):
+        if len(sample) < count:
+            sample.append((sentence, file_path))
+        else:
+            slot = rng.randrange(seen + 1)
+            if slot < count:
+                sample[slot] = (sentence, file_path)
+    return sample
+
+
+def run_strategy(strategy, folder_path, embedder, query_vecs, queries, args):
+    work_dir = tempfile.mkdtemp(prefix="vectordb_chunking_")
+    db_manager = VectorDB(db_path=os.path.join(work_dir, "bench.db"), embedding_dim=embedder.get_embedding_dimension())
+    try:
+        chunker = Chunker(embedder, strategy, args.max_tokens, args.overlap)
+        started = time.perf_counter()
+        initialize_database(db_manager, DocumentParser(), embedder, folder_path, chunker=chunker)
+        ingest_seconds = time.perf_counter() - started
+        db_manager.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        stats = db_manager.stats()
+
+        hits = 0
+        reciprocal_ranks = 0.0
+        for query_vec, (_, expected) in zip(query_vecs, queries):
+            results = db_manager.search_similar_sentences(query_vec, args.limit, 2.0)
+            for rank, result in enumerate(results, start=1):
+                if result["file_path"].endswith(expected):
+                    hits += 1
+                    reciprocal_ranks += 1.0 / rank
+                    break
+    finally:
+        db_manager.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "strategy": strategy,
+        "budget_tokens": chunker.budget(),
+        "rows": stats["sentences"],
+        "db_bytes": stats["db_bytes"],
+        "mean_chunk_tokens": stats["mean_chunk_tokens"],
+        "ingest_seconds": round(ingest_seconds, 3),
+        "recall": hits / len(queries) if queries else 0.0,
+        "mrr": round(reciprocal_ranks / len(queries), 4) if queries else 0.0,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare chunking strategies on a folder of documents.")
+    arg_parser.add_argument("folder", help="Folder of documents to index")
+    arg_parser.add_argument("--strategies", nargs="+", choices=CHUNK_STRATEGIES, default=list(CHUNK_STRATEGIES))
+    arg_parser.add_argument("--max-tokens", type=int, default=Config.CHUNK_MAX_TOKENS, help="Token budget per row")
+    arg_parser.add_argument("--overlap", type=int, default=Config.CHUNK_OVERLAP_TOKENS, help="Window overlap in tokens")
+    arg_parser.add_argument("--queries", default=None, help='JSONL of {"query": ..., "file": ...} relevance labels')
+    arg_parser.add_argument("--sample", type=int, default=200, help="Sampled queries when --queries is not given")
+    arg_parser.add_argument("--limit", type=int, default=5, help="Results per query")
+    arg_parser.add_argument("--json", dest="json_path", default=None, help="Write the results to this file")
+    args = arg_parser.parse_args()
+
+    folder_path = os.path.abspath(args.folder)
+    if not os.path.isdir(folder_path):
+        print(f"Error: Folder '{folder_path}' does not exist or is not accessible.")
+        return 1
+    # Progress messages go to stderr, the comparison to stdout
+    with redirect_stdout(sys.stderr):
+        queries = read_queries(args.queries) if args.queries else sample_queries(folder_path, args.sample)
+        # The embedding cache is shared, so every strategy after the first re-uses sentence embeddings
+        embedder = EmbeddingModel(model_name=Config.MODEL_NAME)
+        try:
+            query_vecs = embedder.get_query_embeddings([query for query, _ in queries])
+            report = [
+                run_strategy(strategy, folder_path, embedder, query_vecs, queries, args)
+                for strategy in args.strategies
+            ]
+        finally:
+            embedder.close()
+
+    source = args.queries or f"{len(queries)} sampled sentences"
+    print(f"\n{folder_path}: {len(queries)} queries ({source}), recall@{args.limit}")
+    print(f"{'strategy':<10} {'rows':>8} {'DB MB':>8} {'tok/row':>8} {'ingest s':>9} {'recall':>7} {'MRR':>7}")
+    for row in report:
+        print(
+            f"{row['strategy']:<10} {row['rows']:>8} {row['db_bytes'] / 1e6:>8.2f} "
+            f"{row['mean_chunk_tokens'] or 0:>8} {row['ingest_seconds']:>9} {row['recall']:>7.0%} {row['mrr']:>7}"
+        )
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"folder": folder_path, "queries": source, "limit": args.limit, "results": report}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Hybrid retrieval benchmark. Builds a synthetic corpus of order records whose
+sentences carry unique identifiers (ORD-0000123, ...), then looks records up
+by identifier with vector, keyword (BM25), fused (RRF) and keyword-prefiltered
+search. Reports recall@limit (whether the record's file is returned) and
+mean latency per method.
+
+The embeddings are random, so vector search cannot know which identifier a
+query names -- the situation of a real model facing an opaque product code.
+For the same reason the distance threshold defaults to 2.0 (no cut-off).
+
+    python benchmarks/bench_hybrid.py --rows 200000 --queries 200
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from vector_db import VectorDB  # noqa: E402
+
+INSERT_BATCH_ROWS = 20000
+CITIES = ["Paris", "Lyon", "Berlin", "Madrid", "Rome", "Vienna", "Prague", "Lisbon"]
+
+
+def order_sentence(i):
+    return f"Order ORD-{i:07d} for customer {i % 997} was shipped to {CITIES[i % len(CITIES)]}."
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare vector, keyword and hybrid search.")
+    arg_parser.add_argument("--rows", type=int, default=100000, help="Synthetic sentences in the corpus")
+    arg_parser.add_argument("--rows-per-file", type=int, default=50, help="Sentences per file")
+    arg_parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    arg_parser.add_argument("--queries", type=int, default=200, help="Identifier lookups per method")
+    arg_parser.add_argument("--limit", type=int, default=5, help="Results per query")
+    arg_parser.add_argument("--threshold", type=float, default=2.0, help="Maximum cosine distance")
+    arg_parser.add_argument("--json", dest="json_path", default=None, help="Write the results to this file")
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    work_dir = tempfile.mkdtemp(prefix="vectordb_hybrid_")
+    db_manager = VectorDB(db_path=os.path.join(work_dir, "bench.db"), embedding_dim=args.dim)
+    try:
+        started = time.perf_counter()
+        for start in range(0, args.rows, INSERT_BATCH_ROWS):
+            rows = range(start, min(args.rows, start + INSERT_BATCH_ROWS))
+            db_manager.insert_sentence_embeddings(
+                [f"/orders/batch_{i // args.rows_per_file:05d}.csv" for i in rows],
+                [order_sentence(i) for i in rows],
+                rng.normal(size=(len(rows), args.dim)).astype(np.float32),
+            )
+        ingest_seconds = time.perf_counter() - started
+        db_manager.warm_up()
+
+        targets = rng.choice(args.rows, size=args.queries, replace=False)
+        query_vecs = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+        methods = {
+            "vector": lambda text, vec: db_manager.search_similar_sentences(vec, args.limit, args.threshold),
+            "bm25": lambda text, vec: db_manager.lexical_search(text, args.limit),
+            "rrf": lambda text, vec: db_manager.search_hybrid(text, vec, args.limit, args.threshold, "rrf"),
+            "prefilter": lambda text, vec: db_manager.search_hybrid(
+                text, vec, args.limit, args.threshold, "prefilter"
+            ),
+        }
+        report = []
+        for name, search in methods.items():
+            hits = 0
+            started = time.perf_counter()
+            for target, query_vec in zip(targets, query_vecs):
+                text = f"ORD-{target:07d}"
+                expected = f"/orders/batch_{target // args.rows_per_file:05d}.csv"
+                hits += any(result["file_path"] == expected for result in search(text, query_vec))
+            elapsed = time.perf_counter() - started
+            report.append({
+                "method": name,
+                "recall": hits / args.queries,
+                "mean_ms": round(elapsed * 1000 / args.queries, 3),
+            })
+    finally:
+        db_manager.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{args.rows} rows, ingested at {args.rows / ingest_seconds:.0f} rows/s (with the keyword index)")
+    print(f"{'method':<10} {'recall@' + str(args.limit):>9} {'mean ms':>9}")
+    for row in report:
+        print(f"{row['method']:<10} {row['recall']:>9.0%} {row['mean_ms']:>9}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"rows": args.rows, "limit": args.limit, "results": report}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
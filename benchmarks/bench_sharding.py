@@ -0,0 +1,136 @@
+"""
+Query throughput of the sharded index (src/sharding.py) as the shard count
+grows. Builds the same synthetic corpus once per shard count, then runs the
+same queries against each and reports QPS, latency percentiles and whether
+the merged results match the first configuration.
+
+    python benchmarks/bench_sharding.py --rows 200000 --shards 1 2 4 8
+    python benchmarks/bench_sharding.py --batch 32 --json sharding.json
+
+Each shard process is limited to --blas-threads BLAS threads (default 1), so
+the numbers show scaling across processes rather than inside one matrix
+product. Speedups are bounded by the number of CPU cores.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sharding import ShardedVectorDB  # noqa: E402
+
+INSERT_BATCH_ROWS = 20000
+
+
+def make_corpus(rows, dim, files, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    file_paths = [f"/bench/file_{i % files:05d}.txt" for i in range(rows)]
+    sentences = [f"synthetic sentence {i}" for i in range(rows)]
+    return file_paths, sentences, vectors
+
+
+def percentile_ms(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))] * 1000, 3)
+
+
+def run_config(shard_count, corpus, queries, args):
+    file_paths, sentences, vectors = corpus
+    work_dir = tempfile.mkdtemp(prefix="vectordb_shards_")
+    db_manager = ShardedVectorDB(
+        db_path=os.path.join(work_dir, "bench.db"), shard_count=shard_count, embedding_dim=args.dim
+    )
+    try:
+        started = time.perf_counter()
+        for start in range(0, len(sentences), INSERT_BATCH_ROWS):
+            end = start + INSERT_BATCH_ROWS
+            db_manager.insert_sentence_embeddings(file_paths[start:end], sentences[start:end], vectors[start:end])
+        ingest_seconds = time.perf_counter() - started
+        db_manager.warm_up()
+
+        latencies = []
+        results = []
+        started = time.perf_counter()
+        for start in range(0, len(queries), args.batch):
+            batch = queries[start : start + args.batch]
+            batch_started = time.perf_counter()
+            if args.batch == 1:
+                found = [db_manager.search_similar_sentences(batch[0], args.limit, 2.0)]
+            else:
+                found = db_manager.search_similar_sentences_batch(batch, args.limit, 2.0)
+            latencies.append(time.perf_counter() - batch_started)
+            results.extend(found)
+        elapsed = time.perf_counter() - started
+    finally:
+        db_manager.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies.sort()
+    return {
+        "shards": shard_count,
+        "ingest_rows_per_second": round(len(sentences) / ingest_seconds, 1),
+        "qps": round(len(queries) / elapsed, 1),
+        "latency_ms": {"p50": percentile_ms(latencies, 0.5), "p99": percentile_ms(latencies, 0.99)},
+    }, results
+
+
+def same_results(a, b):
+    return [r["file_path"] for r in a] == [r["file_path"] for r in b] and np.allclose(
+        [r["distance"] for r in a], [r["distance"] for r in b], atol=1e-5
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark query throughput against the shard count.")
+    arg_parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="Shard counts to compare")
+    arg_parser.add_argument("--rows", type=int, default=100000, help="Synthetic sentences in the corpus")
+    arg_parser.add_argument("--files", type=int, default=2000, help="Files the sentences belong to")
+    arg_parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    arg_parser.add_argument("--queries", type=int, default=200, help="Queries per configuration")
+    arg_parser.add_argument("--batch", type=int, default=1, help="Queries sent to the shards together")
+    arg_parser.add_argument("--limit", type=int, default=10, help="Results per query")
+    arg_parser.add_argument("--blas-threads", type=int, default=1, help="BLAS threads per shard process")
+    arg_parser.add_argument("--json", dest="json_path", default=None, help="Write the results to this file")
+    args = arg_parser.parse_args()
+
+    # Read by numpy when the spawned shard processes import it
+    for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(args.blas_threads)
+
+    corpus = make_corpus(args.rows, args.dim, args.files)
+    queries = np.random.default_rng(1).normal(size=(args.queries, args.dim)).astype(np.float32)
+
+    rows = []
+    baseline = None
+    for shard_count in args.shards:
+        row, results = run_config(shard_count, corpus, queries, args)
+        if baseline is None:
+            baseline = (row["qps"], results)
+        row["speedup"] = round(row["qps"] / baseline[0], 2)
+        row["matches_first"] = sum(same_results(a, b) for a, b in zip(results, baseline[1])) / len(queries)
+        rows.append(row)
+
+    print(f"\n{args.rows} rows x {args.dim} dims, {args.queries} queries in batches of {args.batch}, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'shards':>6} {'QPS':>9} {'speedup':>8} {'p50 ms':>9} {'p99 ms':>9} {'ingest rows/s':>14} {'match':>6}")
+    for row in rows:
+        print(
+            f"{row['shards']:>6} {row['qps']:>9} {row['speedup']:>7}x {row['latency_ms']['p50']:>9} "
+            f"{row['latency_ms']['p99']:>9} {row['ingest_rows_per_second']:>14} {row['matches_first']:>6.0%}"
+        )
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"rows": args.rows, "dim": args.dim, "batch": args.batch, "results": rows}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
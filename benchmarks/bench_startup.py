@@ -0,0 +1,116 @@
+"""
+Startup benchmark: import time of the application modules and latency of the
+first query, each measured in a fresh interpreter.
+
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --db data/db/document_embeddings.db --json startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+MODULES = ["config", "vector_db", "document_parser", "embedding_model", "app"]
+
+# Each probe runs in a new interpreter and prints a JSON dict of timings in seconds
+IMPORT_PROBE = """
+import json, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"import": time.perf_counter() - started}}))
+"""
+
+QUERY_PROBE = """
+import json, time
+started = time.perf_counter()
+from embedding_model import EmbeddingModel
+from vector_db import VectorDB
+timings = {{"import": time.perf_counter() - started}}
+
+started = time.perf_counter()
+embedder = EmbeddingModel(use_cache=False)
+if {prewarm}:
+    embedder.prewarm()
+timings["init"] = time.perf_counter() - started
+time.sleep({think_time})  # Stands in for the user typing a query
+
+started = time.perf_counter()
+query_vec = embedder.get_sentence_embedding("how do I reset my password")
+timings["first_embedding"] = time.perf_counter() - started
+
+db_path = {db_path!r}
+if db_path:
+    started = time.perf_counter()
+    db_manager = VectorDB(db_path=db_path)
+    db_manager.search_similar_sentences(query_vec, limit=5)
+    timings["first_search"] = time.perf_counter() - started
+    db_manager.close()
+
+started = time.perf_counter()
+embedder.get_sentence_embedding("where is the invoice for order 10248")
+timings["second_embedding"] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+
+def run_probe(code):
+    """Runs a probe in a fresh interpreter and returns its timings."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    # The last line is the JSON; the rest is application output
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_timings(code, repeat):
+    runs = [run_probe(code) for _ in range(repeat)]
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure import and first-query latency.")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is reported)")
+    arg_parser.add_argument("--db", default=None, help="Also time opening this database and the first search")
+    arg_parser.add_argument("--think-time", type=float, default=2.0, help="Seconds between startup and the first query")
+    arg_parser.add_argument("--json", dest="json_path", default=None, help="Write the results to this file")
+    args = arg_parser.parse_args()
+
+    results = {"imports": {}, "first_query": {}}
+    print(f"{'module':<18} {'import ms':>10}")
+    for module in MODULES:
+        try:
+            timings = median_timings(IMPORT_PROBE.format(module=module), args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<18} {'failed':>10}  {e.stderr.strip().splitlines()[-1]}")
+            continue
+        results["imports"][module] = timings["import"]
+        print(f"{module:<18} {timings['import'] * 1000:>10.1f}")
+
+    print(f"\n{'scenario':<18} {'init ms':>9} {'1st embed ms':>13} {'1st search ms':>14} {'2nd embed ms':>13}")
+    for scenario, prewarm in (("lazy", False), ("prewarm", True)):
+        code = QUERY_PROBE.format(prewarm=prewarm, think_time=args.think_time, db_path=args.db)
+        try:
+            timings = median_timings(code, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{scenario:<18} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        results["first_query"][scenario] = timings
+        first_search = f"{timings['first_search'] * 1000:.1f}" if "first_search" in timings else "-"
+        print(
+            f"{scenario:<18} {timings['init'] * 1000:>9.1f} {timings['first_embedding'] * 1000:>13.1f} "
+            f"{first_search:>14} {timings['second_embedding'] * 1000:>13.1f}"
+        )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
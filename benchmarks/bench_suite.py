@@ -0,0 +1,279 @@
+"""
+Reproducible benchmark suite for ingestion and search. Generates a synthetic
+corpus (benchmarks/synthetic_corpus.py), ingests it through the real
+pipeline with the deterministic "fake" embedding backend (src/fake_backend.py),
+so no transformer is loaded, then runs the same queries in every search mode.
+
+Reports ingestion throughput (files/s, sentences/s, per stage), database
+size, and per mode the index build time, query latency percentiles, QPS and
+recall@limit against exact search. Results are written as JSON tagged with
+the git commit, so runs can be compared between commits:
+
+    python benchmarks/bench_suite.py --files 2000 --json results/base.json
+    python benchmarks/bench_suite.py --files 2000 --json results/new.json --compare results/base.json
+
+--backend torch measures the real model instead (slow; recall is still
+measured against exact search with the same model).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+
+from config import Config  # noqa: E402
+from chunking import Chunker  # noqa: E402
+from document_parser import DocumentParser  # noqa: E402
+from embedding_model import EmbeddingModel  # noqa: E402
+from vector_db import SEARCH_MODES, VectorDB  # noqa: E402
+from app import initialize_database  # noqa: E402
+from synthetic_corpus import DEFAULT_MIX, generate_corpus, make_queries  # noqa: E402
+
+SUITE_VERSION = 1
+EXACT_MODE = "matrix"
+ALL_MODES = SEARCH_MODES + ("ivf",)  # "ivf" is the matrix mode with the approximate IVF index
+
+
+def percentile_ms(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))] * 1000, 3)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_keys(results):
+    return {(result["file_path"], result["sentence"]) for result in results}
+
+
+def ingest(corpus_dir, db_path, embedder, args):
+    db_manager = VectorDB(db_path=db_path, embedding_dim=embedder.get_embedding_dimension())
+    try:
+        started = time.perf_counter()
+        report = initialize_database(
+            db_manager, DocumentParser(), embedder, corpus_dir, chunker=Chunker(embedder, args.chunking)
+        )
+        seconds = time.perf_counter() - started
+        db_manager.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        stats = db_manager.stats()
+    finally:
+        db_manager.close()
+    return {
+        "seconds": round(seconds, 3),
+        "files": len(report["added"]) + len(report["modified"]),
+        "failed": len(report["failed"]),
+        "rows": stats["sentences"],
+        "files_per_second": round(stats["files"] / seconds, 2),
+        "sentences_per_second": round(stats["sentences"] / seconds, 1),
+        "db_bytes": stats["db_bytes"],
+        "stages": report["stages"],
+    }
+
+
+def run_mode(mode, db_path, query_vecs, exact, args):
+    """Searches every query in one mode. Returns the mode's metrics and its result lists."""
+    search_mode = EXACT_MODE if mode == "ivf" else mode
+    # Opening builds the mmap store and quantized codes, so it counts towards the build time
+    started = time.perf_counter()
+    db_manager = VectorDB(db_path=db_path, search_mode=search_mode)
+    try:
+        if mode == "ivf":
+            db_manager.build_ann_index()
+        else:
+            db_manager.warm_up()
+        build_seconds = time.perf_counter() - started
+
+        queries = query_vecs[: args.python_queries] if mode == "python" else query_vecs
+        latencies = []
+        found = []
+        started = time.perf_counter()
+        for query_vec in queries:
+            query_started = time.perf_counter()
+            found.append(db_manager.search_similar_sentences(
+                query_vec, args.limit, args.threshold, approximate=(mode == "ivf")
+            ))
+            latencies.append(time.perf_counter() - query_started)
+        elapsed = time.perf_counter() - started
+    finally:
+        db_manager.close()
+
+    latencies.sort()
+    recall = None
+    if exact is not None:
+        overlaps = [
+            len(result_keys(results) & result_keys(expected)) / max(1, len(expected))
+            for results, expected in zip(found, exact)
+        ]
+        recall = round(float(np.mean(overlaps)), 4) if overlaps else None
+    return {
+        "mode": mode,
+        "queries": len(queries),
+        "build_seconds": round(build_seconds, 3),
+        "qps": round(len(queries) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile_ms(latencies, 0.5),
+            "p95": percentile_ms(latencies, 0.95),
+            "p99": percentile_ms(latencies, 0.99),
+        },
+        "recall": recall,
+    }, found
+
+
+def print_report(results):
+    ingest_stats = results["ingest"]
+    corpus = results["corpus"]
+    print(
+        f"\nCorpus: {corpus['files']} files, {corpus['sentences']} sentences, {corpus['bytes'] / 1e6:.1f} MB "
+        f"({results['params']['backend']} backend, commit {results['commit'] or 'unknown'})"
+    )
+    print(
+        f"Ingestion: {ingest_stats['seconds']} s, {ingest_stats['files_per_second']} files/s, "
+        f"{ingest_stats['sentences_per_second']} rows/s, {ingest_stats['rows']} rows, "
+        f"DB {ingest_stats['db_bytes'] / 1e6:.1f} MB"
+    )
+    for stage in ingest_stats["stages"]:
+        print(f"  {stage['stage']:<8} {stage['sentences_per_second']:>10.1f} sent/s  busy {stage['utilization']:.0%}")
+    print(f"{'mode':<8} {'build s':>8} {'QPS':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'recall':>7}")
+    for row in results["search"]:
+        recall = "-" if row["recall"] is None else f"{row['recall']:.1%}"
+        print(
+            f"{row['mode']:<8} {row['build_seconds']:>8} {row['qps']:>9} {row['latency_ms']['p50']:>9} "
+            f"{row['latency_ms']['p95']:>9} {row['latency_ms']['p99']:>9} {recall:>7}"
+        )
+
+
+def print_comparison(results, baseline):
+    """Prints the change of the headline numbers against an earlier results file."""
+
+    def change(new, old):
+        return f"{(new - old) / old:+.1%}" if old else "n/a"
+
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created', '?')}):")
+    if baseline.get("params", {}).get("files") != results["params"]["files"]:
+        print("  Warning: the corpora differ in size, so the numbers are not directly comparable.")
+    old, new = baseline["ingest"], results["ingest"]
+    print(f"  ingestion rows/s  {old['sentences_per_second']:>10} -> {new['sentences_per_second']:>10}  "
+          f"{change(new['sentences_per_second'], old['sentences_per_second'])}")
+    print(f"  DB bytes          {old['db_bytes']:>10} -> {new['db_bytes']:>10}  "
+          f"{change(new['db_bytes'], old['db_bytes'])}")
+    old_modes = {row["mode"]: row for row in baseline.get("search", [])}
+    for row in results["search"]:
+        before = old_modes.get(row["mode"])
+        if before is None:
+            continue
+        print(
+            f"  {row['mode']:<8} p50 ms {before['latency_ms']['p50']:>8} -> {row['latency_ms']['p50']:>8}  "
+            f"{change(row['latency_ms']['p50'], before['latency_ms']['p50']):>7}   "
+            f"recall {before['recall']} -> {row['recall']}"
+        )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark ingestion and search on a synthetic corpus.")
+    arg_parser.add_argument("--files", type=int, default=500, help="Documents in the synthetic corpus")
+    arg_parser.add_argument("--sentences", type=int, default=40, help="Mean sentences per document")
+    arg_parser.add_argument("--mix", default=DEFAULT_MIX, help="Relative share of txt, csv, xml and pdf files")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    arg_parser.add_argument("--corpus", default=None, help="Use this folder instead of generating a corpus")
+    arg_parser.add_argument("--backend", default="fake", help="Embedding backend: fake, torch or onnx")
+    arg_parser.add_argument("--chunking", default=Config.CHUNK_STRATEGY, help="Chunking strategy")
+    arg_parser.add_argument("--parse-workers", type=int, default=Config.PARSE_WORKERS, help="Parser processes")
+    arg_parser.add_argument("--modes", nargs="+", choices=ALL_MODES, default=list(ALL_MODES))
+    arg_parser.add_argument("--queries", type=int, default=200, help="Queries per search mode")
+    arg_parser.add_argument("--python-queries", type=int, default=20, help="Queries for the slow python mode")
+    arg_parser.add_argument("--limit", type=int, default=10, help="Results per query")
+    arg_parser.add_argument("--threshold", type=float, default=2.0, help="Maximum cosine distance")
+    arg_parser.add_argument("--keep", default=None, help="Keep the corpus and database in this folder")
+    arg_parser.add_argument("--json", dest="json_path", default=None, help="Write the results to this file")
+    arg_parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    args = arg_parser.parse_args()
+
+    # Every query is new, but cached results would still hide repeated searches
+    Config.RESULT_CACHE_SIZE = 0
+    Config.PARSE_WORKERS = args.parse_workers
+    work_dir = args.keep or tempfile.mkdtemp(prefix="vectordb_suite_")
+    os.makedirs(work_dir, exist_ok=True)
+    db_path = os.path.join(work_dir, "suite.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    try:
+        # Progress messages go to stderr, the report to stdout
+        with redirect_stdout(sys.stderr):
+            if args.corpus:
+                corpus_dir = os.path.abspath(args.corpus)
+                corpus = {"files": len(DocumentParser().list_files(corpus_dir)), "sentences": None, "bytes": 0}
+            else:
+                corpus_dir = os.path.join(work_dir, "corpus")
+                shutil.rmtree(corpus_dir, ignore_errors=True)
+                corpus = generate_corpus(corpus_dir, args.files, args.sentences, args.mix, args.seed)
+
+            embedder = EmbeddingModel(model_name=Config.MODEL_NAME, use_cache=False, backend=args.backend)
+            try:
+                ingest_stats = ingest(corpus_dir, db_path, embedder, args)
+                query_texts = [query for query, _ in make_queries(args.queries, seed=args.seed + 1)]
+                query_vecs = embedder.get_query_embeddings(query_texts)
+            finally:
+                embedder.close()
+            if corpus["sentences"] is None:
+                corpus["sentences"] = ingest_stats["rows"]
+
+            search = []
+            exact = None
+            # The exact mode runs first and is the reference for recall
+            for mode in sorted(args.modes, key=lambda mode: mode != EXACT_MODE):
+                row, found = run_mode(mode, db_path, query_vecs, exact, args)
+                if mode == EXACT_MODE:
+                    exact = found
+                    row["recall"] = 1.0
+                search.append(row)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "suite_version": SUITE_VERSION,
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "params": dict(vars(args), model=Config.MODEL_NAME),
+        "corpus": corpus,
+        "ingest": ingest_stats,
+        "search": search,
+    }
+    print_report(results)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
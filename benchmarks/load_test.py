@@ -0,0 +1,174 @@
+"""
+Load test for the HTTP search service (src/server.py). Keeps --concurrency
+keep-alive connections busy with POST /search requests and reports latency
+percentiles and throughput.
+
+    python src/server.py &
+    python benchmarks/load_test.py --concurrency 64 --duration 20
+    python benchmarks/load_test.py --requests 5000 --unique --json load.json
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from collections import Counter
+
+QUERIES = [
+    "cats and dogs as pets",
+    "largest planet in the solar system",
+    "customer orders shipped to France",
+    "how do animals communicate",
+    "distance between stars",
+    "invoice total for an order",
+    "loyal companions",
+    "objects orbiting the sun",
+    "wild animals in the forest",
+    "shipping address of a customer",
+]
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """Sends one request and returns (status, parsed JSON body)."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.writer.write(
+            (
+                f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1") + body
+        )
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, json.loads(data) if data else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+async def worker(host, port, args, state):
+    connection = Connection(host, port)
+    rng = random.Random(state["seed"] + id(connection))
+    try:
+        while state["issued"] < args.requests and time.perf_counter() < state["deadline"]:
+            state["issued"] += 1
+            query = rng.choice(QUERIES)
+            if args.unique:
+                # Defeats the query and result caches
+                query = f"{query} {state['issued']}"
+            started = time.perf_counter()
+            try:
+                status, _ = await connection.request("POST", "/search", {"query": query, "limit": args.limit})
+            except (ConnectionError, asyncio.IncompleteReadError, IndexError, ValueError):
+                connection.close()
+                status = "connection-error"
+            state["latencies"].append(time.perf_counter() - started)
+            state["statuses"][status] += 1
+    finally:
+        connection.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def run(args):
+    status_connection = Connection(args.host, args.port)
+    status, health = await status_connection.request("GET", "/health")
+    if status != 200:
+        raise SystemExit(f"Server is not healthy: {status} {health}")
+
+    state = {
+        "issued": 0,
+        "deadline": time.perf_counter() + args.duration,
+        "latencies": [],
+        "statuses": Counter(),
+        "seed": args.seed,
+    }
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(args.host, args.port, args, state) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    _, index_status = await status_connection.request("GET", "/index-status")
+    status_connection.close()
+
+    latencies = sorted(state["latencies"])
+    ok = state["statuses"].get(200, 0)
+    return {
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "ok": ok,
+        "statuses": {str(key): count for key, count in state["statuses"].items()},
+        "seconds": round(elapsed, 3),
+        "qps": round(ok / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p90": round(percentile(latencies, 0.90) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "server_batching": (index_status or {}).get("server", {}).get("batching"),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Load test the HTTP search service.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--concurrency", type=int, default=32, help="Concurrent keep-alive connections")
+    arg_parser.add_argument("--requests", type=int, default=10 ** 9, help="Stop after this many requests")
+    arg_parser.add_argument("--duration", type=float, default=10.0, help="Stop after this many seconds")
+    arg_parser.add_argument("--limit", type=int, default=5, help="Results per query")
+    arg_parser.add_argument("--unique", action="store_true", help="Make every query distinct")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--json", dest="json_path", default=None, help="Write the results to this file")
+    args = arg_parser.parse_args()
+
+    report = asyncio.run(run(args))
+    latency = report["latency_ms"]
+    print(
+        f"{report['requests']} requests in {report['seconds']}s with {report['concurrency']} connections: "
+        f"{report['qps']} QPS"
+    )
+    print(
+        f"latency ms  p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  "
+        f"max {latency['max']}  mean {latency['mean']}"
+    )
+    print(f"status codes {report['statuses']}")
+    if report["server_batching"]:
+        print(f"server batching {report['server_batching']}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
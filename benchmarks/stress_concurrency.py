@@ -0,0 +1,157 @@
+"""
+Concurrency stress test for VectorDB: reader threads search while a writer
+thread keeps re-indexing files (rows and manifest replaced in one
+transaction), all on one shared VectorDB instance.
+
+Checks that every search sees a consistent snapshot (the in-memory matrix
+and the SQLite read transaction hold the same number of rows) and that reads
+and writes both make progress. Exits non-zero if either check fails.
+
+    python benchmarks/stress_concurrency.py --readers 8 --duration 10
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from vector_db import VectorDB  # noqa: E402
+
+
+def percentile_ms(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1000, 3)
+
+
+def seed_database(db_manager, args, rng):
+    for file_no in range(args.files):
+        write_file(db_manager, file_no, 0, args, rng)
+
+
+def write_file(db_manager, file_no, version, args, rng):
+    """Replaces one file's sentences, the way re-indexing does."""
+    file_path = f"/stress/file_{file_no:04d}.txt"
+    sentences = [f"file {file_no} version {version} sentence {i}" for i in range(args.sentences)]
+    vectors = rng.normal(size=(args.sentences, args.dim)).astype(np.float32)
+    db_manager.replace_file(
+        file_path, sentences, vectors, None, None, 0, float(version), str(version), "1", "stress"
+    )
+
+
+def writer(db_manager, args, state):
+    rng = np.random.default_rng(1)
+    version = 0
+    while not state["stop"].is_set():
+        version += 1
+        started = time.perf_counter()
+        state["writing"] += 1
+        try:
+            write_file(db_manager, int(rng.integers(args.files)), version, args, rng)
+        except Exception as e:
+            state["errors"].append(f"writer: {e!r}")
+        finally:
+            state["writing"] -= 1
+        state["write_latencies"].append(time.perf_counter() - started)
+
+
+def reader(db_manager, args, state, seed):
+    rng = np.random.default_rng(seed)
+    latencies = []
+    while not state["stop"].is_set():
+        query = rng.normal(size=args.dim).astype(np.float32)
+        started = time.perf_counter()
+        try:
+            results = db_manager.search_similar_sentences(query, limit=args.limit, distance_threshold=2.0)
+            if not results:
+                state["errors"].append("reader: empty result set")
+            # The matrix snapshot and the read transaction must agree
+            with db_manager._read_snapshot_loaded() as (conn, snapshot):
+                stored = conn.execute("SELECT COUNT(*) FROM sentences").fetchone()[0]
+            if stored != snapshot.count:
+                state["mismatches"] += 1
+        except Exception as e:
+            state["errors"].append(f"reader: {e!r}")
+        latencies.append(time.perf_counter() - started)
+        if state["writing"]:
+            state["reads_during_writes"] += 1
+    state["read_latencies"].extend(latencies)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Stress VectorDB with concurrent reads and writes.")
+    arg_parser.add_argument("--readers", type=int, default=4, help="Searching threads")
+    arg_parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run")
+    arg_parser.add_argument("--files", type=int, default=200, help="Files in the database")
+    arg_parser.add_argument("--sentences", type=int, default=50, help="Sentences per file")
+    arg_parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    arg_parser.add_argument("--limit", type=int, default=10, help="Results per search")
+    arg_parser.add_argument("--json", dest="json_path", default=None, help="Write the results to this file")
+    args = arg_parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="vectordb_stress_")
+    db_manager = VectorDB(db_path=os.path.join(work_dir, "stress.db"), embedding_dim=args.dim)
+    try:
+        seed_database(db_manager, args, np.random.default_rng(0))
+        db_manager.warm_up()
+
+        state = {
+            "stop": threading.Event(),
+            "writing": 0,
+            "reads_during_writes": 0,
+            "mismatches": 0,
+            "errors": [],
+            "read_latencies": [],
+            "write_latencies": [],
+        }
+        threads = [threading.Thread(target=writer, args=(db_manager, args, state))]
+        threads += [
+            threading.Thread(target=reader, args=(db_manager, args, state, seed))
+            for seed in range(args.readers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        state["stop"].set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        db_manager.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    reads, writes = len(state["read_latencies"]), len(state["write_latencies"])
+    report = {
+        "readers": args.readers,
+        "rows": args.files * args.sentences,
+        "seconds": round(elapsed, 3),
+        "reads": reads,
+        "writes": writes,
+        "reads_per_second": round(reads / elapsed, 1),
+        "file_rewrites_per_second": round(writes / elapsed, 1),
+        "reads_during_writes": state["reads_during_writes"],
+        "read_ms": {"p50": percentile_ms(state["read_latencies"], 0.5), "p99": percentile_ms(state["read_latencies"], 0.99)},
+        "write_ms": {"p50": percentile_ms(state["write_latencies"], 0.5), "p99": percentile_ms(state["write_latencies"], 0.99)},
+        "snapshot_mismatches": state["mismatches"],
+        "errors": state["errors"][:10],
+    }
+    print(json.dumps(report, indent=2))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    ok = reads and writes and state["reads_during_writes"] and not state["mismatches"] and not state["errors"]
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Synthetic corpus generator for the benchmarks: a reproducible mix of .txt,
+.csv, .xml and .pdf files of configurable size. Every file is about one of a
+fixed set of topics, and its sentences mix that topic's vocabulary with
+common words, so searches have real neighbours to find.
+
+    python benchmarks/synthetic_corpus.py corpus --files 1000 --sentences 40
+    python benchmarks/synthetic_corpus.py corpus --mix txt=1,pdf=1 --seed 7
+
+The same arguments always produce byte-identical files. PDFs are written
+directly (uncompressed Helvetica text), so no PDF library is needed.
+"""
+import os
+import csv
+import json
+import random
+import argparse
+from xml.sax.saxutils import escape
+
+TOPICS = {
+    "astronomy": "galaxy nebula telescope orbit comet planet star asteroid eclipse cosmos quasar supernova",
+    "cooking": "recipe oven flour garlic simmer butter spice dough sauce kitchen roast pastry",
+    "finance": "invoice budget equity dividend ledger interest loan audit revenue margin bond portfolio",
+    "medicine": "patient dosage symptom clinic vaccine therapy diagnosis surgeon fever tissue pulse allergy",
+    "networking": "router packet latency firewall protocol socket bandwidth switch gateway subnet cable proxy",
+    "gardening": "compost seedling pruning soil mulch orchard blossom irrigation trellis weed harvest tulip",
+    "shipping": "container freight warehouse pallet customs vessel cargo courier manifest harbor tracking dock",
+    "music": "melody rhythm chord violin tempo orchestra lyric guitar harmony concert rehearsal drum",
+}
+COMMON_WORDS = (
+    "the a of and to in is was for on with as by at from that this it be are were has have had "
+    "new old large small early late first last many several each other same different important "
+    "report team system process result change plan review period area group level part order"
+).split()
+FILE_TYPES = ("txt", "csv", "xml", "pdf")
+DEFAULT_MIX = "txt=4,csv=2,xml=2,pdf=1"
+TOPIC_WORD_SHARE = 0.45  # Fraction of words drawn from the file's topic
+PDF_LINE_CHARS = 90
+PDF_LINES_PER_PAGE = 60
+
+
+def parse_mix(mix):
+    """Parses "txt=4,csv=2" into {"txt": 4, "csv": 2}."""
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip().lower()
+        if kind not in FILE_TYPES:
+            raise ValueError(f"Unknown file type '{kind}' in mix. Expected some of {FILE_TYPES}.")
+        weights[kind] = float(weight or 1)
+    return weights
+
+
+def make_sentence(rng, topic, min_words=6, max_words=16):
+    """One sentence mixing the topic's words with common words."""
+    topic_words = TOPICS[topic].split()
+    words = [
+        rng.choice(topic_words) if rng.random() < TOPIC_WORD_SHARE else rng.choice(COMMON_WORDS)
+        for _ in range(rng.randint(min_words, max_words))
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def make_queries(count, seed=1):
+    """Held-out query sentences drawn like the corpus, as (query, topic) pairs."""
+    rng = random.Random(seed)
+    topics = sorted(TOPICS)
+    queries = []
+    for _ in range(count):
+        topic = rng.choice(topics)
+        queries.append((make_sentence(rng, topic, 4, 8), topic))
+    return queries
+
+
+def write_txt(path, sentences, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, len(sentences), 5):
+            f.write(" ".join(sentences[start : start + 5]) + "\n\n")
+
+
+def write_csv(path, sentences, rng):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "quantity", "description"])
+        for i, sentence in enumerate(sentences, start=1):
+            writer.writerow([i, sentence.split()[0].lower(), rng.randint(1, 500), sentence])
+
+
+def write_xml(path, sentences, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<catalog>\n')
+        for i in range(0, len(sentences), 2):
+            f.write(f'  <item id="{i // 2 + 1}">\n')
+            f.write(f"    <title>{escape(sentences[i])}</title>\n")
+            if i + 1 < len(sentences):
+                f.write(f"    <price>{rng.randint(1, 999)}.{rng.randint(0, 99):02d}</price>\n")
+                f.write(f"    <description>{escape(sentences[i + 1])}</description>\n")
+            f.write("  </item>\n")
+        f.write("</catalog>\n")
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, sentences, rng):
+    """Writes a minimal PDF: one uncompressed Helvetica text stream per page."""
+    lines, line = [], ""
+    for word in " ".join(sentences).split():
+        if line and len(line) + 1 + len(word) > PDF_LINE_CHARS:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    pages = [lines[i : i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+
+    # Objects 1-3 are the catalog, the page tree and the font; then a content stream and a page per page
+    objects = {3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    page_ids = []
+    for number, page_lines in enumerate(pages):
+        content_id, page_id = 4 + 2 * number, 5 + 2 * number
+        text = " ".join(f"({_pdf_escape(page_line)}) Tj T*" for page_line in page_lines)
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text} ET".encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("latin-1")
+        page_ids.append(page_id)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number in range(1, len(objects) + 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref_offset = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+WRITERS = {"txt": write_txt, "csv": write_csv, "xml": write_xml, "pdf": write_pdf}
+
+
+def generate_corpus(output_dir, files=100, sentences=40, mix=DEFAULT_MIX, seed=0):
+    """
+    Writes `files` documents of about `sentences` sentences each (between half
+    and one and a half times that) into output_dir. Returns a summary dict
+    with the file count and sentence count per type and the byte total.
+    """
+    rng = random.Random(seed)
+    weights = parse_mix(mix)
+    kinds = sorted(weights)
+    topics = sorted(TOPICS)
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {kind: {"files": 0, "sentences": 0} for kind in kinds}
+    total_bytes = 0
+    for i in range(files):
+        kind = rng.choices(kinds, weights=[weights[k] for k in kinds])[0]
+        topic = topics[i % len(topics)]
+        count = rng.randint(max(1, sentences // 2), max(1, sentences * 3 // 2))
+        file_sentences = [make_sentence(rng, topic) for _ in range(count)]
+        # Sub-folders of 100 files keep directory listings short
+        folder = os.path.join(output_dir, f"part_{i // 100:04d}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{topic}_{i:06d}.{kind}")
+        WRITERS[kind](path, file_sentences, rng)
+        summary[kind]["files"] += 1
+        summary[kind]["sentences"] += count
+        total_bytes += os.path.getsize(path)
+    return {
+        "files": files,
+        "sentences": sum(item["sentences"] for item in summary.values()),
+        "bytes": total_bytes,
+        "by_type": summary,
+        "seed": seed,
+        "mix": mix,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate a reproducible synthetic document corpus.")
+    arg_parser.add_argument("output_dir", help="Folder to write the corpus into")
+    arg_parser.add_argument("--files", type=int, default=100, help="Number of documents")
+    arg_parser.add_argument("--sentences", type=int, default=40, help="Mean sentences per document")
+    arg_parser.add_argument("--mix", default=DEFAULT_MIX, help="Relative share of each file type")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = arg_parser.parse_args()
+
+    summary = generate_corpus(args.output_dir, args.files, args.sentences, args.mix, args.seed)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
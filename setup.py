@@ -13,6 +13,9 @@ setup(
         "PyPDF2>=3.0.1",
         "tqdm>=4.65.0",
     ],
+    extras_require={
+        "onnx": ["onnxruntime>=1.15", "onnx>=1.14"],
+    },
     python_requires=">=3.8",
     author="Your Name",
     description="An AI-powered document search application",
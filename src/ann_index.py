@@ -0,0 +1,245 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+INDEX_FORMAT_VERSION = 1
+ASSIGN_BATCH_ROWS = 8192  # Rows assigned to centroids at once, bounds the (rows, k) score matrix
+
+
+def _nearest_centroids(vectors, centroids, spherical):
+    """Returns the index of the closest centroid for each row, in batches."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    centroid_norms = None if spherical else np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, len(vectors), ASSIGN_BATCH_ROWS):
+        scores = vectors[start : start + ASSIGN_BATCH_ROWS] @ centroids.T
+        if not spherical:
+            # argmin ||x - c||^2 == argmax (2 x.c - ||c||^2)
+            scores = 2 * scores - centroid_norms
+        assignments[start : start + ASSIGN_BATCH_ROWS] = np.argmax(scores, axis=1)
+    return assignments
+
+
+def kmeans(vectors, n_clusters, n_iter=20, seed=0, spherical=False):
+    """
+    Lloyd's k-means in numpy. With spherical=True centroids are kept at unit
+    length and points are assigned by inner product (cosine k-means).
+    Returns (centroids, assignments).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n_clusters = min(n_clusters, len(vectors))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    assignments = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(n_iter):
+        assignments = _nearest_centroids(vectors, centroids, spherical)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_clusters)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids[filled] = sums / counts[filled, None]
+
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Re-seed empty clusters with random points so every list gets used
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids /= norms
+
+    return centroids, _nearest_centroids(vectors, centroids, spherical)
+
+
+class IVFIndex:
+    """
+    Inverted-file index for approximate inner-product search over unit vectors.
+
+    Vectors are partitioned by cosine k-means into n_lists coarse cells. A query
+    only scans the nprobe cells whose centroids are closest to it, trading
+    recall for latency.
+    """
+
+    def __init__(self, dim, n_lists):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.centroids = None
+        self.list_ids = []
+        self.list_vectors = []
+        # Rows added since the last consolidation, merged lazily per list
+        self._pending = []
+        self.dirty = False
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @property
+    def count(self):
+        stored = sum(len(ids) for ids in self.list_ids)
+        pending = sum(len(ids) for items in self._pending for ids, _ in items)
+        return stored + pending
+
+    def train(self, vectors, n_iter=20, seed=0):
+        """Learns the coarse centroids and empties all lists."""
+        self.centroids, _ = kmeans(vectors, self.n_lists, n_iter=n_iter, seed=seed, spherical=True)
+        self.n_lists = len(self.centroids)
+        self.reset()
+
+    def reset(self):
+        """Removes all vectors but keeps the trained centroids."""
+        self.list_ids = [np.empty(0, dtype=np.int64) for _ in range(self.n_lists)]
+        self.list_vectors = [np.empty((0, self.dim), dtype=np.float32) for _ in range(self.n_lists)]
+        self._pending = [[] for _ in range(self.n_lists)]
+        self.dirty = True
+
+    def add(self, ids, vectors):
+        """Assigns unit vectors to their nearest list."""
+        if not self.is_trained:
+            raise RuntimeError("IVF index must be trained before adding vectors.")
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        assignments = _nearest_centroids(vectors, self.centroids, spherical=True)
+        for list_no in np.unique(assignments):
+            mask = assignments == list_no
+            self._pending[list_no].append((ids[mask], vectors[mask]))
+        self.dirty = True
+
+    def remove(self, ids):
+        """Drops the given ids from every list. Returns the number removed."""
+        ids = np.asarray(ids, dtype=np.int64)
+        removed = 0
+        for list_no in range(self.n_lists):
+            self._consolidate(list_no)
+            keep = ~np.isin(self.list_ids[list_no], ids)
+            removed += int(len(keep) - keep.sum())
+            self.list_ids[list_no] = self.list_ids[list_no][keep]
+            self.list_vectors[list_no] = self.list_vectors[list_no][keep]
+        if removed:
+            self.dirty = True
+        return removed
+
+    def max_id(self):
+        """Returns the largest indexed id, or 0 if the index is empty."""
+        for list_no in range(self.n_lists):
+            self._consolidate(list_no)
+        return max((int(ids.max()) for ids in self.list_ids if len(ids)), default=0)
+
+    def _consolidate(self, list_no):
+        """Merges pending rows of one list into its contiguous arrays."""
+        pending = self._pending[list_no]
+        if not pending:
+            return
+        self.list_ids[list_no] = np.concatenate([self.list_ids[list_no]] + [ids for ids, _ in pending])
+        self.list_vectors[list_no] = np.concatenate(
+            [self.list_vectors[list_no]] + [vectors for _, vectors in pending]
+        )
+        self._pending[list_no] = []
+
+    def search(self, query_vec, k, nprobe):
+        """Returns (ids, similarities) of the approximate top-k rows, best first."""
+        if not self.is_trained or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query_vec = np.asarray(query_vec, dtype=np.float32)
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query_vec
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        for list_no in probe:
+            self._consolidate(list_no)
+
+        ids = np.concatenate([self.list_ids[list_no] for list_no in probe])
+        if len(ids) == 0:
+            return ids, np.empty(0, dtype=np.float32)
+        similarities = np.concatenate([self.list_vectors[list_no] @ query_vec for list_no in probe])
+        k = min(k, len(ids))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return ids[top], similarities[top]
+
+    def save(self, path):
+        """Writes the index to an .npz file."""
+        for list_no in range(self.n_lists):
+            self._consolidate(list_no)
+        sizes = np.array([len(ids) for ids in self.list_ids], dtype=np.int64)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=np.array(INDEX_FORMAT_VERSION),
+                dim=np.array(self.dim),
+                centroids=self.centroids,
+                list_sizes=sizes,
+                ids=np.concatenate(self.list_ids),
+                vectors=np.concatenate(self.list_vectors),
+            )
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        """Reads an index written by save()."""
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_FORMAT_VERSION:
+                raise ValueError(f"Unsupported IVF index version in '{path}'.")
+            index = cls(int(data["dim"]), len(data["centroids"]))
+            index.centroids = data["centroids"]
+            index.reset()
+            bounds = np.concatenate(([0], np.cumsum(data["list_sizes"])))
+            ids, vectors = data["ids"], data["vectors"]
+            for list_no in range(index.n_lists):
+                index.list_ids[list_no] = ids[bounds[list_no] : bounds[list_no + 1]]
+                index.list_vectors[list_no] = vectors[bounds[list_no] : bounds[list_no + 1]]
+        index.dirty = False
+        return index
+
+
+def main():
+    """Command line entry point: build the IVF index or report its recall."""
+    from config import Config
+    from log_config import configure_logging
+    from vector_db import VectorDB
+
+    arg_parser = argparse.ArgumentParser(description="Manage the approximate nearest-neighbour index.")
+    arg_parser.add_argument("--db", default=Config.DB_FILE, help="Path to the embeddings database")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Train and (re)build the IVF index")
+    build.add_argument("--nlist", type=int, default=Config.ANN_N_LISTS, help="Number of coarse centroids (0 = auto)")
+
+    report = commands.add_parser("report", help="Report recall and latency against exact search")
+    report.add_argument("--queries", type=int, default=100, help="Number of sample queries")
+    report.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    report.add_argument(
+        "--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="nprobe values to evaluate"
+    )
+    args = arg_parser.parse_args()
+    configure_logging()
+
+    if not os.path.isfile(args.db):
+        print(f"Error: Database '{args.db}' does not exist.")
+        sys.exit(1)
+    db_manager = VectorDB(db_path=args.db)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        db_manager.build_ann_index(n_lists=args.nlist)
+        print(f"Index built in {time.perf_counter() - started:.2f}s")
+    else:
+        rows = db_manager.ann_recall_report(
+            n_queries=args.queries, k=args.k, nprobe_values=args.nprobe
+        )
+        print(f"\n{'nprobe':>6} {'recall@' + str(args.k):>10} {'exact ms':>9} {'ann ms':>8} {'speedup':>8}")
+        for row in rows:
+            print(
+                f"{row['nprobe']:>6} {row['recall']:>10.3f} {row['exact_ms']:>9.2f} "
+                f"{row['approx_ms']:>8.2f} {row['speedup']:>7.1f}x"
+            )
+
+    db_manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 import os
 import sys
+import hashlib
+import logging
 from document_parser import DocumentParser
 from embedding_model import EmbeddingModel
-from vector_db import VectorDB
-from tqdm import tqdm
+from sharding import open_vector_db
+from pipeline import FileJob, IngestionPipeline
 from config import Config
+from log_config import configure_logging
+from metrics import export_metrics
+
+logger = logging.getLogger(__name__)
+
 
 def convert_host_path_to_container(host_path):
     """Convert a host path to its equivalent in the container."""
@@ -25,43 +32,171 @@ def convert_container_path_to_host(container_path):
         return '/' + container_path[len(Config.HOST_ROOT):].lstrip('/')
     return container_path
 
-def initialize_database(db_manager, parser, embedder, folder_path):
+def file_content_hash(file_path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def resolve_folder_path(folder_path):
+    """Resolves a folder path typed by the user, mapping host paths into the container under Docker."""
+    # Handle relative paths
+    if not os.path.isabs(folder_path):
+        # Check if we're running in Docker (if /app exists) or locally
+        if os.path.exists("/app"):
+            # Running in Docker container
+            return os.path.join("/app", folder_path)
+        # Running locally - use current working directory
+        return os.path.abspath(folder_path)
+    # Convert absolute host path to container path only if in Docker
+    if os.path.exists("/app"):
+        return convert_host_path_to_container(folder_path)
+    return folder_path
+
+
+def plan_file_jobs(parser, embedder, folder_path, manifest, report, seen, parser_version):
     """
-    Scans the specified folder, processes files, and populates the database.
+    Lazily compares the files of a folder with the manifest and yields a
+    FileJob for every file that needs work. Unchanged files are recorded in
+    the report here, added and modified ones by the pipeline once they are
+    stored; every discovered path is added to seen. parser_version is
+    the pipeline's (see pipeline_version), so files indexed with other parser
+    or chunking settings are redone.
     """
-    print("\n--- Initializing Database ---")
-    db_manager.clear_database()  # Clear existing data
+    for container_path in parser.iter_files(folder_path):
+        # Convert container paths back to host paths for storage
+        file_path = convert_container_path_to_host(container_path)
+        seen.add(file_path)
+        try:
+            stat = os.stat(container_path)
+        except OSError as e:
+            logger.error("Could not read %s: %s", container_path, e)
+            continue
+
+        entry = manifest.get(file_path)
+        same_pipeline = (
+            entry is not None
+            and entry["parser_version"] == parser_version
+            and entry["model_name"] == embedder.model_name
+        )
+        if same_pipeline and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            report["unchanged"].append(file_path)
+            continue
+
+        content_hash = file_content_hash(container_path)
+        if same_pipeline and entry["content_hash"] == content_hash:
+            # Touched but not changed: refresh the manifest, keep the embeddings
+            report["unchanged"].append(file_path)
+            status = "touched"
+        else:
+            # Recorded as added/modified by the pipeline once the file is stored
+            status = "modified" if entry is not None else "added"
+
+        yield FileJob(
+            container_path, file_path, stat.st_size, stat.st_mtime, content_hash,
+            status, entry["sentence_count"] if entry else 0,
+        )
+
+
+def initialize_database(db_manager, parser, embedder, folder_path, full_rebuild=False, chunker=None):
+    """
+    Brings the database in line with the specified folder.
+    By default only new and modified files are parsed and embedded, and files
+    that disappeared are removed. full_rebuild=True clears everything first.
+    chunker (a chunking.Chunker) defaults to the Config.CHUNK_* settings.
+    Files stream through the ingestion pipeline, so parsing, embedding and
+    storing overlap. Returns a report dict with the added/modified/removed/
+    unchanged/failed file paths and per-stage throughput under "stages".
+    """
+    logger.info("Initializing database...")
+    if full_rebuild:
+        db_manager.clear_database()  # Clear existing data
+
+    report = {"added": [], "modified": [], "removed": [], "unchanged": [], "failed": []}
+    manifest = db_manager.get_file_manifest()
+    seen = set()
+
+    pipeline = IngestionPipeline(parser, embedder, db_manager, chunker=chunker)
+    jobs = plan_file_jobs(parser, embedder, folder_path, manifest, report, seen, pipeline.parser_version)
+    report["stages"] = pipeline.run(jobs, report)
 
-    scanned_data = parser.scan_folder(folder_path)
-    if not scanned_data:
-        print("No files found or processed in the folder.")
+    # Discovery has finished, so seen now holds every file in the folder
+    for file_path in manifest:
+        if file_path not in seen:
+            db_manager.delete_file(file_path)
+            report["removed"].append(file_path)
+
+    logger.info("Ingestion throughput:")
+    for stage in report["stages"]:
+        logger.info(
+            "  %-8s %6d files  %8d sentences  %9.1f sent/s  busy %.0f%%",
+            stage["stage"], stage["files"], stage["sentences"], stage["sentences_per_second"],
+            stage["utilization"] * 100,
+        )
+
+    cache_stats = embedder.cache_stats()
+    if cache_stats:
+        report["embedding_cache"] = cache_stats
+        logger.info(
+            "  Embedding cache: %d hits, %d misses (%.0f%% hit rate), %d entries",
+            cache_stats["hits"], cache_stats["misses"], cache_stats["hit_rate"] * 100, cache_stats["entries"],
+        )
+
+    logger.info(
+        "Database initialization complete. Added: %d, modified: %d, removed: %d, unchanged: %d, failed: %d.",
+        len(report["added"]), len(report["modified"]), len(report["removed"]),
+        len(report["unchanged"]), len(report["failed"]),
+    )
+    return report
+
+
+def print_search_results(search_results):
+    """Prints search results as the relevant files followed by their matching sentences."""
+    if not search_results:
+        print("No relevant files found.")
         return
+    print("\n--- Top Relevant Files ---")
+    relevant_files = set()
+    for res in search_results:
+        relevant_files.add(res["file_path"])
 
-    print(f"\nProcessing {len(scanned_data)} sentences...")
+    for f_path in relevant_files:
+        print(f"- {f_path}")
 
-    # Process in batches for efficiency
-    batch_size = 32
-    progress_bar = tqdm(total=len(scanned_data), desc="Vectorizing sentences", unit="sent")
-    
-    for i in range(0, len(scanned_data), batch_size):
-        batch = scanned_data[i : i + batch_size]
-        sentences = [item[1] for item in batch]
-        # Convert container paths back to host paths for storage
-        file_paths = [convert_container_path_to_host(item[0]) for item in batch]
+    print("\n--- Top Matching Sentences ---")
+    for res in search_results:
+        source = os.path.basename(res["file_path"])
+        if res.get("location"):
+            source += f", {res['location']}"
+        print(
+            f"  [File: {source}] Sentence: '{res['sentence'][:70]}...' (Distance: {res['distance']:.4f})"
+        )
 
-        embeddings = embedder.get_batch_embeddings(sentences)
 
-        for j in range(len(sentences)):
-            db_manager.insert_sentence_embedding(
-                file_paths[j], sentences[j], embeddings[j]
-            )
-        progress_bar.update(len(batch))
-    
-    progress_bar.close()
-    print("\nDatabase initialization complete.")
+def print_file_results(file_results):
+    """Prints ranked files, each followed by its matching sentences."""
+    if not file_results:
+        print("No relevant files found.")
+        return
+    print("\n--- Top Relevant Files ---")
+    for res in file_results:
+        print(f"- {res['file_path']} (Distance: {res['distance']:.4f}, {len(res['sentences'])} matching sentences)")
+        for match in res["sentences"]:
+            where = f"[{match['location']}] " if match.get("location") else ""
+            print(f"    {where}Sentence: '{match['sentence'][:70]}...' (Distance: {match['distance']:.4f})")
+
 
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        # Subcommands (index, query, batch-query, stats) run non-interactively
+        from cli import main as cli_main
+        return cli_main(argv)
 
-def main():
+    configure_logging()
     print("--- AI Document Search Application ---")
 
     # Create necessary directories
@@ -70,8 +205,11 @@ def main():
     # Initialize components
     doc_parser = DocumentParser()
     embedder = EmbeddingModel(model_name=Config.MODEL_NAME)
-    db_manager = VectorDB(
+    # Load the model while the user is typing rather than before the first prompt
+    embedder.prewarm()
+    db_manager = open_vector_db(
         db_path=Config.DB_FILE,
+        shard_count=Config.SHARD_COUNT,
         embedding_dim=embedder.get_embedding_dimension(),
     )
 
@@ -80,21 +218,7 @@ def main():
     print("You can use:")
     print("- Absolute path (e.g., /home/user/documents)")
     print("- Relative path (e.g., test_docs or ./test_docs)")
-    folder_path = input("Folder path: ").strip()
-    
-    # Handle relative paths
-    if not os.path.isabs(folder_path):
-        # Check if we're running in Docker (if /app exists) or locally
-        if os.path.exists("/app"):
-            # Running in Docker container
-            folder_path = os.path.join("/app", folder_path)
-        else:
-            # Running locally - use current working directory
-            folder_path = os.path.abspath(folder_path)
-    else:
-        # Convert absolute host path to container path only if in Docker
-        if os.path.exists("/app"):
-            folder_path = convert_host_path_to_container(folder_path)
+    folder_path = resolve_folder_path(input("Folder path: ").strip())
     
     print(f"\nScanning folder: {folder_path}")
     
@@ -103,7 +227,14 @@ def main():
         db_manager.close()
         sys.exit(1)
 
-    initialize_database(db_manager, doc_parser, embedder, folder_path)
+    rebuild = input("Rebuild the index from scratch? [y/N]: ").strip().lower()
+    initialize_database(
+        db_manager, doc_parser, embedder, folder_path,
+        full_rebuild=rebuild in ("y", "yes"),
+    )
+
+    # Load the search structures now rather than on the first query
+    db_manager.warm_up()
 
     # --- Perform Searches ---
     while True:
@@ -131,26 +262,21 @@ def main():
             distance_threshold=Config.DISTANCE_THRESHOLD
         )
 
-        if not search_results:
-            print("No relevant files found.")
-        else:
-            print("\n--- Top Relevant Files ---")
-            relevant_files = set()
-            for res in search_results:
-                relevant_files.add(res["file_path"])
-
-            for f_path in relevant_files:
-                print(f"- {f_path}")
+        print_search_results(search_results)
 
-            print("\n--- Top Matching Sentences ---")
-            for res in search_results:
-                print(
-                    f"  [File: {os.path.basename(res['file_path'])}] Sentence: '{res['sentence'][:70]}...' (Distance: {res['distance']:.4f})"
-                )
+    query_stats = embedder.query_cache_stats()
+    result_stats = db_manager.result_cache_stats()
+    if query_stats["hits"] + query_stats["misses"]:
+        print(
+            f"\nQuery cache hit rate: {query_stats['hit_rate']:.0%} embeddings, "
+            f"{result_stats['hit_rate']:.0%} results"
+        )
 
     db_manager.close()
+    embedder.close()
+    export_metrics()
     print("\nApplication closed. Goodbye!")
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Chunking: turns a file's sentences into the passages that are embedded and
+stored, one row each. Lengths are measured with the embedding model's own
+tokenizer, so no passage is silently truncated by the model.
+
+    sentence  one passage per sentence; sentences longer than the budget are
+              split into overlapping token windows
+    window    fixed windows of max_tokens tokens over the whole file, each
+              sharing overlap tokens with the previous one
+    pack      consecutive whole sentences packed into passages of at most
+              max_tokens tokens (fewer rows, no tiny fragments)
+
+Every passage records its token boundaries within the file (token_start,
+token_end), counted over the file's sentences without special tokens.
+"""
+from itertools import groupby
+from operator import itemgetter
+from collections import namedtuple
+from config import Config
+
+CHUNK_STRATEGIES = ("sentence", "window", "pack")
+
+# One stored row: its text, source location and [token_start, token_end) in the file
+Passage = namedtuple("Passage", "text location token_start token_end")
+
+
+def location_range(first, last):
+    """Location of a passage spanning two source locations ("page 2 - page 3")."""
+    if not first or first == last:
+        return first
+    return f"{first} - {last}" if last else first
+
+
+class Chunker:
+    """
+    Groups sentences into passages. embedder provides token_spans(texts) and
+    max_passage_tokens (see EmbeddingModel); it is only used once a file is
+    chunked, so creating a Chunker does not load the model.
+    """
+
+    def __init__(self, embedder, strategy=None, max_tokens=None, overlap=None):
+        self.embedder = embedder
+        self.strategy = strategy or Config.CHUNK_STRATEGY
+        if self.strategy not in CHUNK_STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy '{self.strategy}'. Expected one of {CHUNK_STRATEGIES}.")
+        self.max_tokens = Config.CHUNK_MAX_TOKENS if max_tokens is None else max_tokens
+        self.overlap = Config.CHUNK_OVERLAP_TOKENS if overlap is None else overlap
+        if self.max_tokens < 0 or self.overlap < 0:
+            raise ValueError("Chunk sizes must not be negative.")
+        if self.max_tokens and self.overlap >= self.max_tokens:
+            raise ValueError(f"Chunk overlap ({self.overlap}) must be smaller than max_tokens ({self.max_tokens}).")
+
+    @property
+    def signature(self):
+        """Identifies the settings; stored with each file so changing them re-indexes it."""
+        return f"{self.strategy}:{self.max_tokens}:{self.overlap}"
+
+    def budget(self):
+        """Tokens per passage: max_tokens, capped at what the model embeds without truncating."""
+        limit = self.embedder.max_passage_tokens
+        budget = min(self.max_tokens, limit) if self.max_tokens else limit
+        # A budget within the overlap would make no progress
+        return max(budget, self.overlap + 1)
+
+    def chunk(self, sentences):
+        """Returns the Passages of one file from its in-order (sentence, location) pairs."""
+        if not sentences:
+            return []
+        texts = [text for text, _ in sentences]
+        locations = [location for _, location in sentences]
+        spans = self.embedder.token_spans(texts)
+        starts = [0]
+        for token_spans in spans:
+            starts.append(starts[-1] + len(token_spans))
+        budget = self.budget()
+
+        if self.strategy == "window":
+            return self._windows(texts, locations, spans, starts, range(len(texts)), budget)
+
+        passages = []
+        group = []  # Sentence indices waiting to be packed
+        for i, token_spans in enumerate(spans):
+            count = len(token_spans)
+            if self.strategy == "pack" and group and starts[i + 1] - starts[group[0]] <= budget:
+                group.append(i)
+                continue
+            if group:
+                passages.append(self._packed(texts, locations, starts, group))
+                group = []
+            if count > budget:
+                passages.extend(self._windows(texts, locations, spans, starts, [i], budget))
+            elif count:
+                group = [i]
+        if group:
+            passages.append(self._packed(texts, locations, starts, group))
+        return passages
+
+    @staticmethod
+    def _packed(texts, locations, starts, group):
+        return Passage(
+            " ".join(texts[i] for i in group),
+            location_range(locations[group[0]], locations[group[-1]]),
+            starts[group[0]],
+            starts[group[-1] + 1],
+        )
+
+    def _windows(self, texts, locations, spans, starts, indices, budget):
+        """Overlapping windows of budget tokens over the consecutive sentences in indices."""
+        tokens = [(i, start, end) for i in indices for start, end in spans[i]]
+        step = budget - self.overlap
+        passages = []
+        for first in range(0, len(tokens), step):
+            window = tokens[first : first + budget]
+            pieces = []
+            for i, group in groupby(window, key=itemgetter(0)):
+                group = list(group)
+                pieces.append(texts[i][group[0][1] : group[-1][2]])
+            token_start = starts[indices[0]] + first
+            passages.append(Passage(
+                " ".join(pieces),
+                location_range(locations[window[0][0]], locations[window[-1][0]]),
+                token_start,
+                token_start + len(window),
+            ))
+            if first + budget >= len(tokens):
+                break
+        return passages
@@ -0,0 +1,352 @@
+"""
+Non-interactive command-line interface, reached through app.py:
+
+    python src/app.py index test_docs [--rebuild]
+    python src/app.py index test_docs --chunking pack [--chunk-tokens 128]
+    python src/app.py query "how do I reset my password" [--limit 5] [--json]
+    python src/app.py query "password reset" --by-file [--aggregation mean --top-m 3]
+    python src/app.py query "ORD-1001" --hybrid rrf|prefilter
+    python src/app.py batch-query queries.jsonl [--output results.jsonl]
+    python src/app.py stats [--json]
+    python src/app.py serve [--host 127.0.0.1] [--port 8080]
+    python src/app.py --shards 4 index test_docs    (see src/sharding.py)
+    python src/app.py --log-level DEBUG --metrics-file metrics.prom index test_docs
+    python src/app.py --profile sample index test_docs    (see src/profiling.py)
+
+Query commands open the existing database without re-indexing. Status
+messages go to stderr, so stdout only carries results. --metrics-file writes
+the run's timers and counters in the Prometheus text format when the
+command finishes (see src/metrics.py).
+"""
+import os
+import sys
+import json
+import argparse
+from contextlib import redirect_stdout
+from config import Config
+from vector_db import SEARCH_MODES, FILE_AGGREGATIONS, HYBRID_MODES
+from sharding import database_exists, open_vector_db
+from chunking import CHUNK_STRATEGIES
+from log_config import LOG_FORMATS, configure_logging
+from metrics import export_metrics
+from profiling import PROFILERS, Profiler
+
+
+def _open_embedder():
+    from embedding_model import EmbeddingModel
+
+    return EmbeddingModel(model_name=Config.MODEL_NAME)
+
+
+def _open_existing_database(args, embedder=None):
+    """Opens the database for searching, or returns None if it cannot be used."""
+    if not database_exists(args.db, args.shards):
+        print(f"Error: Database '{args.db}' does not exist. Run the 'index' command first.")
+        return None
+    db_manager = open_vector_db(
+        args.db, args.shards, search_mode=getattr(args, "search_mode", Config.SEARCH_MODE)
+    )
+    if embedder is not None and embedder.get_embedding_dimension() != db_manager.embedding_dim:
+        print(
+            f"Error: Database '{args.db}' holds {db_manager.embedding_dim}-dim embeddings, "
+            f"but '{embedder.model_name}' produces {embedder.get_embedding_dimension()}-dim ones."
+        )
+        db_manager.close()
+        return None
+    return db_manager
+
+
+def cmd_index(args, out):
+    from app import initialize_database, resolve_folder_path
+    from document_parser import DocumentParser
+    from chunking import Chunker
+
+    folder_path = resolve_folder_path(args.folder)
+    if not os.path.isdir(folder_path):
+        print(f"Error: Folder '{folder_path}' does not exist or is not accessible.")
+        return 1
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+
+    embedder = _open_embedder()
+    try:
+        chunker = Chunker(embedder, args.chunking, args.chunk_tokens, args.chunk_overlap)
+    except ValueError as e:
+        print(f"Error: {e}")
+        embedder.close()
+        return 1
+    db_manager = open_vector_db(args.db, args.shards, embedding_dim=embedder.get_embedding_dimension())
+    try:
+        report = initialize_database(
+            db_manager, DocumentParser(), embedder, folder_path, full_rebuild=args.rebuild, chunker=chunker
+        )
+    finally:
+        db_manager.close()
+        embedder.close()
+
+    summary = {key: len(report[key]) for key in ("added", "modified", "removed", "unchanged", "failed")}
+    if args.json:
+        out.write(json.dumps(dict(summary, stages=report["stages"])) + "\n")
+    else:
+        out.write(" ".join(f"{key}={count}" for key, count in summary.items()) + "\n")
+    return 1 if report["failed"] else 0
+
+
+def cmd_query(args, out):
+    embedder = _open_embedder()
+    db_manager = _open_existing_database(args, embedder)
+    if db_manager is None:
+        embedder.close()
+        return 1
+    try:
+        query_embedding = embedder.get_sentence_embedding(args.text)
+        if query_embedding is None:
+            print("Error: Could not generate an embedding for an empty query.")
+            return 1
+        if args.hybrid:
+            results = db_manager.search_hybrid(
+                args.text, query_embedding, limit=args.limit, distance_threshold=args.threshold,
+                mode=args.hybrid,
+            )
+        elif args.by_file:
+            results = db_manager.search_similar_files(
+                query_embedding, limit=args.limit, distance_threshold=args.threshold,
+                aggregation=args.aggregation, top_m=args.top_m,
+            )
+        else:
+            results = db_manager.search_similar_sentences(
+                query_embedding, limit=args.limit, distance_threshold=args.threshold
+            )
+    finally:
+        db_manager.close()
+        embedder.close()
+
+    if args.json:
+        out.write(json.dumps({"query": args.text, "results": results}) + "\n")
+    else:
+        from app import print_file_results, print_search_results
+
+        with redirect_stdout(out):
+            if args.by_file:
+                print_file_results(results)
+            else:
+                print_search_results(results)
+    return 0
+
+
+def _read_queries(path):
+    """
+    Yields (id, query, error) for each non-blank line of a JSONL file. A line
+    is either {"query": "...", "id": ...} or a bare JSON string; the id
+    defaults to the line number.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, None, f"invalid JSON: {e}"
+                continue
+            if isinstance(item, str):
+                item = {"query": item}
+            if not isinstance(item, dict):
+                yield line_no, None, "expected an object or a string"
+                continue
+            query_id, query = item.get("id", line_no), item.get("query")
+            if not isinstance(query, str) or not query.strip():
+                yield query_id, None, "missing 'query' text"
+                continue
+            yield query_id, query, None
+
+
+def cmd_batch_query(args, out):
+    if not os.path.isfile(args.file):
+        print(f"Error: Query file '{args.file}' does not exist.")
+        return 1
+    embedder = _open_embedder()
+    db_manager = _open_existing_database(args, embedder)
+    if db_manager is None:
+        embedder.close()
+        return 1
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else out
+    answered = failed = 0
+    batch = []
+
+    def flush():
+        # All queries of a batch are embedded together and scored in one matrix product
+        valid = [(query_id, query) for query_id, query, error in batch if error is None]
+        embeddings = embedder.get_query_embeddings([query for _, query in valid])
+        results = iter(db_manager.search_similar_sentences_batch(
+            embeddings, limit=args.limit, distance_threshold=args.threshold
+        )) if valid else iter(())
+        for query_id, query, error in batch:
+            if error is None:
+                record = {"id": query_id, "query": query, "results": next(results)}
+            else:
+                record = {"id": query_id, "error": error}
+            output.write(json.dumps(record) + "\n")
+        batch.clear()
+
+    try:
+        for item in _read_queries(args.file):
+            batch.append(item)
+            if item[2] is None:
+                answered += 1
+            else:
+                failed += 1
+            if len(batch) >= args.batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        if args.output:
+            output.close()
+        db_manager.close()
+        embedder.close()
+
+    print(f"Answered {answered} queries ({failed} invalid).")
+    return 1 if failed else 0
+
+
+def cmd_stats(args, out):
+    db_manager = _open_existing_database(args)
+    if db_manager is None:
+        return 1
+    stats = db_manager.stats()
+    db_manager.close()
+    if Config.EMBEDDING_CACHE_ENABLED and os.path.isfile(Config.EMBEDDING_CACHE_FILE):
+        from embedding_cache import EmbeddingCache
+
+        cache = EmbeddingCache(Config.EMBEDDING_CACHE_FILE, Config.EMBEDDING_CACHE_MAX_ENTRIES)
+        stats["embedding_cache_entries"] = cache.stats()["entries"]
+        cache.close()
+
+    if args.json:
+        out.write(json.dumps(stats) + "\n")
+        return 0
+    for key, value in stats.items():
+        if key == "indexes":
+            built = [f"{name} ({size / 1e6:.1f} MB)" for name, size in value.items() if size is not None]
+            value = ", ".join(built) or "none"
+        elif key == "parser_versions":
+            value = ", ".join(value) or "none"
+        elif key == "shards":
+            value = ", ".join(f"{os.path.basename(shard['db_path'])}: {shard['sentences']}" for shard in value)
+        out.write(f"{key:<24} {value}\n")
+    return 0
+
+
+def cmd_serve(args, out):
+    import server
+
+    return server.main(
+        ["--db", args.db, "--shards", str(args.shards), "--host", args.host, "--port", str(args.port)]
+    )
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(prog="app.py", description="AI document semantic search.")
+    arg_parser.add_argument("--db", default=Config.DB_FILE, help="Path to the embeddings database")
+    arg_parser.add_argument(
+        "--shards", type=positive_int, default=Config.SHARD_COUNT, help="Database shards, one worker process each"
+    )
+    arg_parser.add_argument(
+        "--log-level", type=str.upper, choices=("DEBUG", "INFO", "WARNING", "ERROR"), default=Config.LOG_LEVEL.upper(),
+        help="DEBUG adds per-file and per-query messages, WARNING shows only problems",
+    )
+    arg_parser.add_argument("--log-format", choices=LOG_FORMATS, default=Config.LOG_FORMAT)
+    arg_parser.add_argument(
+        "--metrics-file", default=Config.METRICS_FILE, help="Write the run's metrics here (Prometheus text format)"
+    )
+    arg_parser.add_argument("--profile", choices=PROFILERS, default=Config.PROFILE, help="Profile the command")
+    arg_parser.add_argument("--profile-output", default=Config.PROFILE_OUTPUT, help="Where to write the profile")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="Index (or incrementally update) a folder")
+    index.add_argument("folder", help="Folder to scan for supported files")
+    index.add_argument("--rebuild", action="store_true", help="Clear the database first")
+    index.add_argument("--json", action="store_true", help="Print the report as JSON")
+    index.add_argument(
+        "--chunking", choices=CHUNK_STRATEGIES, default=Config.CHUNK_STRATEGY,
+        help="One row per sentence, per fixed token window, or per group of sentences packed to --chunk-tokens",
+    )
+    index.add_argument(
+        "--chunk-tokens", type=int, default=Config.CHUNK_MAX_TOKENS,
+        help="Token budget per row (0 = the model's maximum sequence length)",
+    )
+    index.add_argument(
+        "--chunk-overlap", type=int, default=Config.CHUNK_OVERLAP_TOKENS, help="Tokens shared by consecutive windows"
+    )
+    index.set_defaults(handler=cmd_index)
+
+    def add_search_options(command):
+        command.add_argument("--limit", type=positive_int, default=Config.DEFAULT_SEARCH_LIMIT, help="Results per query")
+        command.add_argument(
+            "--threshold", type=float, default=Config.DISTANCE_THRESHOLD, help="Maximum cosine distance"
+        )
+        command.add_argument("--search-mode", choices=SEARCH_MODES, default=Config.SEARCH_MODE)
+
+    query = commands.add_parser("query", help="Search the existing index")
+    query.add_argument("text", help="Query text")
+    query.add_argument("--json", action="store_true", help="Print the results as JSON")
+    ranking = query.add_mutually_exclusive_group()
+    ranking.add_argument(
+        "--by-file", action="store_true", help="Rank files and list all of their matching sentences"
+    )
+    ranking.add_argument(
+        "--hybrid", choices=HYBRID_MODES, default=None,
+        help="Combine keyword (BM25) and vector search: fuse both rankings or pre-filter by keywords",
+    )
+    query.add_argument(
+        "--aggregation", choices=FILE_AGGREGATIONS, default=Config.FILE_AGGREGATION,
+        help="File score: best sentence (max) or mean of the best --top-m sentences",
+    )
+    query.add_argument("--top-m", type=positive_int, default=Config.FILE_TOP_M, help="Sentences averaged by --aggregation mean")
+    add_search_options(query)
+    query.set_defaults(handler=cmd_query)
+
+    batch_query = commands.add_parser("batch-query", help="Answer a JSONL file of queries with JSONL results")
+    batch_query.add_argument("file", help='JSONL file, one {"query": "...", "id": ...} per line')
+    batch_query.add_argument("--output", default=None, help="Write results here instead of stdout")
+    batch_query.add_argument(
+        "--batch-size", type=positive_int, default=Config.EMBED_BATCH_SIZE, help="Queries embedded and scored together"
+    )
+    add_search_options(batch_query)
+    batch_query.set_defaults(handler=cmd_batch_query)
+
+    stats = commands.add_parser("stats", help="Show database and index statistics")
+    stats.add_argument("--json", action="store_true", help="Print the statistics as JSON")
+    stats.set_defaults(handler=cmd_stats)
+
+    serve = commands.add_parser("serve", help="Serve search over HTTP (see src/server.py)")
+    serve.add_argument("--host", default=Config.SERVER_HOST)
+    serve.add_argument("--port", type=int, default=Config.SERVER_PORT)
+    serve.set_defaults(handler=cmd_serve)
+    return arg_parser
+
+
+def main(argv=None):
+    """Runs one subcommand and returns its exit code."""
+    args = build_arg_parser().parse_args(argv)
+    configure_logging(args.log_level, args.log_format)
+    out = sys.stdout
+    # Library progress messages go to stderr so stdout stays machine-readable
+    with redirect_stdout(sys.stderr):
+        with Profiler(args.profile, args.profile_output):
+            code = args.handler(args, out)
+        export_metrics(args.metrics_file)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,9 @@ class Config:
     # Database settings
     DB_DIRECTORY = os.path.join("data", "db")
     DB_FILE = os.path.join(DB_DIRECTORY, "document_embeddings.db")
+    NORMALIZE_STORED_EMBEDDINGS = True  # Store unit-length vectors so search can skip re-normalizing them
+    SQLITE_CACHE_SIZE_KB = 65536  # Page cache per connection
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Bytes of the database file SQLite may memory-map
     
     # Docker environment settings
     HOST_ROOT = os.getenv("HOST_ROOT", "/host")
@@ -13,14 +16,82 @@ class Config:
     # Search settings
     DISTANCE_THRESHOLD = 0.7  # Maximum distance for semantic similarity (balanced for accuracy and recall)
     DEFAULT_SEARCH_LIMIT = 5  # Default number of results to return
+    # "matrix" (in-memory), "mmap" (on-disk vector store), "sq8"/"pq" (quantized codes) or "python" (per-row scan)
+    SEARCH_MODE = "matrix"
+    QUERY_CACHE_SIZE = 1024  # Query embeddings kept in memory (0 = off)
+    RESULT_CACHE_SIZE = 1024  # Search results kept in memory until the data changes (0 = off)
+    FILE_AGGREGATION = "max"  # File ranking: "max" (best sentence) or "mean" (mean of the best FILE_TOP_M)
+    FILE_TOP_M = 3  # Sentences averaged per file by the "mean" aggregation
+    HYBRID_MODE = "rrf"  # Hybrid search: "rrf" (fuse keyword and vector ranks) or "prefilter" (keyword hits only)
+    HYBRID_CANDIDATES = 100  # Rows taken from each ranking before reciprocal rank fusion
+    RRF_K = 60  # Reciprocal rank fusion constant: score = sum of 1 / (RRF_K + rank)
+    PREFILTER_MAX_CANDIDATES = 5000  # Best keyword matches scored with vectors in "prefilter" mode
+    MMAP_CHUNK_ROWS = 65536  # Rows scanned per chunk by the memory-mapped vector store
+    SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))  # Database shards, one worker process each (1 = unsharded)
+
+    # HTTP search service settings (src/server.py)
+    SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+    SERVER_BATCH_WINDOW_MS = 5  # How long the first query of a micro-batch waits for others
+    SERVER_MAX_BATCH_SIZE = 64  # Queries embedded and scored together
+    SERVER_MAX_CONCURRENCY = 256  # Searches admitted at once; later ones wait for a slot
+    SERVER_MAX_PENDING = 1024  # Searches allowed to wait for a slot before new ones get 503
+    SERVER_REQUEST_TIMEOUT = 10.0  # Seconds before a search request gets 504
+    SERVER_MAX_LIMIT = 100  # Largest "limit" a client may ask for
+
+    # Approximate nearest-neighbour (IVF) index settings
+    ANN_ENABLED = False  # Use the IVF index by default when it has been built
+    ANN_N_LISTS = 0  # Number of k-means coarse centroids (0 = about 4 * sqrt(N))
+    ANN_NPROBE = 8  # Lists scanned per query: higher is slower but closer to exact
+    ANN_TRAIN_SAMPLE = 100000  # Maximum number of vectors used to train the centroids
+
+    # Quantized search settings ("sq8" and "pq" search modes)
+    PQ_SUBVECTORS = 48  # Product quantization slices, 1 byte each (384 dims -> 48 bytes per vector)
+    QUANT_RERANK_FACTOR = 4  # Re-rank limit * factor candidates with full-precision vectors (0 = off)
+    QUANT_TRAIN_SAMPLE = 50000  # Maximum number of vectors used to train a codec
     
     # Document processing settings
     MIN_SENTENCE_LENGTH = 10  # Minimum length of sentences to process
     SUPPORTED_EXTENSIONS = [".txt", ".csv", ".xml", ".pdf"]
+    PARSE_WORKERS = 0  # Parser processes: 0 = one per CPU, 1 = parse serially in-process
+    PARSE_TIMEOUT = 120  # Seconds a single file may take to parse before it is skipped
+    EMBED_BATCH_SIZE = 256  # Sentences buffered per embedding call during ingestion
+    # Passages stored per row (src/chunking.py): "sentence" (one per sentence), "window"
+    # (fixed token windows over the file) or "pack" (whole sentences packed up to a token budget)
+    CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "sentence")
+    CHUNK_MAX_TOKENS = 128  # Token budget per passage, capped at the model's maximum sequence length
+    CHUNK_OVERLAP_TOKENS = 32  # Tokens shared by consecutive windows
+    PIPELINE_QUEUE_SIZE = 8  # Files buffered between ingestion stages
     
     # Model settings
     MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-    
+    EMBED_TOKEN_BUDGET = 8192  # Padded tokens per forward pass (batch size x longest sentence)
+    EMBED_MAX_BATCH_SIZE = 128  # Upper bound on sentences per forward pass
+    # "torch" (sentence-transformers), "onnx" (ONNX Runtime on CPU) or "fake" (deterministic
+    # hashed bag of words, no model: for benchmarks and tests, see src/fake_backend.py)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+    # ONNX Runtime backend settings
+    ONNX_MODEL_DIR = os.path.join("data", "onnx", "all-MiniLM-L6-v2")  # Exported on first use if missing
+    ONNX_QUANTIZED = False  # Use the int8 dynamically quantized model
+    ONNX_INTRA_OP_THREADS = 0  # Threads inside one operator (0 = ONNX Runtime default)
+    ONNX_INTER_OP_THREADS = 0  # Threads across independent operators (0 = ONNX Runtime default)
+
+    # Persistent embedding cache, keyed by model name and sentence hash
+    EMBEDDING_CACHE_ENABLED = True
+    EMBEDDING_CACHE_FILE = os.path.join(DB_DIRECTORY, "embedding_cache.db")
+    EMBEDDING_CACHE_MAX_ENTRIES = 500000  # About 0.8 GB at 384 float32 dimensions
+
+    # Logging, metrics and profiling (src/log_config.py, src/metrics.py, src/profiling.py)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")  # DEBUG adds per-file and per-query messages, WARNING only problems
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json" (one object per line, for log collectors)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"  # Timers and counters around the hot paths
+    METRICS_FILE = os.getenv("METRICS_FILE") or None  # Prometheus text file written when a command finishes
+    METRICS_LOG = os.getenv("METRICS_LOG", "0") == "1"  # Log a structured metrics snapshot when a command finishes
+    PROFILE = os.getenv("PROFILE") or None  # "cprofile" or "sample" profiles each command
+    PROFILE_OUTPUT = os.getenv("PROFILE_OUTPUT") or None  # Profile file (default profile.prof / profile.folded)
+    PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples of the "sample" profiler
+
     @classmethod
     def ensure_directories(cls):
         """Ensure required directories exist."""
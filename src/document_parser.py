@@ -1,79 +1,288 @@
 import os
 import re
-import nltk
-from nltk.tokenize import sent_tokenize
-from PyPDF2 import PdfReader
+import csv
+import time
+import codecs
+import logging
+import itertools
+import threading
+import multiprocessing
+from collections import deque, namedtuple
+from xml.etree import ElementTree
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from config import Config
+from metrics import METRICS
+from log_config import configure_worker_logging, logging_settings
 
-# Download required NLTK data if not already present
+logger = logging.getLogger(__name__)
+
+ENCODINGS = ["utf-8-sig", "latin-1", "iso-8859-1", "cp1252"]  # Tried in order; utf-8-sig also reads plain UTF-8
+ENCODING_SAMPLE_BYTES = 1 << 20  # Bytes decoded to pick a file's encoding
+TEXT_BLOCK_CHARS = 1 << 16  # Longest paragraph of a text file split at once
+CSV_SNIFF_CHARS = 1 << 16  # Characters inspected to detect a CSV dialect and header
+XML_FIELD_MAX_CHARS = 200  # Longer leaf text is treated as prose rather than a field
+XML_RECORD_MAX_CHARS = 2000  # Fields collected before a record chunk is emitted
+
+# A piece of a file's text. location names where it came from ("page 3",
+# "row 12", "/Root/Customers[1]/Customer[2]", "line 40"); prose chunks are
+# split into sentences, records (CSV rows, XML fields) are kept whole.
+Chunk = namedtuple("Chunk", "text location prose")
+
+# NLTK and PyPDF2 are imported on first use, so search-only runs never pay for them
 required_nltk_data = ['punkt', 'punkt_tab']
-for data in required_nltk_data:
-    try:
-        nltk.data.find(f"tokenizers/{data}")
-    except LookupError:
-        nltk.download(data)
+_nltk_lock = threading.Lock()
+_nltk_sent_tokenize = None
+
+
+def sent_tokenize(text):
+    """NLTK sentence splitting; loads NLTK and downloads its data on first call."""
+    global _nltk_sent_tokenize
+    if _nltk_sent_tokenize is None:
+        with _nltk_lock:
+            if _nltk_sent_tokenize is None:
+                import nltk
+                from nltk.tokenize import sent_tokenize as nltk_sent_tokenize
+
+                # Download required NLTK data if not already present
+                for data in required_nltk_data:
+                    try:
+                        nltk.data.find(f"tokenizers/{data}")
+                    except LookupError:
+                        nltk.download(data)
+                _nltk_sent_tokenize = nltk_sent_tokenize
+    return _nltk_sent_tokenize(text)
+
+
+def detect_encoding(file_path):
+    """Returns the first of ENCODINGS that decodes the start of the file."""
+    with open(file_path, "rb") as f:
+        sample = f.read(ENCODING_SAMPLE_BYTES)
+    for encoding in ENCODINGS:
+        try:
+            # Incremental, so a character cut off at the end of the sample is fine
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return ENCODINGS[-1]
+
+
+def file_format(file_path):
+    """The metrics label of a file: its lower-case extension without the dot."""
+    return os.path.splitext(file_path)[1].lower().lstrip(".") or "none"
+
+
+def _local_name(tag):
+    """Drops the {namespace} prefix ElementTree puts on tags and attribute names."""
+    return tag.rsplit("}", 1)[-1]
+
+
+class _XmlFrame:
+    """Parsing state of one open XML element in DocumentParser._iter_xml_chunks."""
+
+    def __init__(self, elem, path):
+        self.elem = elem
+        self.path = path
+        self.child_counts = {}
+        self.attributes = [
+            f"{_local_name(name)}: {value.strip()}" for name, value in elem.attrib.items() if value.strip()
+        ]
+        self.fields = list(self.attributes)
+        self.field_chars = sum(len(field) for field in self.fields)
+        self.inline = []  # Text of leaf children and of their tails, in document order
+        self.has_tails = False
+        self.finished = []  # Children whose end event has been handled
+        self.emitted = False  # A descendant was emitted as its own chunk
+
+    def release_children(self):
+        """
+        Detaches finished children, keeping their trailing text. Called when
+        the next child starts or the element ends, by which point those tails
+        have been parsed. Bounds memory on long files.
+        """
+        for child in self.finished:
+            if child.tail and child.tail.strip():
+                self.inline.append(child.tail.strip())
+                self.has_tails = True
+            self.elem.remove(child)
+        self.finished = []
+
+    def add_field(self, field):
+        """Adds a field; returns True once the fields should be flushed as a record."""
+        self.fields.append(field)
+        self.field_chars += len(field)
+        return self.field_chars > XML_RECORD_MAX_CHARS
+
+    def foldable_into(self, parent):
+        """A plain group of fields (no attributes, no records inside) joins a parent record."""
+        return (
+            not self.attributes
+            and not self.emitted
+            and parent.fields
+            and self.field_chars + parent.field_chars <= XML_RECORD_MAX_CHARS
+        )
+
+    def flush_fields(self):
+        chunk = Chunk("; ".join(self.fields), self.path, False)
+        self.fields = []
+        self.field_chars = 0
+        self.emitted = True
+        return chunk
+
+
+def _parse_file_worker(file_path):
+    """
+    Process pool entry point: parses and splits one file. Returns its
+    sentences and the metrics the worker recorded meanwhile.
+    """
+    return DocumentParser().get_file_sentences(file_path, with_locations=True), METRICS.drain()
 
 
 class DocumentParser:
+    # Bump when parsing or sentence splitting changes, so incremental
+    # re-indexing re-parses files that were indexed with older logic.
+    PARSER_VERSION = "2"
+
     def __init__(self):
         pass
 
     def parse_file(self, file_path):
         """Reads any supported file and returns its content as text."""
-        try:
-            # Handle PDF files differently
-            if file_path.lower().endswith('.pdf'):
-                reader = PdfReader(file_path)
-                # Extract text from all pages
-                text_content = []
-                for page in reader.pages:
-                    text = page.extract_text()
-                    if text:
-                        text_content.append(text.strip())
-                content = "\n".join(text_content)
-                if not content.strip():
-                    print(f"Warning: No text content found in PDF file {file_path}")
-                    return None
-                print(f"Extracted {len(text_content)} pages of text from PDF")
-                return content
+        content = "\n".join(chunk.text for chunk in self.iter_chunks(file_path))
+        return content or None
+
+    def iter_chunks(self, file_path):
+        """
+        Lazily yields the text of a file as Chunks, reading it incrementally:
+        PDFs a page at a time, CSV files a record at a time (as "column:
+        value" pairs), XML files an element at a time, and other files a
+        paragraph at a time. Memory is bounded by the largest chunk, not by
+        the file. A read error (a corrupt PDF, malformed XML, ...) is raised
+        after the chunks already yielded, so the file counts as failed rather
+        than as indexed with only part of its content.
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+        extractors = {".pdf": self._iter_pdf_chunks, ".csv": self._iter_csv_chunks, ".xml": self._iter_xml_chunks}
+        yield from extractors.get(file_ext, self._iter_text_chunks)(file_path)
+
+    def _iter_pdf_chunks(self, file_path):
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(file_path)
+        pages = 0
+        # Pages are extracted one at a time
+        for page_number, page in enumerate(reader.pages, start=1):
+            text = page.extract_text()
+            if text and text.strip():
+                pages += 1
+                yield Chunk(text.strip(), f"page {page_number}", True)
+        if pages:
+            logger.debug("Extracted %s pages of text from PDF", pages)
+        else:
+            logger.warning("No text content found in PDF file %s", file_path)
+
+    def _iter_text_chunks(self, file_path):
+        """Paragraphs (separated by blank lines, cut at TEXT_BLOCK_CHARS), located by their first line."""
+        with open(file_path, "r", encoding=detect_encoding(file_path), errors="replace") as f:
+            block, block_chars, first_line = [], 0, 1
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    if not block:
+                        first_line = line_number
+                    block.append(line)
+                    block_chars += len(line)
+                if block and (not line.strip() or block_chars >= TEXT_BLOCK_CHARS):
+                    yield Chunk("".join(block), f"line {first_line}", True)
+                    block, block_chars = [], 0
+            if block:
+                yield Chunk("".join(block), f"line {first_line}", True)
+
+    def _iter_csv_chunks(self, file_path):
+        """One chunk per record: "column: value" pairs when the file has a header row."""
+        with open(file_path, "r", encoding=detect_encoding(file_path), errors="replace", newline="") as f:
+            sample = f.read(CSV_SNIFF_CHARS)
+            f.seek(0)
+            sniffer = csv.Sniffer()
+            try:
+                dialect = sniffer.sniff(sample, delimiters=",;\t|")
+                has_header = sniffer.has_header(sample)
+            except csv.Error:
+                # Not enough structure to tell: assume a comma-separated file with a header
+                dialect, has_header = csv.excel, True
+
+            reader = csv.reader(f, dialect)
+            header = [name.strip() for name in next(reader, [])] if has_header else None
+            for row_number, row in enumerate(reader, start=1):
+                values = [value.strip() for value in row]
+                if header:
+                    text = "; ".join(
+                        f"{name}: {value}" if name else value
+                        for name, value in itertools.zip_longest(header, values, fillvalue="")
+                        if value
+                    )
+                else:
+                    text = ", ".join(value for value in values if value)
+                if text:
+                    yield Chunk(text, f"row {row_number}", False)
+
+    def _iter_xml_chunks(self, file_path):
+        """
+        Streams an XML file with iterparse, freeing each element once it has
+        been read. Short leaf values and attributes become "name: value"
+        fields of their element, which is emitted as one record chunk located
+        by its path (/Root/Customers[1]/Customer[2]). Attribute-less groups of
+        fields, such as an address, are folded into the enclosing record.
+        Longer text is emitted as prose.
+        """
+        stack = []
+        for event, elem in ElementTree.iterparse(file_path, events=("start", "end")):
+            tag = _local_name(elem.tag)
+            if event == "start":
+                path = f"/{tag}"
+                if stack:
+                    parent = stack[-1]
+                    parent.release_children()
+                    parent.child_counts[tag] = parent.child_counts.get(tag, 0) + 1
+                    path = f"{parent.path}/{tag}[{parent.child_counts[tag]}]"
+                stack.append(_XmlFrame(elem, path))
+                continue
+
+            frame = stack.pop()
+            parent = stack[-1] if stack else None
+            frame.release_children()
+            text = (elem.text or "").strip()
+            if parent is not None and not frame.child_counts and text and len(text) <= XML_FIELD_MAX_CHARS:
+                field = f"{tag}: {text}"
+                if frame.attributes:
+                    field += f" ({'; '.join(frame.attributes)})"
+                parent.inline.append(text)
+                if parent.add_field(field):
+                    yield parent.flush_fields()
             else:
-                # For CSV and XML files, try different encodings
-                encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
-                file_ext = os.path.splitext(file_path)[1].lower()
-                
-                for encoding in encodings:
-                    try:
-                        with open(file_path, "r", encoding=encoding) as f:
-                            content = f.read()
-                            
-                            # Basic validation for XML files
-                            if file_ext == '.xml':
-                                if not content.strip().startswith('<?xml') and not content.strip().startswith('<'):
-                                    print(f"Warning: File {file_path} doesn't appear to be valid XML")
-                                    continue
-                            
-                            # Basic validation for CSV files
-                            elif file_ext == '.csv':
-                                # Check if it has some basic CSV structure (commas or semicolons)
-                                if ',' not in content and ';' not in content:
-                                    print(f"Warning: File {file_path} doesn't appear to be valid CSV")
-                                    continue
-                            
-                            print(f"Successfully read file with {encoding} encoding")
-                            return content
-                    except UnicodeDecodeError:
-                        if encoding == encodings[-1]:  # Last encoding attempt
-                            print(f"Error: Could not decode {file_path} with any supported encoding")
-                            return None
-                        continue
-                    except Exception as e:
-                        print(f"Error reading {file_path}: {e}")
-                        return None
-                        
-                return None
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
-            return None
+                prose = text
+                if frame.child_counts and (text or frame.has_tails):
+                    # Mixed content: child elements are inline markup within the text
+                    prose = " ".join(piece for piece in [text] + frame.inline if piece)
+                    frame.fields = list(frame.attributes)
+                if prose:
+                    yield Chunk(prose, frame.path, True)
+                    if parent is not None:
+                        parent.emitted = True
+                if frame.fields:
+                    if parent is not None and frame.foldable_into(parent):
+                        for field in frame.fields:
+                            parent.add_field(field)
+                    else:
+                        yield frame.flush_fields()
+                        if parent is not None:
+                            parent.emitted = True
+            # Free the element's content; its tail is read by the parent later
+            tail = elem.tail
+            elem.clear()
+            elem.tail = tail
+            if parent is not None:
+                parent.finished.append(elem)
 
     def get_sentences(self, text):
         """Breaks a given text into sentences."""
@@ -88,35 +297,188 @@ class DocumentParser:
         sentences = sent_tokenize(text)
         return sentences
 
-    def scan_folder(self, folder_path):
+    def iter_files(self, folder_path):
+        """Lazily yields the supported files under a folder, in a stable sorted order."""
+        for root, dirs, files in os.walk(folder_path):
+            dirs.sort()
+            for file_name in sorted(files):
+                file_ext = os.path.splitext(file_name)[1].lower()
+                if file_ext in Config.SUPPORTED_EXTENSIONS:
+                    yield os.path.join(root, file_name)
+
+    def list_files(self, folder_path):
+        """Returns the supported files under a folder, in a stable sorted order."""
+        return list(self.iter_files(folder_path))
+
+    def iter_file_sentences(self, file_path):
         """
-        Scans a folder for supported files,
-        reads them as text, and returns a list of (file_path, sentence) tuples.
+        Lazily yields (sentence, location) for one file. Prose chunks are split
+        into sentences one chunk at a time; CSV and XML records stay whole.
         """
-        parsed_data = []
-        if not os.path.isdir(folder_path):
-            print(f"Error: Folder '{folder_path}' not found.")
-            return []
+        split_seconds = 0.0
+        try:
+            for chunk in self.iter_chunks(file_path):
+                if chunk.prose:
+                    started = time.perf_counter()
+                    pieces = self.get_sentences(chunk.text)
+                    split_seconds += time.perf_counter() - started
+                else:
+                    pieces = [re.sub(r"\s+", " ", chunk.text)]
+                for sentence in pieces:
+                    # Filter out very short or empty sentences that might be noise
+                    if len(sentence.strip()) > Config.MIN_SENTENCE_LENGTH:
+                        yield sentence.strip(), chunk.location
+        finally:
+            if split_seconds:
+                METRICS.inc("sentence_split_seconds_total", split_seconds, format=file_format(file_path))
 
-        for root, _, files in os.walk(folder_path):
-            for file_name in files:
-                file_path = os.path.join(root, file_name)
-                file_ext = os.path.splitext(file_name)[1].lower()
-                
-                if file_ext not in Config.SUPPORTED_EXTENSIONS:
+    def get_file_sentences(self, file_path, with_locations=False):
+        """
+        Parses one file and returns its cleaned sentences, or (sentence,
+        location) pairs with with_locations=True.
+        """
+        kind = file_format(file_path)
+        logger.debug("Processing %s file: %s", kind.upper(), file_path)
+        with METRICS.timer("parse_file_seconds", format=kind):
+            located = list(self.iter_file_sentences(file_path))
+        METRICS.inc("parsed_files_total", format=kind)
+        METRICS.inc("parsed_sentences_total", len(located), format=kind)
+        if with_locations:
+            return located
+        return [sentence for sentence, _ in located]
+
+    def iter_parsed_files(self, file_paths, workers=None, timeout=None):
+        """
+        Parses and splits files, yielding (file_path, sentences, error) in the
+        order of file_paths, where sentences are (sentence, location) pairs.
+        file_paths may be any iterable and is consumed lazily. With more than
+        one worker, files are fanned out to a process pool; a file that
+        raises, times out or crashes its worker yields an error message
+        instead of stopping the scan.
+        """
+        workers = Config.PARSE_WORKERS if workers is None else workers
+        workers = workers or os.cpu_count() or 1
+        timeout = Config.PARSE_TIMEOUT if timeout is None else timeout
+
+        if workers <= 1:
+            for file_path in file_paths:
+                try:
+                    yield file_path, self.get_file_sentences(file_path, with_locations=True), None
+                except Exception as e:
+                    METRICS.inc("parse_errors_total", format=file_format(file_path))
+                    logger.error("Could not parse %s: %s", file_path, e)
+                    yield file_path, [], str(e)
+            return
+
+        yield from self._iter_parsed_files_parallel(file_paths, workers, timeout)
+
+    def _iter_parsed_files_parallel(self, file_paths, workers, timeout):
+        """Process pool implementation of iter_parsed_files."""
+        # "spawn" avoids forking a parent that may already hold model threads
+        context = multiprocessing.get_context("spawn")
+
+        def new_executor():
+            # Workers log like this process
+            return ProcessPoolExecutor(
+                max_workers=workers, mp_context=context,
+                initializer=configure_worker_logging, initargs=(logging_settings(),),
+            )
+
+        executor = new_executor()
+        max_in_flight = workers * 2  # Bounds buffered results while keeping workers busy
+        in_flight = []  # (file_path, future), in input order
+        upcoming = iter(file_paths)
+        requeued = deque()  # Files to resubmit, ahead of upcoming, after a crash
+        # After a worker crash the head file runs alone, so a second crash
+        # identifies it as the culprit instead of whichever file was head.
+        isolating = False
+
+        def restart(executor, pending):
+            # Kill stuck workers: a hung parse cannot be cancelled from outside
+            for process in list(getattr(executor, "_processes", {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+            fresh = new_executor()
+            return fresh, [(path, fresh.submit(_parse_file_worker, path)) for path, _ in pending]
+
+        def next_path():
+            if requeued:
+                return requeued.popleft()
+            return next(upcoming, None)
+
+        try:
+            while True:
+                limit = 1 if isolating else max_in_flight
+                while len(in_flight) < limit:
+                    path = next_path()
+                    if path is None:
+                        break
+                    in_flight.append((path, executor.submit(_parse_file_worker, path)))
+                if not in_flight:
+                    break
+
+                # Every earlier file is finished, so the pool is already working
+                # on this one; its timeout runs from here.
+                file_path, future = in_flight[0]
+                try:
+                    sentences, worker_metrics = future.result(timeout=timeout or None)
+                except FutureTimeoutError:
+                    METRICS.inc("parse_errors_total", format=file_format(file_path))
+                    logger.error("Parsing %s timed out after %ss. Skipping.", file_path, timeout)
+                    executor, in_flight = restart(executor, in_flight[1:])
+                    isolating = False
+                    yield file_path, [], f"timed out after {timeout}s"
                     continue
-                
-                print(f"Processing {file_ext[1:].upper()} file: {file_path}")
-                content = self.parse_file(file_path)
-
-                if content:
-                    sentences = self.get_sentences(content)
-                    for sentence in sentences:
-                        # Filter out very short or empty sentences that might be noise
-                        if len(sentence.strip()) > Config.MIN_SENTENCE_LENGTH:
-                            parsed_data.append((file_path, sentence.strip()))
-        
-        return parsed_data
+                except BrokenProcessPool:
+                    if isolating:
+                        METRICS.inc("parse_errors_total", format=file_format(file_path))
+                        logger.error("Parsing %s crashed the parser process. Skipping.", file_path)
+                        executor, in_flight = restart(executor, [])
+                        isolating = False
+                        yield file_path, [], "parser process crashed"
+                    else:
+                        # Retry the head alone; the files after it are resubmitted later
+                        requeued.extendleft(reversed([path for path, _ in in_flight[1:]]))
+                        executor, in_flight = restart(executor, in_flight[:1])
+                        isolating = True
+                    continue
+                except Exception as e:
+                    METRICS.inc("parse_errors_total", format=file_format(file_path))
+                    in_flight.pop(0)
+                    isolating = False
+                    logger.error("Could not parse %s: %s", file_path, e)
+                    yield file_path, [], str(e)
+                    continue
+
+                in_flight.pop(0)
+                isolating = False
+                METRICS.merge(worker_metrics)
+                yield file_path, sentences, None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_folder(self, folder_path, workers=None):
+        """
+        Streams (file_path, sentence) tuples for the supported files of a folder.
+        Files are discovered and parsed lazily, so memory does not grow with
+        the size of the folder.
+        """
+        if not os.path.isdir(folder_path):
+            logger.error("Folder '%s' not found.", folder_path)
+            return
+
+        parsed = self.iter_parsed_files(self.iter_files(folder_path), workers=workers)
+        for file_path, sentences, _ in parsed:
+            for sentence, _ in sentences:
+                yield file_path, sentence
+
+    def scan_folder(self, folder_path, workers=None):
+        """
+        Scans a folder for supported files,
+        reads them as text, and returns a list of (file_path, sentence) tuples.
+        workers overrides Config.PARSE_WORKERS (1 parses serially).
+        """
+        return list(self.iter_folder(folder_path, workers=workers))
 
 
 # Example usage (for testing this module independently)
@@ -0,0 +1,118 @@
+import re
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from storage_format import EMBEDDING_DTYPE, SQLITE_MAX_VARIABLES
+
+
+def normalize_text(text):
+    """Canonical form used for cache keys: NFC unicode with collapsed whitespace."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model_name, text):
+    """Content address of a sentence embedding: SHA-256 of model name and normalized text."""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, size-bounded LRU cache of sentence embeddings in SQLite,
+    keyed by (model name, sentence hash). Safe to share between threads.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+        self._count, self._clock = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM embeddings"
+        ).fetchone()
+
+    def get_many(self, model_name, sentences):
+        """Returns a list with the cached embedding of each sentence, or None where missing."""
+        keys = [cache_key(model_name, sentence) for sentence in sentences]
+        found = {}
+        with self._lock:
+            unique_keys = list(set(keys))
+            for start in range(0, len(unique_keys), SQLITE_MAX_VARIABLES):
+                chunk = unique_keys[start : start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in self.conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", chunk
+                ):
+                    found[key] = np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+            if found:
+                # Mark hits as recently used for LRU eviction
+                self._clock += 1
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(self._clock, key) for key in found],
+                )
+                self.conn.commit()
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for result in results if result is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model_name, sentences, embeddings):
+        """Stores embeddings and evicts the least recently used entries beyond max_entries."""
+        vectors = np.asarray(embeddings, dtype=EMBEDDING_DTYPE).reshape(len(sentences), -1)
+        with self._lock:
+            self._clock += 1
+            rows = {
+                cache_key(model_name, sentence): vector.tobytes()
+                for sentence, vector in zip(sentences, vectors)
+            }
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                [(key, blob, self._clock) for key, blob in rows.items()],
+            )
+            self._count += self.conn.total_changes - before
+            if self._count > self.max_entries:
+                excess = self._count - self.max_entries
+                self.conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self._count -= excess
+                self.evictions += excess
+            self.conn.commit()
+
+    def stats(self):
+        """Hit/miss counters for this process and the current cache size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": self._count,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -1,45 +1,299 @@
-from transformers import AutoTokenizer, AutoModel
-import torch
-from sentence_transformers import (
-    SentenceTransformer,
-)  # Often used for convenient sentence embeddings
-from tqdm import tqdm
+import logging
+import threading
+import numpy as np
+from config import Config
+from embedding_cache import EmbeddingCache, normalize_text
+from lru_cache import LRUCache
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Output sizes of common models, so the database can be opened and cached
+# embeddings served before the model itself has been loaded
+KNOWN_DIMENSIONS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L12-v2": 384,
+    "sentence-transformers/paraphrase-MiniLM-L6-v2": 384,
+    "sentence-transformers/multi-qa-MiniLM-L6-cos-v1": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+}
+
+
+class SentenceTransformerBackend:
+    """PyTorch inference through sentence-transformers."""
+
+    name = "torch"
+
+    def __init__(self, model_name):
+        # Imported here: torch and transformers take seconds to import
+        from sentence_transformers import SentenceTransformer
+
+        # Using SentenceTransformer for ease of use. It wraps Hugging Face models.
+        self.model = SentenceTransformer(model_name)
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences):
+        """Returns an (N, dim) float32 array of sentence embeddings."""
+        embeddings = self.model.encode(
+            list(sentences),
+            batch_size=len(sentences),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return embeddings.astype(np.float32, copy=False)
+
+
+def create_backend(kind, model_name):
+    """Creates the inference backend named by Config.EMBEDDING_BACKEND ("torch", "onnx" or "fake")."""
+    if kind == "torch":
+        return SentenceTransformerBackend(model_name)
+    if kind == "onnx":
+        from onnx_backend import OnnxBackend
+
+        return OnnxBackend(model_name)
+    if kind == "fake":
+        from fake_backend import FAKE_DIMENSION, FakeBackend
+
+        # Same output size as the real model, so databases and caches line up
+        return FakeBackend(model_name, dimension=KNOWN_DIMENSIONS.get(model_name, FAKE_DIMENSION))
+    raise ValueError(f"Unknown embedding backend '{kind}'. Expected 'torch', 'onnx' or 'fake'.")
+
+
+def backend_name(kind):
+    """The name a backend of this kind will report, without creating it."""
+    if kind == "onnx":
+        from onnx_backend import backend_name as onnx_backend_name
+
+        return onnx_backend_name(Config.ONNX_QUANTIZED)
+    return kind
 
 
 class EmbeddingModel:
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", use_cache=None, backend=None):
         """
         Initializes the embedding model.
         all-MiniLM-L6-v2 is a good balance of size, speed, and quality (384 dimensions).
+        use_cache overrides Config.EMBEDDING_CACHE_ENABLED. backend is a backend
+        name overriding Config.EMBEDDING_BACKEND, or a ready backend object.
+        A named backend is loaded on first use or by prewarm().
         """
         self.model_name = model_name
-        # Using SentenceTransformer for ease of use. It wraps Hugging Face models.
-        print(f"\nLoading embedding model '{model_name}'...")
-        self.model = SentenceTransformer(model_name)
-        self.embedding_dimension = self.model.get_sentence_embedding_dimension()
-        print(
-            f"Model loaded. Embedding dimension: {self.embedding_dimension}"
-        )
+        self.cache = None
+        # Query embeddings depend only on the text and model, never on indexed data
+        self.query_cache = LRUCache(Config.QUERY_CACHE_SIZE)
+        if Config.EMBEDDING_CACHE_ENABLED if use_cache is None else use_cache:
+            Config.ensure_directories()
+            self.cache = EmbeddingCache(Config.EMBEDDING_CACHE_FILE, Config.EMBEDDING_CACHE_MAX_ENTRIES)
+        backend = backend or Config.EMBEDDING_BACKEND
+        self._backend = None
+        self._backend_kind = backend
+        self._load_lock = threading.Lock()
+        self.embedding_dimension = KNOWN_DIMENSIONS.get(model_name)
+        if isinstance(backend, str):
+            name = backend_name(backend)
+        else:
+            self._backend = backend
+            self._backend_kind = name = backend.name
+            self.embedding_dimension = backend.dimension
+        # Backends differ in the last few bits, so each keeps its own cache entries
+        self.cache_namespace = model_name if name == "torch" else f"{model_name}|{name}"
+
+    @property
+    def backend(self):
+        """The inference backend, loaded on first access."""
+        if self._backend is None:
+            with self._load_lock:
+                if self._backend is None:
+                    self._backend = self._load_backend()
+        return self._backend
+
+    def _load_backend(self):
+        logger.info("Loading embedding model '%s' (%s backend)...", self.model_name, self._backend_kind)
+        backend = create_backend(self._backend_kind, self.model_name)
+        if self.embedding_dimension not in (None, backend.dimension):
+            raise ValueError(
+                f"Model '{self.model_name}' produces {backend.dimension}-dim embeddings, "
+                f"expected {self.embedding_dimension}."
+            )
+        self.embedding_dimension = backend.dimension
+        logger.info("Model loaded. Embedding dimension: %s", self.embedding_dimension)
+        return backend
+
+    def prewarm(self):
+        """
+        Loads the model on a background thread and returns the thread. Callers
+        that need the model before it finishes simply wait for it.
+        """
+
+        def load():
+            try:
+                self.backend
+            except Exception as e:
+                # The next foreground use retries and reports the error itself
+                logger.error("Could not load the embedding model in the background: %s", e)
+
+        thread = threading.Thread(target=load, name="model-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def is_loaded(self):
+        """True once the backend has been loaded."""
+        return self._backend is not None
 
     def get_embedding_dimension(self):
         """Returns the dimension of the embeddings produced by this model."""
+        if self.embedding_dimension is None:
+            # Unknown model: the only way to find out is to load it
+            self.backend
         return self.embedding_dimension
 
     def get_sentence_embedding(self, sentence):
         """Generates an embedding vector for a single sentence."""
         if not sentence:
             return None
-        # SentenceTransformer handles tokenization and pooling automatically
-        embedding = self.model.encode(sentence, convert_to_tensor=True)
-        return embedding.tolist()  # Return as a list for SQLite storage
+        embedding = self.query_cache.get(sentence)
+        if embedding is None:
+            # The backend handles tokenization and pooling
+            with METRICS.timer("embed_batch_seconds", backend=self._backend_kind):
+                embedding = self.backend.encode([sentence])[0]
+            METRICS.inc("embedded_texts_total", backend=self._backend_kind)
+            embedding.flags.writeable = False  # Shared by later cache hits
+            self.query_cache.put(sentence, embedding)
+        return embedding
 
-    def get_batch_embeddings(self, sentences):
-        """Generates embeddings for a list of sentences in a batch."""
-        if not sentences:
+    def get_query_embeddings(self, queries):
+        """
+        Embeds several queries with one encode call and returns an (N, dim)
+        float32 array. Shares the in-memory query cache with
+        get_sentence_embedding; queries never touch the persistent cache.
+        """
+        embeddings = np.empty((len(queries), self.get_embedding_dimension()), dtype=np.float32)
+        missing = {}  # query -> positions still needing an embedding
+        for i, query in enumerate(queries):
+            cached = self.query_cache.get(query)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                missing.setdefault(query, []).append(i)
+
+        if missing:
+            encoded = self.encode_batched(list(missing))
+            for (query, positions), vector in zip(missing.items(), encoded):
+                embeddings[positions] = vector
+                vector.flags.writeable = False  # Shared by later cache hits
+                self.query_cache.put(query, vector)
+        return embeddings
+
+    def count_tokens(self, sentences):
+        """Returns the number of model tokens (after truncation) of each sentence."""
+        tokenizer, max_length = self.backend.tokenizer, self.backend.max_seq_length
+        with METRICS.timer("tokenize_seconds", backend=self._backend_kind):
+            encoded = tokenizer(list(sentences), add_special_tokens=True, truncation=True, max_length=max_length)
+        return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+
+    def token_spans(self, texts):
+        """
+        Returns, per text, the (start, end) character spans of its model tokens,
+        without special tokens or truncation. Needs a fast (Rust) tokenizer.
+        """
+        if not texts:
             return []
-        # Show progress bar for embedding generation
-        embeddings = self.model.encode(sentences, convert_to_tensor=True, show_progress_bar=True)
-        return embeddings.tolist()  # Return as a list of lists
+        encoded = self.backend.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            truncation=False,
+            return_offsets_mapping=True,
+        )
+        return [[tuple(span) for span in spans] for spans in encoded["offset_mapping"]]
+
+    @property
+    def max_passage_tokens(self):
+        """Longest text, in tokens, the model embeds without truncating it."""
+        return self.backend.max_seq_length - self.backend.tokenizer.num_special_tokens_to_add()
+
+    @staticmethod
+    def plan_batches(token_counts, token_budget, max_batch_size):
+        """
+        Groups sentence indices into batches of similar length. Sentences are
+        sorted longest first and a batch grows while batch size x its longest
+        sentence (the padded size) stays within token_budget.
+        """
+        order = np.argsort(-np.asarray(token_counts), kind="stable")
+        batches = []
+        start = 0
+        while start < len(order):
+            longest = max(1, int(token_counts[order[start]]))
+            size = max(1, min(max_batch_size, token_budget // longest))
+            batches.append(order[start : start + size])
+            start += size
+        return batches
+
+    def encode_batched(self, sentences, token_budget=None, max_batch_size=None):
+        """
+        Encodes sentences with length-bucketed, token-budgeted batches and
+        returns a contiguous (N, dim) float32 array in the original order.
+        """
+        token_budget = token_budget or Config.EMBED_TOKEN_BUDGET
+        max_batch_size = max_batch_size or Config.EMBED_MAX_BATCH_SIZE
+        embeddings = np.empty((len(sentences), self.get_embedding_dimension()), dtype=np.float32)
+        if not sentences:
+            return embeddings
+
+        token_counts = self.count_tokens(sentences)
+        for batch in self.plan_batches(token_counts, token_budget, max_batch_size):
+            with METRICS.timer("embed_batch_seconds", backend=self._backend_kind):
+                embeddings[batch] = self.backend.encode([sentences[i] for i in batch])
+            METRICS.inc("embedded_texts_total", len(batch), backend=self._backend_kind)
+            # Batches are sorted longest first, so every text is padded to the first one's length
+            padded_tokens = len(batch) * int(token_counts[batch[0]])
+            METRICS.inc("embed_padded_tokens_total", padded_tokens, backend=self._backend_kind)
+        return embeddings
+
+    def get_batch_embeddings(self, sentences):
+        """
+        Generates embeddings for a list of sentences as an (N, dim) float32 array.
+        Cached sentences are not re-encoded, and repeats within the batch are
+        encoded once.
+        """
+        if self.cache is None:
+            return self.encode_batched(sentences)
+
+        dimension = self.get_embedding_dimension()
+        embeddings = np.empty((len(sentences), dimension), dtype=np.float32)
+        missing = {}  # normalized sentence -> positions still needing an embedding
+        for i, cached in enumerate(self.cache.get_many(self.cache_namespace, sentences)):
+            if cached is not None and len(cached) == dimension:
+                embeddings[i] = cached
+            else:
+                missing.setdefault(normalize_text(sentences[i]), []).append(i)
+
+        misses = sum(len(positions) for positions in missing.values())
+        METRICS.inc("embedding_cache_hits_total", len(sentences) - misses)
+        METRICS.inc("embedding_cache_misses_total", misses)
+        if missing:
+            # Encode the first occurrence of each distinct sentence
+            unique = [sentences[positions[0]] for positions in missing.values()]
+            encoded = self.encode_batched(unique)
+            for positions, vector in zip(missing.values(), encoded):
+                embeddings[positions] = vector
+            self.cache.put_many(self.cache_namespace, unique, encoded)
+        return embeddings
+
+    def query_cache_stats(self):
+        """Returns hit/miss statistics of the in-memory query embedding cache."""
+        return self.query_cache.stats()
+
+    def cache_stats(self):
+        """Returns embedding cache hit/miss statistics, or None if caching is off."""
+        return self.cache.stats() if self.cache else None
+
+    def close(self):
+        """Releases the embedding cache."""
+        if self.cache:
+            self.cache.close()
 
 
 # Example usage (for testing this module independently)
@@ -0,0 +1,94 @@
+"""
+Deterministic stand-in for the embedding model, for benchmarks and tests:
+no torch, no download, and the same text gets the same vector in every
+process and on every machine. A text is embedded as a signed, feature-hashed
+bag of its lower-cased words and word pairs, L2-normalized, so texts sharing
+words are close and searches return meaningful neighbours.
+
+    EmbeddingModel(backend="fake")   or   Config.EMBEDDING_BACKEND = "fake"
+"""
+import re
+import hashlib
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+FAKE_DIMENSION = 384
+FAKE_MAX_SEQ_LENGTH = 256
+FAKE_VOCAB_SIZE = 30522
+CLS_TOKEN_ID, SEP_TOKEN_ID = 101, 102
+PAIR_WEIGHT = 0.5  # Weight of word pairs relative to single words
+FEATURE_CACHE_SIZE = 1 << 20  # Hashed features remembered before the cache is reset
+
+
+def _digest(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class FakeTokenizer:
+    """
+    Word-level tokenizer offering the part of the Hugging Face tokenizer
+    interface the application uses: input ids, offset mappings, truncation
+    and the count of special tokens.
+    """
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def __call__(
+        self, texts, add_special_tokens=True, truncation=False, max_length=None, return_offsets_mapping=False,
+        **kwargs
+    ):
+        special = self.num_special_tokens_to_add() if add_special_tokens else 0
+        input_ids, offset_mapping = [], []
+        for text in texts:
+            spans = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+            if truncation and max_length:
+                spans = spans[: max(0, max_length - special)]
+            ids = [_digest(text[start:end].lower()) % FAKE_VOCAB_SIZE for start, end in spans]
+            if add_special_tokens:
+                ids = [CLS_TOKEN_ID] + ids + [SEP_TOKEN_ID]
+            input_ids.append(ids)
+            offset_mapping.append(spans)
+        encoded = {"input_ids": input_ids}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = offset_mapping
+        return encoded
+
+
+class FakeBackend:
+    """Feature-hashing embedding backend with the interface of SentenceTransformerBackend."""
+
+    name = "fake"
+
+    def __init__(self, model_name=None, dimension=FAKE_DIMENSION, max_seq_length=FAKE_MAX_SEQ_LENGTH):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_seq_length = max_seq_length
+        self.tokenizer = FakeTokenizer()
+        self._features = {}  # feature -> (column, sign)
+
+    def _feature(self, feature):
+        found = self._features.get(feature)
+        if found is None:
+            if len(self._features) >= FEATURE_CACHE_SIZE:
+                self._features.clear()
+            value = _digest(feature)
+            found = self._features[feature] = ((value >> 1) % self.dimension, 1.0 if value & 1 else -1.0)
+        return found
+
+    def encode(self, sentences):
+        """Returns an (N, dim) float32 array of unit-length embeddings (zero for texts without words)."""
+        embeddings = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        limit = self.max_seq_length - self.tokenizer.num_special_tokens_to_add()
+        for row, sentence in enumerate(sentences):
+            # Truncated like a real model's input
+            words = [word.lower() for word in TOKEN_PATTERN.findall(sentence)[:limit]]
+            for word in words:
+                column, sign = self._feature(word)
+                embeddings[row, column] += sign
+            for pair in zip(words, words[1:]):
+                column, sign = self._feature(" ".join(pair))
+                embeddings[row, column] += sign * PAIR_WEIGHT
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms > 0, norms, 1.0)
+        return embeddings
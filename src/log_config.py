@@ -0,0 +1,98 @@
+"""
+Leveled logging for the application. Library modules log through
+logging.getLogger(__name__) instead of printing; entry points call
+configure_logging() once.
+
+    LOG_LEVEL=DEBUG   adds per-file and per-query messages
+    LOG_LEVEL=WARNING keeps only problems (and hides the progress bar)
+    LOG_FORMAT=json   one JSON object per line, with any extra fields
+
+Without configure_logging() (library use, benchmarks) only warnings and
+errors are shown, through Python's default handler.
+"""
+import sys
+import json
+import logging
+from config import Config
+
+LOG_FORMATS = ("text", "json")
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+_handler = None  # The handler installed by configure_logging
+_settings = None  # Its (level, format), handed to worker processes
+
+
+def _extra_fields(record):
+    return {name: value for name, value in vars(record).items() if name not in _RECORD_FIELDS}
+
+
+class TextFormatter(logging.Formatter):
+    """
+    The message as it used to be printed, prefixed with the level from WARNING
+    up ("ERROR: ..."), followed by any extra fields as key=value.
+    """
+
+    def format(self, record):
+        text = record.getMessage()
+        if record.levelno >= logging.WARNING:
+            text = f"{record.levelname}: {text}"
+        extra = _extra_fields(record)
+        if extra:
+            text += " " + " ".join(
+                f"{name}={json.dumps(value, default=str) if isinstance(value, (dict, list)) else value}"
+                for name, value in extra.items()
+            )
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and the extra fields."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, log_format=None, stream=None):
+    """
+    Sends log records at or above level (default Config.LOG_LEVEL) to stream
+    (default stderr) in the given format (default Config.LOG_FORMAT).
+    Calling it again replaces the previous configuration.
+    """
+    global _handler, _settings
+    level = level or Config.LOG_LEVEL
+    if isinstance(level, str):
+        level = level.upper()
+    log_format = log_format or Config.LOG_FORMAT
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format '{log_format}'. Expected one of {LOG_FORMATS}.")
+
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    _handler = logging.StreamHandler(stream or sys.stderr)
+    _handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    root.addHandler(_handler)
+    root.setLevel(level)
+    _settings = (root.level, log_format)
+
+
+def logging_settings():
+    """The (level, format) set by configure_logging, or None; passed to worker processes."""
+    return _settings
+
+
+def configure_worker_logging(settings):
+    """Process pool initializer: applies the parent's logging settings in a worker process."""
+    if settings is not None:
+        configure_logging(*settings)
@@ -0,0 +1,329 @@
+"""
+Process-wide metrics: counters, gauges and latency histograms around the hot
+paths (parsing per format, sentence splitting, embedding batches, database
+writes, search phases). Recording one value is a dict update under a lock,
+cheap enough for every batch and every query; Config.METRICS_ENABLED = False
+turns it into a no-op.
+
+    with METRICS.timer("embed_batch_seconds", backend="onnx"):
+        ...
+    METRICS.inc("parsed_files_total", format="pdf")
+
+The numbers are exported in the Prometheus text format (GET /metrics on the
+HTTP service, or a file written by export_metrics() for a node_exporter
+textfile collector) and as one structured log record (log_metrics()).
+Parser and shard worker processes record into their own registry and hand
+it to the parent with drain(), which merge()s it.
+"""
+import os
+import json
+import time
+import bisect
+import logging
+import functools
+import threading
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "docsearch_"
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SNAPSHOT_QUANTILES = (0.5, 0.95, 0.99)
+
+METRIC_HELP = {
+    "parse_file_seconds": "Time to read one file and split it into sentences, by format",
+    "sentence_split_seconds_total": "Time spent splitting prose into sentences, by format",
+    "parsed_files_total": "Files parsed, by format",
+    "parsed_sentences_total": "Sentences and records extracted, by format",
+    "parse_errors_total": "Files that failed to parse completely, by format",
+    "chunk_seconds": "Time to group one file's sentences into passages, by strategy",
+    "tokenize_seconds": "Time to count the tokens of the texts of one embedding call, by backend",
+    "embed_batch_seconds": "Time of one forward pass of the embedding model, by backend",
+    "embedded_texts_total": "Texts run through the embedding model, by backend",
+    "embed_padded_tokens_total": "Tokens fed to the embedding model including padding, by backend",
+    "embedding_cache_hits_total": "Passages whose embedding came from the persistent cache",
+    "embedding_cache_misses_total": "Passages that had to be embedded",
+    "db_insert_seconds": "Time of one bulk insert transaction",
+    "db_inserted_rows_total": "Rows written to the sentences table",
+    "db_delete_seconds": "Time to delete the rows of one file",
+    "index_update_seconds": "Time to add newly inserted rows to the mmap, ANN and quantized indexes",
+    "search_seconds": "Time of one search call, by kind",
+    "search_result_cache_hits_total": "Searches answered from the result cache, by kind",
+    "search_phase_seconds": (
+        "Time of one search phase, by mode: scan (scoring, which includes top-k selection except in "
+        "matrix modes), topk, rerank, score (exact scores of given rows) and fetch (reading sentence text)"
+    ),
+    "sharded_search_seconds": "Time of one scatter-gather search across all shards, by kind",
+    "ingest_stage_busy_seconds_total": "Time an ingestion pipeline stage spent working, by stage",
+    "ingest_stage_wall_seconds_total": "Time an ingestion pipeline stage was running, by stage",
+    "ingest_files_total": "Files handled by an ingestion pipeline stage, by stage",
+    "ingest_sentences_total": "Sentences handled by an ingestion pipeline stage, by stage",
+    "http_requests_total": "HTTP requests answered, by path and status",
+    "http_request_seconds": "Time to answer one HTTP request, by path",
+    "server_active_searches": "Searches currently running",
+    "server_waiting_searches": "Searches waiting for a slot",
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in pairs) + "}"
+
+
+class _Timer:
+    """Context manager adding its duration to a histogram."""
+
+    __slots__ = ("metrics", "key", "started")
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics._observe(self.key, time.perf_counter() - self.started)
+        return False
+
+
+class _NullTimer:
+    """Stands in for _Timer while metrics are disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Thread-safe registry of labelled counters, gauges and histograms. A
+    series is a metric name plus its label values; the metric's type follows
+    from how it is recorded (inc, set_gauge, or observe/timer).
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}  # key -> [count per bucket (the last one is +Inf), sum]
+
+    def inc(self, name, value=1, **labels):
+        """Adds value to a counter."""
+        if not Config.METRICS_ENABLED:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """Sets a gauge to its current value."""
+        if not Config.METRICS_ENABLED:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        """Records one duration in a histogram."""
+        if Config.METRICS_ENABLED:
+            self._observe(_key(name, labels), seconds)
+
+    def _observe(self, key, seconds):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][slot] += 1
+            histogram[1] += seconds
+
+    def timer(self, name, **labels):
+        """Context manager recording the duration of its block in a histogram."""
+        if not Config.METRICS_ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, _key(name, labels))
+
+    def timed(self, name, **labels):
+        """Decorator recording the duration of every call in a histogram."""
+
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def drain(self):
+        """Returns everything recorded so far and starts over. Worker processes send this to their parent."""
+        with self._lock:
+            state = {"counters": self._counters, "gauges": self._gauges, "histograms": self._histograms}
+            self._counters, self._gauges, self._histograms = {}, {}, {}
+        return state
+
+    def merge(self, state, **labels):
+        """Adds the numbers of a drain()ed registry, optionally tagging its series with extra labels."""
+        if not state:
+            return
+
+        def relabel(key):
+            name, pairs = key
+            return _key(name, dict(pairs, **labels)) if labels else key
+
+        with self._lock:
+            for key, value in state["counters"].items():
+                key = relabel(key)
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, value in state["gauges"].items():
+                self._gauges[relabel(key)] = value
+            for key, (counts, total) in state["histograms"].items():
+                key = relabel(key)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = [list(counts), total]
+                else:
+                    histogram[0] = [mine + theirs for mine, theirs in zip(histogram[0], counts)]
+                    histogram[1] += total
+
+    def reset(self):
+        self.drain()
+
+    def _quantile(self, counts, fraction):
+        """Upper bound of the bucket holding the given quantile (None when it is the +Inf bucket)."""
+        target = fraction * sum(counts)
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def snapshot(self):
+        """
+        Returns the metrics as plain data for structured logs and JSON reports:
+        {name: [{"labels": {...}, "value": ...}]} for counters and gauges, and
+        count, sum, mean and bucket-resolution quantiles for histograms.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+
+        result = {}
+        for series in (counters, gauges):
+            for (name, labels), value in sorted(series.items()):
+                result.setdefault(name, []).append({"labels": dict(labels), "value": round(value, 6)})
+        for (name, labels), (counts, total) in sorted(histograms.items()):
+            count = sum(counts)
+            entry = {
+                "labels": dict(labels),
+                "count": count,
+                "sum": round(total, 6),
+                "mean": round(total / count, 6) if count else 0.0,
+            }
+            for fraction in SNAPSHOT_QUANTILES:
+                entry[f"p{round(fraction * 100)}"] = self._quantile(counts, fraction)
+            result.setdefault(name, []).append(entry)
+        return result
+
+    def render_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+
+        lines = []
+
+        def header(name, kind):
+            full_name = METRIC_PREFIX + name
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {full_name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            return full_name
+
+        for series, kind in ((counters, "counter"), (gauges, "gauge")):
+            current = None
+            for (name, labels), value in sorted(series.items()):
+                if name != current:
+                    full_name, current = header(name, kind), name
+                lines.append(f"{full_name}{_format_labels(labels)} {value}")
+
+        current = None
+        for (name, labels), (counts, total) in sorted(histograms.items()):
+            if name != current:
+                full_name, current = header(name, "histogram"), name
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+# The registry of this process
+METRICS = Metrics()
+
+
+def write_prometheus(path, metrics=METRICS):
+    """Writes the metrics to a Prometheus text file, replacing it atomically."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(metrics.render_prometheus())
+    os.replace(temp_path, path)
+
+
+def log_metrics(metrics=METRICS, message="Metrics snapshot"):
+    """Logs the metrics as one structured record (a "metrics" field in JSON logs)."""
+    logger.info(message, extra={"metrics": metrics.snapshot()})
+
+
+def export_metrics(path=None, metrics=METRICS):
+    """
+    Exports the metrics at the end of a run: to a Prometheus text file when
+    path (default Config.METRICS_FILE) is set, and to the log when
+    Config.METRICS_LOG is on.
+    """
+    path = path or Config.METRICS_FILE
+    if path:
+        try:
+            write_prometheus(path, metrics)
+        except OSError as e:
+            logger.error("Could not write metrics to %s: %s", path, e)
+    if Config.METRICS_LOG:
+        log_metrics(metrics)
+
+
+if __name__ == "__main__":
+    # Prints the format with a few sample series
+    with METRICS.timer("search_seconds", kind="sentences"):
+        time.sleep(0.002)
+    METRICS.inc("parsed_files_total", format="pdf")
+    print(METRICS.render_prometheus())
+    print(json.dumps(METRICS.snapshot(), indent=2))
@@ -0,0 +1,35 @@
+"""
+One-shot migration of a legacy database from JSON-encoded embeddings
+to binary float32 storage. The database is rewritten in place.
+
+Usage:
+    python src/migrate_db.py [path/to/document_embeddings.db]
+"""
+import os
+import sys
+from config import Config
+from log_config import configure_logging
+from vector_db import VectorDB
+
+
+def main():
+    configure_logging()
+    db_path = sys.argv[1] if len(sys.argv) > 1 else Config.DB_FILE
+    if not os.path.isfile(db_path):
+        print(f"Error: Database '{db_path}' does not exist.")
+        sys.exit(1)
+
+    size_before = os.path.getsize(db_path)
+    # Opening the database detects the legacy format and migrates it. No
+    # dimension is passed: the migration records that of the stored vectors.
+    db_manager = VectorDB(db_path=db_path)
+    embedding_dim = db_manager.embedding_dim
+    db_manager.close()
+    size_after = os.path.getsize(db_path)
+
+    print(f"Database size: {size_before / 1024:.1f} KB -> {size_after / 1024:.1f} KB")
+    print(f"Embedding dimension: {embedding_dim}")
+
+
+if __name__ == "__main__":
+    main()
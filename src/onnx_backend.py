@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import numpy as np
+from config import Config
+from log_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+SETTINGS_FILE = "embedding_settings.json"
+# Lowest cosine between PyTorch and ONNX embeddings of the same sentence that
+# "check" accepts; quantization costs some precision, so it gets a looser bound
+MIN_COSINE = 0.9999
+MIN_COSINE_QUANTIZED = 0.98
+
+
+def backend_name(quantized):
+    """Backend name, which also namespaces this backend's embedding cache entries."""
+    return "onnx-int8" if quantized else "onnx"
+
+
+def export_onnx(model_name, output_dir, quantize=False, opset=14):
+    """
+    Exports a sentence-transformers model to ONNX. The transformer is exported
+    as-is, and the mean pooling and normalization it is followed by are
+    recorded in a settings file and applied in numpy at inference time. With
+    quantize=True an int8 dynamically quantized copy is written as well.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    logger.info("Exporting '%s' to ONNX in '%s'...", model_name, output_dir)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    sample = tokenizer(["Export sample sentence."], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(output_dir)
+
+    settings = {
+        "model_name": model_name,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+    }
+    with open(os.path.join(output_dir, SETTINGS_FILE), "w") as f:
+        json.dump(settings, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            model_path,
+            os.path.join(output_dir, QUANTIZED_MODEL_FILE),
+            weight_type=QuantType.QInt8,
+        )
+    logger.info("ONNX export complete.")
+
+
+class OnnxBackend:
+    """
+    Runs an exported sentence-transformers model with ONNX Runtime on CPU:
+    tokenize, run the transformer, mean-pool over the attention mask and
+    (if the original model did) L2-normalize.
+    """
+
+    def __init__(self, model_name, model_dir=None, quantized=None, intra_op_threads=None, inter_op_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError(
+                "The ONNX backend needs onnxruntime. Install it with: pip install -e .[onnx]"
+            )
+        from transformers import AutoTokenizer
+
+        model_dir = model_dir or Config.ONNX_MODEL_DIR
+        quantized = Config.ONNX_QUANTIZED if quantized is None else quantized
+        model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        if not os.path.isfile(os.path.join(model_dir, model_file)):
+            export_onnx(model_name, model_dir, quantize=quantized)
+
+        with open(os.path.join(model_dir, SETTINGS_FILE)) as f:
+            settings = json.load(f)
+        if settings["model_name"] != model_name:
+            raise ValueError(
+                f"ONNX model in '{model_dir}' was exported from '{settings['model_name']}', "
+                f"not '{model_name}'."
+            )
+
+        options = ort.SessionOptions()
+        intra = Config.ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        inter = Config.ONNX_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+        if intra:
+            options.intra_op_num_threads = intra
+        if inter:
+            options.inter_op_num_threads = inter
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.name = backend_name(quantized)
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = settings["max_seq_length"]
+        self.dimension = settings["dimension"]
+        self.normalize = settings["normalize"]
+
+    def encode(self, sentences):
+        """Returns an (N, dim) float32 array of sentence embeddings."""
+        encoded = self.tokenizer(
+            list(sentences),
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        feed = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+        hidden = self.session.run(None, feed)[0]
+
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        embeddings = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings.astype(np.float32, copy=False)
+
+
+AGREEMENT_SENTENCES = [
+    "Dogs are loyal companions.",
+    "A swift deer runs through the forest.",
+    "The computer processed the data quickly.",
+    "Order 10248 was shipped to Reims on 1996-07-16.",
+    "Jupiter is the largest planet in the Solar System.",
+    "Cats are independent animals.",
+    "Please contact customer support if the invoice total is incorrect.",
+    "The quarterly report shows a 12% increase in revenue compared to last year.",
+]
+
+
+def min_cosine_bound(quantized):
+    return MIN_COSINE_QUANTIZED if quantized else MIN_COSINE
+
+
+def check_agreement(model_name, quantized=False, sentences=None, model_dir=None):
+    """
+    Encodes the same sentences with the PyTorch and ONNX backends and returns
+    the per-sentence cosine similarities between their embeddings.
+    """
+    from embedding_model import SentenceTransformerBackend
+
+    sentences = sentences or AGREEMENT_SENTENCES
+    reference = SentenceTransformerBackend(model_name).encode(sentences)
+    candidate = OnnxBackend(model_name, model_dir=model_dir, quantized=quantized).encode(sentences)
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return np.einsum("ij,ij->i", reference, candidate)
+
+
+def main():
+    """Command line entry point: export the ONNX model or check it against PyTorch."""
+    arg_parser = argparse.ArgumentParser(description="Manage the ONNX embedding backend.")
+    arg_parser.add_argument("--model", default=Config.MODEL_NAME, help="sentence-transformers model name")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export the model to ONNX")
+    export.add_argument("--output", default=Config.ONNX_MODEL_DIR, help="Output directory")
+    export.add_argument("--quantize", action="store_true", help="Also write an int8 quantized model")
+
+    check = commands.add_parser("check", help="Check cosine agreement with the PyTorch backend")
+    check.add_argument("--quantized", action="store_true", help="Check the int8 quantized model")
+    check.add_argument("--min-cosine", type=float, default=None, help="Fail below this cosine")
+    args = arg_parser.parse_args()
+    configure_logging()
+
+    if args.command == "export":
+        export_onnx(args.model, args.output, quantize=args.quantize)
+        return
+
+    min_cosine = args.min_cosine if args.min_cosine is not None else min_cosine_bound(args.quantized)
+    cosines = check_agreement(args.model, quantized=args.quantized)
+    print(f"Cosine agreement: min {cosines.min():.6f}, mean {cosines.mean():.6f}")
+    if cosines.min() < min_cosine:
+        print(f"FAILED: minimum cosine is below {min_cosine}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
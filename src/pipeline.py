@@ -0,0 +1,289 @@
+import time
+import queue
+import logging
+import threading
+from collections import namedtuple
+from tqdm import tqdm
+from config import Config
+from chunking import Chunker
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# One file to (re-)index. status is "added", "modified" or "touched"; touched
+# files changed metadata but not content, so only their manifest entry is
+# refreshed, keeping the sentence_count it already had.
+FileJob = namedtuple(
+    "FileJob", "container_path file_path size mtime content_hash status sentence_count"
+)
+
+_DONE = object()  # End-of-stream marker passed down the queues
+
+
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.files = 0
+        self.sentences = 0
+        self.busy_seconds = 0.0  # Time spent working, excluding waits on queues
+        self.started = None
+        self.finished = None
+
+    @property
+    def wall_seconds(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def as_dict(self):
+        wall = self.wall_seconds
+        return {
+            "stage": self.name,
+            "files": self.files,
+            "sentences": self.sentences,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "wall_seconds": round(wall, 3),
+            "files_per_second": round(self.files / wall, 2) if wall else 0.0,
+            "sentences_per_second": round(self.sentences / wall, 2) if wall else 0.0,
+            "utilization": round(self.busy_seconds / wall, 3) if wall else 0.0,
+        }
+
+    def record_metrics(self):
+        """Adds this run's figures to the process-wide ingestion metrics."""
+        METRICS.inc("ingest_stage_busy_seconds_total", self.busy_seconds, stage=self.name)
+        METRICS.inc("ingest_stage_wall_seconds_total", self.wall_seconds, stage=self.name)
+        METRICS.inc("ingest_files_total", self.files, stage=self.name)
+        METRICS.inc("ingest_sentences_total", self.sentences, stage=self.name)
+
+
+def pipeline_version(parser, chunker):
+    """The parser version stored in the file manifest, including the chunking settings."""
+    return f"{parser.PARSER_VERSION}+{chunker.signature}"
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion: discovery -> parse/split -> embed -> store.
+
+    Discovery, parsing and embedding run in their own threads connected by
+    bounded queues, so a slow stage applies backpressure to the ones before it
+    and only a few files are held in memory at a time. Parsing and sentence
+    splitting happen together in DocumentParser's process pool; the embed
+    stage groups sentences into passages with the Chunker, which needs the
+    model's tokenizer. Writes run on the calling thread, which owns the SQLite
+    connection.
+    """
+
+    def __init__(
+        self, parser, embedder, db_manager, queue_size=None, batch_size=None, workers=None, chunker=None
+    ):
+        self.parser = parser
+        self.embedder = embedder
+        self.db_manager = db_manager
+        self.chunker = chunker or Chunker(embedder)
+        # Recorded in the manifest: a file is re-indexed when parsing or chunking changes
+        self.parser_version = pipeline_version(parser, self.chunker)
+        self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+        self.batch_size = batch_size or Config.EMBED_BATCH_SIZE
+        self.workers = workers
+        self.stats = {name: StageStats(name) for name in ("discover", "parse", "embed", "store")}
+        self._abort = threading.Event()
+        self._error = None
+
+    def _put(self, out_queue, item):
+        """Blocking put that gives up if the pipeline is aborted."""
+        while not self._abort.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, in_queue):
+        """Blocking get that returns _DONE if the pipeline is aborted."""
+        while not self._abort.is_set():
+            try:
+                return in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _run_stage(self, name, target, *args):
+        """Runs a stage body, recording timings and turning errors into an abort."""
+        stats = self.stats[name]
+        stats.started = time.perf_counter()
+        try:
+            target(stats, *args)
+        except Exception as e:
+            self._error = e
+            self._abort.set()
+        finally:
+            stats.finished = time.perf_counter()
+
+    def _discover(self, stats, jobs, out_queue):
+        jobs = iter(jobs)
+        while True:
+            started = time.perf_counter()
+            job = next(jobs, None)
+            stats.busy_seconds += time.perf_counter() - started
+            if job is None:
+                break
+            stats.files += 1
+            if not self._put(out_queue, job):
+                return
+        self._put(out_queue, _DONE)
+
+    def _parse(self, stats, in_queue, out_queue):
+        pending = []  # Jobs handed to the parser, in order
+
+        def paths():
+            while True:
+                job = self._get(in_queue)
+                if job is _DONE:
+                    return
+                if job.status == "touched":
+                    # Nothing to parse; pass straight through to the writer
+                    self._put(out_queue, (job, None, None))
+                    continue
+                pending.append(job)
+                yield job.container_path
+
+        parsed = self.parser.iter_parsed_files(paths(), workers=self.workers)
+        while True:
+            started = time.perf_counter()
+            item = next(parsed, None)
+            stats.busy_seconds += time.perf_counter() - started
+            if item is None:
+                break
+            _, sentences, error = item
+            stats.files += 1
+            stats.sentences += len(sentences)
+            if not self._put(out_queue, (pending.pop(0), sentences, error)):
+                return
+        self._put(out_queue, _DONE)
+
+    def _embed(self, stats, in_queue, out_queue):
+        buffered = []  # (job, passages) waiting to fill a batch
+        buffered_count = 0
+
+        def flush():
+            # Small files share one encode call
+            sentences = [passage.text for _, passages in buffered for passage in passages]
+            started = time.perf_counter()
+            # The embedder buckets these by length into token-budgeted batches
+            embeddings = self.embedder.get_batch_embeddings(sentences)
+            stats.busy_seconds += time.perf_counter() - started
+            offset = 0
+            for job, passages in buffered:
+                stats.files += 1
+                stats.sentences += len(passages)
+                file_embeddings = embeddings[offset : offset + len(passages)]
+                offset += len(passages)
+                if not self._put(out_queue, (job, passages, file_embeddings, None)):
+                    return False
+            buffered.clear()
+            return True
+
+        while True:
+            item = self._get(in_queue)
+            if item is _DONE:
+                break
+            job, sentences, error = item
+            if error is not None or sentences is None:
+                # Failed or touched files carry no sentences to embed
+                if not self._put(out_queue, (job, None, None, error)):
+                    return
+                continue
+            started = time.perf_counter()
+            passages = self.chunker.chunk(sentences)
+            elapsed = time.perf_counter() - started
+            stats.busy_seconds += elapsed
+            METRICS.observe("chunk_seconds", elapsed, strategy=self.chunker.strategy)
+            buffered.append((job, passages))
+            buffered_count += len(passages)
+            if buffered_count >= self.batch_size:
+                if not flush():
+                    return
+                buffered_count = 0
+        if buffered and not flush():
+            return
+        self._put(out_queue, _DONE)
+
+    def run(self, jobs, report):
+        """
+        Processes FileJobs to completion, storing each file's sentences with one
+        bulk insert. jobs may be a lazy iterable; it is consumed on the
+        discovery thread. Appends each stored file to report["added"] or
+        report["modified"] and each failed one to report["failed"], and returns
+        per-stage stats.
+        """
+        file_queue = queue.Queue(maxsize=self.queue_size)
+        parsed_queue = queue.Queue(maxsize=self.queue_size)
+        embedded_queue = queue.Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(target=self._run_stage, args=("discover", self._discover, jobs, file_queue)),
+            threading.Thread(target=self._run_stage, args=("parse", self._parse, file_queue, parsed_queue)),
+            threading.Thread(target=self._run_stage, args=("embed", self._embed, parsed_queue, embedded_queue)),
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        stats = self.stats["store"]
+        stats.started = time.perf_counter()
+        # The bar is progress output like INFO messages, and goes with them
+        progress_bar = tqdm(desc="Vectorizing sentences", unit="sent", disable=not logger.isEnabledFor(logging.INFO))
+        try:
+            while True:
+                item = self._get(embedded_queue)
+                if item is _DONE:
+                    break
+                started = time.perf_counter()
+                self._store(*item, report=report)
+                stats.busy_seconds += time.perf_counter() - started
+                stats.files += 1
+                if item[1]:
+                    stats.sentences += len(item[1])
+                    progress_bar.update(len(item[1]))
+        except BaseException:
+            self._abort.set()
+            raise
+        finally:
+            progress_bar.close()
+            stats.finished = time.perf_counter()
+            for thread in threads:
+                thread.join()
+
+        for stage in self.stats.values():
+            stage.record_metrics()
+        if self._error is not None:
+            raise self._error
+        return [stage.as_dict() for stage in self.stats.values()]
+
+    def _store(self, job, passages, embeddings, error, report):
+        """Writes one file's results: replace its rows and refresh its manifest entry."""
+        if error is not None:
+            # Leave the manifest untouched so the file is retried next time
+            report["failed"].append(job.file_path)
+            return
+        if passages is None:
+            # Touched: same content, so only the manifest entry is refreshed
+            self.db_manager.upsert_file(
+                job.file_path, job.size, job.mtime, job.content_hash,
+                self.parser_version, self.embedder.model_name, job.sentence_count,
+            )
+            return
+        # Replaces the previous version's rows and manifest entry in one transaction
+        ids = self.db_manager.replace_file(
+            job.file_path, [passage.text for passage in passages], embeddings,
+            [passage.location for passage in passages],
+            [(passage.token_start, passage.token_end) for passage in passages],
+            job.size, job.mtime, job.content_hash, self.parser_version, self.embedder.model_name,
+        )
+        if ids is None:
+            report["failed"].append(job.file_path)
+            return
+        report[job.status].append(job.file_path)
@@ -0,0 +1,134 @@
+"""
+Per-run profiling, switched on with Config.PROFILE or the --profile option:
+
+    python src/app.py --profile cprofile index test_docs
+    python src/app.py --profile sample --profile-output index.folded index test_docs
+    python -m pstats profile.prof
+
+"cprofile" records every function call of the thread running the command
+(the pipeline's store stage, and searches) and writes a pstats file.
+"sample" has a background thread take a snapshot of every thread's stack each
+Config.PROFILE_SAMPLE_INTERVAL seconds. That costs little and also covers
+the pipeline's parse and embed threads. It writes collapsed stacks for
+flamegraph.pl or speedscope. Samples are wall-clock, so threads waiting on
+a queue show up in their wait. Both print the top functions when the run
+ends. Parser worker processes are not profiled: set PARSE_WORKERS=1 to
+profile parsing in-process.
+"""
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from config import Config
+
+PROFILERS = ("cprofile", "sample")
+DEFAULT_OUTPUTS = {"cprofile": "profile.prof", "sample": "profile.folded"}
+REPORT_ROWS = 20  # Functions listed in the summary
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads at a fixed interval and counts identical stacks."""
+
+    def __init__(self, interval=None):
+        self.interval = interval or Config.PROFILE_SAMPLE_INTERVAL
+        self.stacks = Counter()  # "outer;...;inner" -> samples
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        """Writes the stacks in the collapsed format: "outer;...;inner count" per line."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, rows=REPORT_ROWS):
+        """Returns [(function, self samples, total samples)], busiest first by self samples."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [(name, count, total[name]) for name, count in own.most_common(rows)]
+
+
+class Profiler:
+    """
+    Context manager profiling the block it wraps with one of PROFILERS, or
+    doing nothing when kind is None. The profile is written to output
+    (default DEFAULT_OUTPUTS[kind]) and summarized on stderr.
+    """
+
+    def __init__(self, kind=None, output=None, interval=None):
+        if kind is not None and kind not in PROFILERS:
+            raise ValueError(f"Unknown profiler '{kind}'. Expected one of {PROFILERS}.")
+        self.kind = kind
+        self.output = output or DEFAULT_OUTPUTS.get(kind)
+        self.interval = interval
+        self._profiler = None
+        self._started = None
+
+    def __enter__(self):
+        if self.kind == "cprofile":
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.kind == "sample":
+            self._profiler = SamplingProfiler(self.interval)
+            self._profiler.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._profiler is None:
+            return False
+        elapsed = time.perf_counter() - self._started
+        if self.kind == "cprofile":
+            import pstats
+
+            self._profiler.disable()
+            self._profiler.dump_stats(self.output)
+            print(f"\n--- Profile ({elapsed:.2f}s, cProfile) written to {self.output} ---", file=sys.stderr)
+            stats = pstats.Stats(self._profiler, stream=sys.stderr)
+            stats.sort_stats("cumulative").print_stats(REPORT_ROWS)
+        else:
+            self._profiler.stop()
+            self._profiler.write(self.output)
+            samples = max(1, self._profiler.samples)
+            print(
+                f"\n--- Profile ({elapsed:.2f}s, {self._profiler.samples} samples) written to {self.output} ---",
+                file=sys.stderr,
+            )
+            print(f"{'self':>7} {'total':>7}  function (all threads, % of samples)", file=sys.stderr)
+            for name, own, total in self._profiler.top_functions():
+                print(f"{own / samples:>7.1%} {total / samples:>7.1%}  {name}", file=sys.stderr)
+        return False
@@ -0,0 +1,278 @@
+import os
+import sys
+import argparse
+import numpy as np
+from ann_index import kmeans
+
+QUANTIZER_FORMAT_VERSION = 1
+SCORE_BATCH_ROWS = 65536  # Codes decoded/scored at once, bounds temporary float memory
+
+
+class ScalarQuantizer:
+    """
+    int8 scalar quantization: every dimension is mapped linearly from its
+    trained [min, max] range onto 256 levels. 1 byte per dimension.
+    """
+
+    kind = "sq8"
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.minimum = None
+        self.scale = None
+
+    @property
+    def code_size(self):
+        """Bytes per encoded vector."""
+        return self.dim
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.minimum = vectors.min(axis=0)
+        span = vectors.max(axis=0) - self.minimum
+        span[span == 0] = 1.0
+        self.scale = (span / 255.0).astype(np.float32)
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        codes = np.rint((vectors - self.minimum) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        return codes.astype(np.float32) * self.scale + self.minimum
+
+    def scores(self, query_vec, codes):
+        """
+        Asymmetric inner products of a float query with encoded vectors:
+        q.x ~= q.min + (q * scale).codes, without decoding the codes.
+        """
+        weighted = query_vec * self.scale
+        offset = float(query_vec @ self.minimum)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BATCH_ROWS):
+            batch = codes[start : start + SCORE_BATCH_ROWS]
+            out[start : start + len(batch)] = batch.astype(np.float32) @ weighted + offset
+        return out
+
+    def state(self):
+        return {"minimum": self.minimum, "scale": self.scale}
+
+    def load_state(self, data):
+        self.minimum = data["minimum"]
+        self.scale = data["scale"]
+
+
+class ProductQuantizer:
+    """
+    Product quantization: the vector is split into n_subvectors slices and each
+    slice is replaced by the id of its nearest of 256 k-means centroids.
+    1 byte per slice.
+    """
+
+    kind = "pq"
+
+    def __init__(self, dim, n_subvectors):
+        # Use the largest slice count <= n_subvectors that divides dim evenly
+        n_subvectors = max(1, min(n_subvectors, dim))
+        while dim % n_subvectors:
+            n_subvectors -= 1
+        self.dim = dim
+        self.n_subvectors = n_subvectors
+        self.sub_dim = dim // n_subvectors
+        self.codebooks = None  # (n_subvectors, 256, sub_dim)
+
+    @property
+    def code_size(self):
+        return self.n_subvectors
+
+    def _split(self, vectors):
+        return np.asarray(vectors, dtype=np.float32).reshape(-1, self.n_subvectors, self.sub_dim)
+
+    def train(self, vectors, n_iter=15, seed=0):
+        parts = self._split(vectors)
+        n_centroids = min(256, len(parts))
+        self.codebooks = np.zeros((self.n_subvectors, 256, self.sub_dim), dtype=np.float32)
+        for sub in range(self.n_subvectors):
+            centroids, _ = kmeans(parts[:, sub, :], n_centroids, n_iter=n_iter, seed=seed + sub)
+            self.codebooks[sub, : len(centroids)] = centroids
+            # Unused code slots repeat the first centroid so they are never closer
+            self.codebooks[sub, len(centroids) :] = centroids[0]
+
+    def encode(self, vectors):
+        parts = self._split(vectors)
+        codes = np.empty((len(parts), self.n_subvectors), dtype=np.uint8)
+        norms = np.einsum("skd,skd->sk", self.codebooks, self.codebooks)
+        for sub in range(self.n_subvectors):
+            # argmin ||x - c||^2 == argmax (2 x.c - ||c||^2)
+            scores = 2 * parts[:, sub, :] @ self.codebooks[sub].T - norms[sub]
+            codes[:, sub] = np.argmax(scores, axis=1)
+        return codes
+
+    def decode(self, codes):
+        parts = self.codebooks[np.arange(self.n_subvectors), codes]
+        return parts.reshape(len(codes), self.dim)
+
+    def scores(self, query_vec, codes):
+        """
+        Asymmetric distance computation: one lookup table of query-slice x
+        centroid inner products, then a table lookup and sum per code.
+        """
+        table = np.einsum("sd,skd->sk", self._split(query_vec)[0], self.codebooks)
+        out = np.empty(len(codes), dtype=np.float32)
+        subvectors = np.arange(self.n_subvectors)
+        for start in range(0, len(codes), SCORE_BATCH_ROWS):
+            batch = codes[start : start + SCORE_BATCH_ROWS]
+            out[start : start + len(batch)] = table[subvectors, batch].sum(axis=1)
+        return out
+
+    def state(self):
+        return {"codebooks": self.codebooks, "n_subvectors": np.array(self.n_subvectors)}
+
+    def load_state(self, data):
+        self.codebooks = data["codebooks"]
+
+
+def make_quantizer(kind, dim, n_subvectors=48):
+    """Creates an untrained quantizer of the given kind ("sq8" or "pq")."""
+    if kind == "sq8":
+        return ScalarQuantizer(dim)
+    if kind == "pq":
+        return ProductQuantizer(dim, n_subvectors)
+    raise ValueError(f"Unknown quantizer '{kind}'. Expected 'sq8' or 'pq'.")
+
+
+class QuantizedIndex:
+    """Encoded copies of the stored embeddings, scanned with asymmetric scoring."""
+
+    def __init__(self, quantizer):
+        self.quantizer = quantizer
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, quantizer.code_size), dtype=np.uint8)
+        self._pending = []
+        self.dirty = False
+
+    @property
+    def count(self):
+        return len(self.ids) + sum(len(ids) for ids, _ in self._pending)
+
+    @property
+    def nbytes(self):
+        """Memory held by the codes and ids."""
+        self._consolidate()
+        return self.codes.nbytes + self.ids.nbytes
+
+    def add(self, ids, vectors):
+        self._pending.append((np.asarray(ids, dtype=np.int64), self.quantizer.encode(vectors)))
+        self.dirty = True
+
+    def remove(self, ids):
+        self._consolidate()
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.ids, self.codes = self.ids[keep], self.codes[keep]
+            self.dirty = True
+        return removed
+
+    def reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, self.quantizer.code_size), dtype=np.uint8)
+        self._pending = []
+        self.dirty = True
+
+    def max_id(self):
+        self._consolidate()
+        return int(self.ids.max()) if len(self.ids) else 0
+
+    def _consolidate(self):
+        if not self._pending:
+            return
+        self.ids = np.concatenate([self.ids] + [ids for ids, _ in self._pending])
+        self.codes = np.concatenate([self.codes] + [codes for _, codes in self._pending])
+        self._pending = []
+
+    def search(self, query_vec, k):
+        """Returns (ids, approximate similarities) of the top-k codes, best first."""
+        self._consolidate()
+        if len(self.ids) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        similarities = self.quantizer.scores(np.asarray(query_vec, dtype=np.float32), self.codes)
+        k = min(k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return self.ids[top], similarities[top]
+
+    def save(self, path):
+        self._consolidate()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=np.array(QUANTIZER_FORMAT_VERSION),
+                kind=np.array(self.quantizer.kind),
+                dim=np.array(self.quantizer.dim),
+                ids=self.ids,
+                codes=self.codes,
+                **self.quantizer.state(),
+            )
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["version"]) != QUANTIZER_FORMAT_VERSION:
+                raise ValueError(f"Unsupported quantized index version in '{path}'.")
+            kind = str(data["kind"])
+            n_subvectors = int(data["n_subvectors"]) if "n_subvectors" in data else 0
+            quantizer = make_quantizer(kind, int(data["dim"]), n_subvectors)
+            quantizer.load_state(data)
+            index = cls(quantizer)
+            index.ids = data["ids"]
+            index.codes = data["codes"]
+        return index
+
+
+def main():
+    """Command line entry point: build quantized codes or report their accuracy."""
+    from config import Config
+    from log_config import configure_logging
+    from vector_db import VectorDB
+
+    arg_parser = argparse.ArgumentParser(description="Manage quantized embedding codes.")
+    arg_parser.add_argument("--db", default=Config.DB_FILE, help="Path to the embeddings database")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Train a codec and (re)encode all embeddings")
+    build.add_argument("kind", choices=["sq8", "pq"])
+
+    report = commands.add_parser("report", help="Report compression and recall@k against exact search")
+    report.add_argument("--queries", type=int, default=100, help="Number of sample queries")
+    report.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    args = arg_parser.parse_args()
+    configure_logging()
+
+    if not os.path.isfile(args.db):
+        print(f"Error: Database '{args.db}' does not exist.")
+        sys.exit(1)
+    db_manager = VectorDB(db_path=args.db)
+
+    if args.command == "build":
+        db_manager.build_quantized_index(args.kind)
+    else:
+        rows = db_manager.quantization_report(n_queries=args.queries, k=args.k)
+        print(
+            f"\n{'codec':>6} {'bytes/vec':>9} {'ratio':>6} {'recall@' + str(args.k):>10} "
+            f"{'reranked':>9} {'ms/query':>9}"
+        )
+        for row in rows:
+            print(
+                f"{row['codec']:>6} {row['bytes_per_vector']:>9} {row['compression']:>5.1f}x "
+                f"{row['recall']:>10.3f} {row['recall_reranked']:>9.3f} {row['query_ms']:>9.2f}"
+            )
+
+    db_manager.close()
+
+
+if __name__ == "__main__":
+    main()
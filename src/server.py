@@ -0,0 +1,423 @@
+"""
+Asynchronous HTTP search service around EmbeddingModel and VectorDB.
+
+    python src/server.py --port 8080
+    curl -X POST localhost:8080/search -d '{"query": "cats and dogs", "limit": 5}'
+    curl localhost:8080/index-status
+    curl localhost:8080/health
+    curl localhost:8080/metrics      (Prometheus text format, see src/metrics.py)
+
+Concurrent searches are coalesced into micro-batches: one encode call and one
+matrix-matrix product answer every query that arrives within
+Config.SERVER_BATCH_WINDOW_MS of the first.
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from sharding import database_exists, open_vector_db
+from metrics import METRICS
+from log_config import configure_logging, logging_settings
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADERS = 100
+KEEP_ALIVE_TIMEOUT = 30  # Seconds an idle keep-alive connection is kept open
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class HTTPError(Exception):
+    """An error answered with the given status code and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent search requests. The first request of a batch waits
+    up to window seconds for others; the batch is then embedded with one
+    encode call and scored with one matrix product on the worker thread.
+    While a batch runs, new requests queue up and form the next one.
+    """
+
+    def __init__(self, embedder, executor, window, max_batch_size):
+        self.embedder = embedder
+        self.db_manager = None  # Set once opened on the worker thread
+        self.executor = executor
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.batched_queries = 0
+        self.largest_batch = 0
+
+    async def search(self, query, limit, distance_threshold):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, limit, distance_threshold, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Anything that queued up meanwhile joins as well
+            while len(batch) < self.max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            # Requests that timed out while waiting are dropped
+            batch = [item for item in batch if not item[3].done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.batched_queries += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            requests = [(query, limit, threshold) for query, limit, threshold, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self._search_batch, requests)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (*_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _search_batch(self, requests):
+        """Runs on the worker thread: embeds all queries, then searches per (limit, threshold) group."""
+        embeddings = self.embedder.get_query_embeddings([query for query, _, _ in requests])
+        groups = {}
+        for i, (_, limit, threshold) in enumerate(requests):
+            groups.setdefault((limit, threshold), []).append(i)
+
+        results = [None] * len(requests)
+        for (limit, threshold), positions in groups.items():
+            found = self.db_manager.search_similar_sentences_batch(
+                embeddings[positions], limit=limit, distance_threshold=threshold
+            )
+            for i, result in zip(positions, found):
+                results[i] = result
+        return results
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.batched_queries,
+            "mean_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self.queue.qsize(),
+        }
+
+
+class SearchServer:
+    """
+    HTTP/1.1 service with keep-alive. All model and database work runs on a
+    single worker thread that owns the SQLite connection. Searches are
+    admitted by a semaphore, load is shed with 503 once too many are waiting,
+    and each search is bounded by a timeout (504).
+    """
+
+    def __init__(
+        self, embedder, db_path, max_concurrency=None, max_pending=None, request_timeout=None, shard_count=None
+    ):
+        self.embedder = embedder
+        self.db_path = db_path
+        self.shard_count = shard_count
+        self.max_pending = max_pending or Config.SERVER_MAX_PENDING
+        self.request_timeout = request_timeout or Config.SERVER_REQUEST_TIMEOUT
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-worker")
+        self.batcher = MicroBatcher(
+            embedder, self.executor, Config.SERVER_BATCH_WINDOW_MS / 1000.0, Config.SERVER_MAX_BATCH_SIZE
+        )
+        self.semaphore = None  # Created on the event loop in start()
+        self.max_concurrency = max_concurrency or Config.SERVER_MAX_CONCURRENCY
+        self.started_at = time.time()
+        self.active = 0
+        self.waiting = 0
+        self.requests = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._batcher_task = None
+
+    async def start(self, host, port):
+        loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        # SQLite connections belong to the thread that opened them
+        self.batcher.db_manager = await loop.run_in_executor(
+            self.executor, lambda: open_vector_db(self.db_path, self.shard_count)
+        )
+        await loop.run_in_executor(self.executor, self.batcher.db_manager.warm_up)
+        self.embedder.prewarm()
+        self._batcher_task = asyncio.ensure_future(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info("Serving search on http://%s:%s", host, port)
+        return server
+
+    async def close(self):
+        if self._batcher_task:
+            self._batcher_task.cancel()
+        if self.batcher.db_manager:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.batcher.db_manager.close)
+        self.executor.shutdown(wait=True)
+        self.embedder.close()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPError as e:
+                    self._write_response(writer, e.status, {"error": e.message}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, keep_alive, body = request
+                status, payload = await self._dispatch(method, target, body)
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Returns (method, target, keep_alive, body), or None when the client closed the connection."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(400, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+        return method.upper(), target, keep_alive, body
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        """Writes a JSON response, or a plain text one when payload is a string."""
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), PROMETHEUS_CONTENT_TYPE
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def _dispatch(self, method, target, body):
+        started = time.perf_counter()
+        path = urlsplit(target).path
+        status, payload = await self._route(method, target, body)
+        # Unknown paths share one label, so clients cannot create unbounded series
+        path = path if status != 404 else "other"
+        METRICS.inc("http_requests_total", path=path, status=status)
+        METRICS.observe("http_request_seconds", time.perf_counter() - started, path=path)
+        return status, payload
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        routes = {
+            "/search": ("GET", "POST"),
+            "/index-status": ("GET",),
+            "/health": ("GET",),
+            "/metrics": ("GET",),
+        }
+        if url.path not in routes:
+            return 404, {"error": f"Unknown path '{url.path}'"}
+        if method not in routes[url.path]:
+            return 405, {"error": f"Method {method} not allowed on {url.path}"}
+        try:
+            if url.path == "/health":
+                return 200, self.health()
+            if url.path == "/index-status":
+                return 200, await self.index_status()
+            if url.path == "/metrics":
+                return 200, await self.metrics()
+            return 200, await self.search(self._parse_search(url.query, body))
+        except HTTPError as e:
+            return e.status, {"error": e.message}
+        except Exception as e:
+            logger.exception("Request %s %s failed: %s", method, url.path, e)
+            return 500, {"error": "Internal server error"}
+
+    def _parse_search(self, query_string, body):
+        """Reads query, limit and threshold from the JSON body or the query string."""
+        if body:
+            try:
+                params = json.loads(body)
+            except ValueError:
+                raise HTTPError(400, "Body must be JSON")
+            if not isinstance(params, dict):
+                raise HTTPError(400, "Body must be a JSON object")
+        else:
+            params = {key: values[0] for key, values in parse_qs(query_string).items()}
+            if "q" in params:
+                params.setdefault("query", params.pop("q"))
+
+        query = params.get("query")
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "'query' must be a non-empty string")
+        try:
+            limit = int(params.get("limit", Config.DEFAULT_SEARCH_LIMIT))
+            threshold = float(params.get("threshold", Config.DISTANCE_THRESHOLD))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "'limit' must be an integer and 'threshold' a number")
+        if not 1 <= limit <= Config.SERVER_MAX_LIMIT:
+            raise HTTPError(400, f"'limit' must be between 1 and {Config.SERVER_MAX_LIMIT}")
+        return query, limit, threshold
+
+    async def search(self, params):
+        query, limit, threshold = params
+        self.requests += 1
+        if self.semaphore.locked() and self.waiting >= self.max_pending:
+            self.rejected += 1
+            raise HTTPError(503, "Server is overloaded, try again later")
+
+        started = time.perf_counter()
+
+        async def admitted_search():
+            self.waiting += 1
+            try:
+                await self.semaphore.acquire()
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            try:
+                return await self.batcher.search(query, limit, threshold)
+            finally:
+                self.active -= 1
+                self.semaphore.release()
+
+        try:
+            results = await asyncio.wait_for(admitted_search(), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise HTTPError(504, f"Search timed out after {self.request_timeout}s")
+        return {
+            "query": query,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def health(self):
+        return {
+            "status": "ok",
+            "model_loaded": self.embedder.is_loaded,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+        }
+
+    async def metrics(self):
+        """The process's metrics, including those of shard workers, in the Prometheus text format."""
+        db_manager = self.batcher.db_manager
+        if hasattr(db_manager, "collect_metrics"):
+            await asyncio.get_running_loop().run_in_executor(self.executor, db_manager.collect_metrics)
+        METRICS.set_gauge("server_active_searches", self.active)
+        METRICS.set_gauge("server_waiting_searches", self.waiting)
+        return METRICS.render_prometheus()
+
+    async def index_status(self):
+        db_manager = self.batcher.db_manager
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(self.executor, db_manager.stats)
+        stats["result_cache"] = await loop.run_in_executor(self.executor, db_manager.result_cache_stats)
+        stats["query_cache"] = self.embedder.query_cache_stats()
+        stats["server"] = {
+            "requests": self.requests,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "batching": self.batcher.stats(),
+        }
+        return stats
+
+
+async def serve(host, port, db_path, shard_count=None):
+    from embedding_model import EmbeddingModel
+
+    server = SearchServer(EmbeddingModel(model_name=Config.MODEL_NAME), db_path, shard_count=shard_count)
+    listener = await server.start(host, port)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Serve semantic search over HTTP.")
+    arg_parser.add_argument("--db", default=Config.DB_FILE, help="Path to the embeddings database")
+    arg_parser.add_argument(
+        "--shards", type=int, default=Config.SHARD_COUNT, help="Database shards, one worker process each"
+    )
+    arg_parser.add_argument("--host", default=Config.SERVER_HOST)
+    arg_parser.add_argument("--port", type=int, default=Config.SERVER_PORT)
+    args = arg_parser.parse_args(argv)
+    if args.shards < 1:
+        arg_parser.error(f"argument --shards: must be at least 1, got {args.shards}")
+
+    if logging_settings() is None:
+        configure_logging()  # Run directly rather than through app.py
+    if not database_exists(args.db, args.shards):
+        print(f"Error: Database '{args.db}' does not exist. Index a folder first.")
+        return 1
+    try:
+        asyncio.run(serve(args.host, args.port, args.db, args.shards))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
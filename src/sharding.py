@@ -0,0 +1,424 @@
+"""
+Sharded vector index. The corpus is partitioned by a hash of the file path
+across N VectorDB files, each opened by its own worker process, so searches
+use N cores and each process only holds 1/N of the embeddings in memory.
+
+    python src/app.py --shards 4 index test_docs
+    python src/app.py --shards 4 query "how do I reset my password"
+    python src/app.py --shards 4 serve
+
+A shard count of 1 (the default, Config.SHARD_COUNT) is the plain,
+unsharded database. Shard files are named after the database and the shard
+count (document_embeddings.0-of-4.db, ...), so changing the count means
+indexing again.
+"""
+import os
+import sys
+import heapq
+import hashlib
+import logging
+import threading
+import multiprocessing
+from itertools import islice
+from operator import itemgetter
+import numpy as np
+from config import Config
+from vector_db import VectorDB
+from metrics import METRICS
+from log_config import configure_worker_logging, logging_settings
+
+logger = logging.getLogger(__name__)
+
+
+def shard_index(file_path, shard_count):
+    """Returns the shard that owns a file. Stable across processes and runs."""
+    digest = hashlib.blake2b(file_path.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def shard_db_paths(db_path, shard_count):
+    """Returns the database file of every shard."""
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.{i}-of-{shard_count}{ext}" for i in range(shard_count)]
+
+
+def resolve_shard_count(shard_count=None):
+    """Returns shard_count, or Config.SHARD_COUNT when it is None. Raises ValueError below 1."""
+    if shard_count is None:
+        shard_count = Config.SHARD_COUNT
+    if shard_count < 1:
+        raise ValueError(f"Shard count must be at least 1, got {shard_count}.")
+    return shard_count
+
+
+def database_exists(db_path, shard_count=None):
+    """True if the database (every shard of it, when sharded) exists."""
+    shard_count = resolve_shard_count(shard_count)
+    if shard_count <= 1:
+        return os.path.isfile(db_path)
+    return all(os.path.isfile(path) for path in shard_db_paths(db_path, shard_count))
+
+
+def open_vector_db(db_path=Config.DB_FILE, shard_count=None, **kwargs):
+    """Opens a VectorDB, or a ShardedVectorDB when shard_count is above 1."""
+    shard_count = resolve_shard_count(shard_count)
+    if shard_count <= 1:
+        return VectorDB(db_path=db_path, **kwargs)
+    return ShardedVectorDB(db_path=db_path, shard_count=shard_count, **kwargs)
+
+
+def merge_results(result_lists, limit, key="distance", reverse=False):
+    """
+    Merges per-shard result lists, each sorted by `key` (ascending, or
+    descending with reverse=True), into the overall top `limit`. A file lives
+    on exactly one shard, so the lists never share a file and stay unique per
+    file after merging.
+    """
+    return list(islice(heapq.merge(*result_lists, key=itemgetter(key), reverse=reverse), limit))
+
+
+# Message asking a shard worker for the metrics it recorded since the last one
+DRAIN_METRICS = "drain_metrics"
+
+
+def _shard_worker(conn, db_path, embedding_dim, search_mode, log_settings=None):
+    """Worker process entry point: serves VectorDB method calls for one shard."""
+    # Keep the coordinator's stdout for results; shard messages are diagnostics
+    sys.stdout = sys.stderr
+    configure_worker_logging(log_settings)
+    db_manager = VectorDB(db_path=db_path, embedding_dim=embedding_dim, search_mode=search_mode)
+    conn.send(("ok", db_manager.embedding_dim))
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            method, args, kwargs = message
+            try:
+                if method == DRAIN_METRICS:
+                    conn.send(("ok", METRICS.drain()))
+                    continue
+                conn.send(("ok", getattr(db_manager, method)(*args, **kwargs)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        db_manager.close()
+
+
+class ShardedVectorDB:
+    """
+    A VectorDB split across shard_count worker processes. Writes go to the
+    shard that owns the file; searches are sent to every shard at once and
+    the per-shard top-k lists are merged with a heap. Offers the parts of the
+    VectorDB interface used for indexing, searching and statistics.
+    """
+
+    def __init__(
+        self,
+        db_path=Config.DB_FILE,
+        shard_count=None,
+        embedding_dim=None,
+        search_mode=Config.SEARCH_MODE,
+    ):
+        self.db_path = db_path
+        self.shard_count = resolve_shard_count(shard_count)
+        self.search_mode = search_mode
+        self.shard_paths = shard_db_paths(db_path, self.shard_count)
+        self.embedding_dim = embedding_dim  # Until the shards report the dimension they hold
+        # A pipe carries one request at a time, so scatter-gathers are serialized
+        self._lock = threading.Lock()
+        self._pipes = []
+        self._processes = []
+        for shard in range(self.shard_count):
+            pipe, process = self._start_worker(shard, embedding_dim)
+            self._pipes.append(pipe)
+            self._processes.append(process)
+
+        with self._lock:
+            replies = [self._receive(shard) for shard in range(self.shard_count)]
+        try:
+            dims = [self._result(shard, "open", reply) for shard, reply in enumerate(replies)]
+        except RuntimeError:
+            self.close()
+            raise
+        if len(set(dims)) > 1:
+            self.close()
+            raise ValueError(f"Shards of '{db_path}' hold different embedding dimensions: {dims}.")
+        self.embedding_dim = dims[0]
+        logger.info("Opened %s shards of '%s'.", self.shard_count, db_path)
+
+    def _start_worker(self, shard, embedding_dim):
+        """Starts the worker process of one shard. Returns its pipe and process; it answers "open" first."""
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_shard_worker,
+            args=(child_conn, self.shard_paths[shard], embedding_dim, self.search_mode, logging_settings()),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return parent_conn, process
+
+    def _restart_worker(self, shard):
+        """Replaces a worker that exited, so its shard keeps serving later calls."""
+        self._pipes[shard].close()
+        if self._processes[shard].is_alive():
+            self._processes[shard].terminate()
+        self._processes[shard].join(timeout=10)
+        self._pipes[shard], self._processes[shard] = self._start_worker(shard, self.embedding_dim)
+        try:
+            self._result(shard, "open", self._receive(shard))
+            logger.warning("Restarted the worker of shard %s (%s).", shard, self.shard_paths[shard])
+        except RuntimeError as e:
+            logger.error("Could not restart the worker of shard %s: %s", shard, e)
+
+    def _receive(self, shard):
+        """Reads one reply: ("ok", value), ("error", message), or ("exited", None) if the worker is gone."""
+        try:
+            return self._pipes[shard].recv()
+        except (EOFError, OSError):
+            return "exited", None
+
+    def _result(self, shard, method, reply):
+        status, value = reply
+        if status == "exited":
+            raise RuntimeError(f"Shard {shard} ({self.shard_paths[shard]}) exited unexpectedly.")
+        if status != "ok":
+            raise RuntimeError(f"Shard {shard} ({self.shard_paths[shard]}) failed in {method}: {value}")
+        return value
+
+    def _scatter(self, requests):
+        """Sends {shard: (method, args, kwargs)} and returns {shard: result} once all have answered."""
+        with self._lock:
+            replies = {}
+            for shard, request in requests.items():
+                try:
+                    self._pipes[shard].send(request)
+                except OSError:
+                    replies[shard] = ("exited", None)
+            # Every reply is read before any error is raised, so none is left
+            # in a pipe to be taken for the answer to a later call
+            for shard in requests:
+                if shard not in replies:
+                    replies[shard] = self._receive(shard)
+            for shard, (status, _) in replies.items():
+                if status == "exited":
+                    self._restart_worker(shard)
+            return {shard: self._result(shard, requests[shard][0], replies[shard]) for shard in requests}
+
+    def _call(self, shard, method, *args, **kwargs):
+        return self._scatter({shard: (method, args, kwargs)})[shard]
+
+    def _call_all(self, method, *args, **kwargs):
+        results = self._scatter({shard: (method, args, kwargs) for shard in range(self.shard_count)})
+        return [results[shard] for shard in range(self.shard_count)]
+
+    def shard_for(self, file_path):
+        return shard_index(file_path, self.shard_count)
+
+    def insert_sentence_embedding(self, file_path, sentence_text, embedding):
+        """Inserts a single sentence. Returns its row id within its shard."""
+        ids = self.insert_sentence_embeddings(file_path, [sentence_text], [embedding])
+        return ids[0] if ids else None
+
+    def insert_sentence_embeddings(self, file_paths, sentences, embeddings, locations=None, token_spans=None):
+        """
+        Inserts sentences into the shards owning their files, in parallel.
+        Returns the new row ids in input order; ids are only unique within a shard.
+        """
+        if not sentences:
+            return []
+        if isinstance(file_paths, str):
+            return self._call(
+                self.shard_for(file_paths), "insert_sentence_embeddings", file_paths, sentences, embeddings,
+                locations, token_spans,
+            )
+
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(sentences), -1)
+        positions = {}
+        for i, file_path in enumerate(file_paths):
+            positions.setdefault(self.shard_for(file_path), []).append(i)
+        results = self._scatter({
+            shard: (
+                "insert_sentence_embeddings",
+                (
+                    [file_paths[i] for i in rows], [sentences[i] for i in rows], embeddings[rows],
+                    None if locations is None else [locations[i] for i in rows],
+                    None if token_spans is None else [token_spans[i] for i in rows],
+                ),
+                {},
+            )
+            for shard, rows in positions.items()
+        })
+        if any(len(results[shard]) != len(rows) for shard, rows in positions.items()):
+            return []
+        ids = [None] * len(sentences)
+        for shard, rows in positions.items():
+            for i, row_id in zip(rows, results[shard]):
+                ids[i] = row_id
+        return ids
+
+    def replace_file(self, file_path, *args):
+        """VectorDB.replace_file on the shard owning the file."""
+        return self._call(self.shard_for(file_path), "replace_file", file_path, *args)
+
+    def delete_file(self, file_path):
+        return self._call(self.shard_for(file_path), "delete_file", file_path)
+
+    def upsert_file(self, path, *args):
+        return self._call(self.shard_for(path), "upsert_file", path, *args)
+
+    def get_file_manifest(self):
+        manifest = {}
+        for shard_manifest in self._call_all("get_file_manifest"):
+            manifest.update(shard_manifest)
+        return manifest
+
+    def clear_database(self):
+        self._call_all("clear_database")
+
+    def warm_up(self):
+        self._call_all("warm_up")
+
+    @METRICS.timed("sharded_search_seconds", kind="sentences")
+    def search_similar_sentences(
+        self,
+        query_embedding,
+        limit=Config.DEFAULT_SEARCH_LIMIT,
+        distance_threshold=Config.DISTANCE_THRESHOLD,
+        approximate=None,
+        nprobe=None,
+    ):
+        """Searches every shard in parallel and merges their results, as VectorDB.search_similar_sentences."""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        shard_results = self._call_all(
+            "search_similar_sentences", query_embedding, limit, distance_threshold, approximate, nprobe
+        )
+        return merge_results(shard_results, limit)
+
+    @METRICS.timed("sharded_search_seconds", kind="files")
+    def search_similar_files(
+        self,
+        query_embedding,
+        limit=Config.DEFAULT_SEARCH_LIMIT,
+        distance_threshold=Config.DISTANCE_THRESHOLD,
+        aggregation=Config.FILE_AGGREGATION,
+        top_m=Config.FILE_TOP_M,
+        approximate=None,
+        nprobe=None,
+    ):
+        """Ranks files on every shard in parallel and merges the top files, as VectorDB.search_similar_files."""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        shard_results = self._call_all(
+            "search_similar_files", query_embedding, limit, distance_threshold, aggregation, top_m,
+            approximate, nprobe,
+        )
+        return merge_results(shard_results, limit)
+
+    @METRICS.timed("sharded_search_seconds", kind="hybrid")
+    def search_hybrid(
+        self,
+        query_text,
+        query_embedding,
+        limit=Config.DEFAULT_SEARCH_LIMIT,
+        distance_threshold=Config.DISTANCE_THRESHOLD,
+        mode=Config.HYBRID_MODE,
+    ):
+        """
+        VectorDB.search_hybrid on every shard, merged. BM25 statistics and
+        fusion ranks are per shard, so "rrf" scores are only comparable
+        approximately across shards.
+        """
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        # Whether "prefilter" falls back is decided over all shards, not per shard
+        shard_results = self._call_all(
+            "search_hybrid", query_text, query_embedding, limit, distance_threshold, mode, fallback=False
+        )
+        if any(results and "score" in results[0] for results in shard_results):
+            return merge_results(shard_results, limit, key="score", reverse=True)
+        merged = merge_results(shard_results, limit)
+        if not merged and mode == "prefilter":
+            return self.search_similar_sentences(query_embedding, limit, distance_threshold)
+        return merged
+
+    @METRICS.timed("sharded_search_seconds", kind="lexical")
+    def lexical_search(self, query_text, limit=Config.DEFAULT_SEARCH_LIMIT):
+        """VectorDB.lexical_search on every shard, merged by BM25 score."""
+        return merge_results(self._call_all("lexical_search", query_text, limit), limit, key="bm25")
+
+    @METRICS.timed("sharded_search_seconds", kind="batch")
+    def search_similar_sentences_batch(
+        self,
+        query_embeddings,
+        limit=Config.DEFAULT_SEARCH_LIMIT,
+        distance_threshold=Config.DISTANCE_THRESHOLD,
+    ):
+        """Sends the whole batch to every shard and merges the results per query."""
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        if len(query_embeddings) == 0:
+            return []
+        shard_results = self._call_all(
+            "search_similar_sentences_batch", query_embeddings, limit, distance_threshold
+        )
+        return [merge_results(per_query, limit) for per_query in zip(*shard_results)]
+
+    def stats(self):
+        """Returns VectorDB.stats() summed over the shards, plus a short entry per shard."""
+        shard_stats = self._call_all("stats")
+        stats = dict(shard_stats[0], db_path=self.db_path, shard_count=self.shard_count)
+        for key in ("db_bytes", "sentences", "files", "manifest_files"):
+            stats[key] = sum(shard[key] for shard in shard_stats)
+        measured = [shard for shard in shard_stats if shard["mean_chunk_tokens"] is not None]
+        stats["mean_chunk_tokens"] = round(
+            sum(shard["mean_chunk_tokens"] * shard["sentences"] for shard in measured)
+            / max(1, sum(shard["sentences"] for shard in measured)), 1
+        ) if measured else None
+        stats["parser_versions"] = sorted({version for shard in shard_stats for version in shard["parser_versions"]})
+        stats["indexes"] = {
+            name: None if any(shard["indexes"][name] is None for shard in shard_stats)
+            else sum(shard["indexes"][name] for shard in shard_stats)
+            for name in shard_stats[0]["indexes"]
+        }
+        stats["shards"] = [
+            {key: shard[key] for key in ("db_path", "sentences", "files")} for shard in shard_stats
+        ]
+        return stats
+
+    def result_cache_stats(self):
+        shard_stats = self._call_all("result_cache_stats")
+        totals = {key: sum(shard[key] for shard in shard_stats) for key in ("hits", "misses", "size", "max_size")}
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = totals["hits"] / lookups if lookups else 0.0
+        return totals
+
+    def collect_metrics(self):
+        """Merges the metrics the shard workers recorded into this process's METRICS, labelled by shard."""
+        for shard, state in enumerate(self._call_all(DRAIN_METRICS)):
+            METRICS.merge(state, shard=shard)
+
+    def close(self):
+        """Collects the workers' metrics, then stops them; they close their databases."""
+        if self._pipes:
+            try:
+                self.collect_metrics()
+            except RuntimeError as e:
+                logger.warning("Could not collect shard metrics: %s", e)
+        with self._lock:
+            for pipe in self._pipes:
+                try:
+                    pipe.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            for process in self._processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+            for pipe in self._pipes:
+                pipe.close()
+            self._pipes = []
+            self._processes = []
+        logger.info("Sharded database closed.")
@@ -0,0 +1,13 @@
+"""
+How embeddings are stored, shared by the vector database (vector_db.py) and
+the persistent embedding cache (embedding_cache.py) so both read and write
+the same blobs. Imports nothing heavier than numpy.
+"""
+import numpy as np
+
+# Embedding encodings recorded under the ``embedding_format`` metadata key.
+EMBEDDING_FORMAT_JSON = 1  # Legacy: json.dumps(list) stored as TEXT
+EMBEDDING_FORMAT_FLOAT32 = 2  # Little-endian float32 bytes
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+SQLITE_MAX_VARIABLES = 500  # Values per "IN (...)" lookup, below SQLite's parameter limit
@@ -1,40 +1,238 @@
 import sqlite3
 import os
 import json
+import time
+import heapq
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import quote
 import numpy as np
 from config import Config
+from vector_store import MmapVectorStore
+from ann_index import IVFIndex
+from quantization import QuantizedIndex, make_quantizer
+from lru_cache import LRUCache
+from metrics import METRICS
+from storage_format import EMBEDDING_DTYPE, EMBEDDING_FORMAT_FLOAT32, EMBEDDING_FORMAT_JSON, SQLITE_MAX_VARIABLES
+
+logger = logging.getLogger(__name__)
+
+READ_BATCH_SIZE = 1000  # Rows fetched per batch when streaming stored embeddings
+BATCH_SCORE_ELEMENTS = 1 << 24  # Bounds the (rows x queries) score matrix of a batch search (64 MB)
+
+QUANTIZED_MODES = ("sq8", "pq")
+SEARCH_MODES = ("matrix", "mmap", "python") + QUANTIZED_MODES
+FILE_AGGREGATIONS = ("max", "mean")
+FILE_CANDIDATE_GROWTH = 4  # Factor by which file searches widen their candidate rows
+HYBRID_MODES = ("rrf", "prefilter")
+# Columns of "sentences" added after its first release: source location and chunk boundaries
+ADDED_SENTENCE_COLUMNS = (("location", "TEXT"), ("token_start", "INTEGER"), ("token_end", "INTEGER"))
+
+# BM25 index over sentence_text. External content: the text lives only in
+# "sentences", and the triggers keep the index in step with it.
+CREATE_LEXICAL_INDEX_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS sentences_fts USING fts5(
+    sentence_text, content='sentences', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS sentences_fts_insert AFTER INSERT ON sentences BEGIN
+    INSERT INTO sentences_fts (rowid, sentence_text) VALUES (new.id, new.sentence_text);
+END;
+CREATE TRIGGER IF NOT EXISTS sentences_fts_delete AFTER DELETE ON sentences BEGIN
+    INSERT INTO sentences_fts (sentences_fts, rowid, sentence_text) VALUES ('delete', old.id, old.sentence_text);
+END;
+CREATE TRIGGER IF NOT EXISTS sentences_fts_update AFTER UPDATE OF sentence_text ON sentences BEGIN
+    INSERT INTO sentences_fts (sentences_fts, rowid, sentence_text) VALUES ('delete', old.id, old.sentence_text);
+    INSERT INTO sentences_fts (rowid, sentence_text) VALUES (new.id, new.sentence_text);
+END;
+"""
+DEFAULT_EMBEDDING_DIM = 384
+
+
+def encode_embedding(embedding, normalize=False):
+    """Encodes an embedding as little-endian float32 bytes for BLOB storage."""
+    vec = np.asarray(embedding, dtype=EMBEDDING_DTYPE).reshape(-1)
+    if normalize:
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+    return vec.astype(EMBEDDING_DTYPE, copy=False).tobytes()
+
+
+def decode_embedding(blob):
+    """Decodes a stored embedding (binary float32 or legacy JSON) into a numpy array."""
+    if isinstance(blob, str):
+        # Legacy rows were written with json.dumps and come back as TEXT
+        return np.asarray(json.loads(blob), dtype=EMBEDDING_DTYPE)
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+
+# An immutable view of the in-memory search matrix: rows [:count] of vectors
+# and ids. Writers publish a new snapshot instead of changing a published one.
+MatrixSnapshot = namedtuple("MatrixSnapshot", "vectors ids count")
+
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query that matches any of its terms. Each
+    whitespace-separated term is quoted, so identifiers such as "ORD-1001"
+    match as a phrase and FTS5 operators in the text are taken literally.
+    Returns None if the text has no searchable terms.
+    """
+    terms = [term for term in text.split() if any(ch.isalnum() for ch in term)]
+    if not terms:
+        return None
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _normalize_query(query_embedding):
+    """Returns the query embedding as a unit-length float32 vector."""
+    query_vec = np.asarray(query_embedding, dtype=EMBEDDING_DTYPE).reshape(-1)
+    norm = np.linalg.norm(query_vec)
+    return query_vec / norm if norm > 0 else query_vec
+
 
 class VectorDB:
     def __init__(
         self,
         db_path=Config.DB_FILE,
-        embedding_dim=384,
+        embedding_dim=None,
+        search_mode=Config.SEARCH_MODE,
     ):
+        """
+        Opens (or creates) the database. If embedding_dim is None, the dimension
+        recorded in an existing database is used, so tools can open it without
+        loading the model.
+
+        A VectorDB may be shared between threads. Writes go through one
+        connection, one at a time. Each searching thread gets its own read-only
+        connection and sees a consistent snapshot of the data, so searches are
+        not blocked by ingestion.
+        """
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{search_mode}'. Expected one of {SEARCH_MODES}.")
         self.db_path = db_path
         self.embedding_dim = embedding_dim
-        self.conn = None
+        self.search_mode = search_mode
+        self.conn = None  # The single writer connection, used under _write_lock
         self.cursor = None
+        self.normalized = Config.NORMALIZE_STORED_EMBEDDINGS
+        self._write_lock = threading.RLock()
+        # Held briefly to commit and publish a new snapshot, or to capture one
+        self._snapshot_lock = threading.Lock()
+        # Guards the ANN, quantized and mmap structures, which change in place
+        self._index_lock = threading.RLock()
+        self._local = threading.local()  # Per-thread read-only connection
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        # In-memory search matrix, loaded lazily on the first "matrix" search
+        self._snapshot = None
+        # On-disk vector store next to the database, used by the "mmap" mode
+        self.vector_store = None
+        # Optional approximate nearest-neighbour index, persisted next to the database
+        self.ann_index = None
+        self.ann_index_path = os.path.splitext(db_path)[0] + ".ivf.npz"
+        # Quantized codes used by the "sq8" / "pq" modes
+        self.quantized_index = None
+        # Set by _create_lexical_index when SQLite has FTS5
+        self.lexical_enabled = False
+        # Bumped on every write; cached results from older generations are stale
+        self.generation = 0
+        self.result_cache = LRUCache(Config.RESULT_CACHE_SIZE)
         self._connect_db()
         self._create_table()
+        if self.embedding_dim is None:
+            self.embedding_dim = DEFAULT_EMBEDDING_DIM
+            if self.conn:
+                self.embedding_dim = int(self._get_metadata("embedding_dim", DEFAULT_EMBEDDING_DIM))
+        self._check_embedding_format()
+        if self.search_mode == "mmap":
+            self._open_vector_store()
+        elif self.search_mode in QUANTIZED_MODES:
+            self._open_quantized_index()
+        self._load_ann_index()
 
     def _connect_db(self):
         """Establishes connection to SQLite database."""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # Shared between threads; every use is serialized by _write_lock
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
             self.cursor = self.conn.cursor()
-            
-            print(
-                "Using optimized Python-based similarity search for vector operations."
-            )
+            self._configure_connection()
         except sqlite3.Error as e:
-            print(f"Database connection error: {e}")
+            logger.error("Could not connect to the database: %s", e)
             self.conn = None
             self.cursor = None
 
+    def _configure_connection(self):
+        """
+        Switches to WAL journaling with relaxed syncing: commits no longer fsync
+        the main database file, and readers are not blocked by the writer.
+        """
+        try:
+            self.cursor.execute("PRAGMA journal_mode=WAL")
+            self.cursor.execute("PRAGMA synchronous=NORMAL")
+            self.cursor.execute("PRAGMA temp_store=MEMORY")
+            self.cursor.execute(f"PRAGMA cache_size=-{int(Config.SQLITE_CACHE_SIZE_KB)}")
+            self.cursor.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+        except sqlite3.Error as e:
+            logger.warning("Could not apply database pragmas: %s", e)
+
+    def _reader(self):
+        """Returns this thread's read-only connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"file:{quote(os.path.abspath(self.db_path))}?mode=ro",
+                uri=True,
+                isolation_level=None,  # Read transactions are begun explicitly
+                check_same_thread=False,  # So close() can close it from any thread
+            )
+            conn.execute("PRAGMA query_only=ON")
+            conn.execute(f"PRAGMA cache_size=-{int(Config.SQLITE_CACHE_SIZE_KB)}")
+            conn.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    @contextmanager
+    def _read_snapshot(self):
+        """
+        Yields (read connection, matrix snapshot) that agree with each other.
+        The read transaction is pinned while writers cannot commit, so rows
+        written later are invisible to both. The snapshot is None unless the
+        search matrix has been loaded.
+        """
+        conn = self._reader()
+        with self._snapshot_lock:
+            conn.execute("BEGIN")
+            # The first read fixes the transaction's view of the WAL
+            conn.execute("SELECT COUNT(*) FROM metadata").fetchone()
+            snapshot = self._snapshot
+        try:
+            yield conn, snapshot
+        finally:
+            conn.execute("COMMIT")
+
+    def _commit(self, snapshot=None, data_changed=True):
+        """
+        Commits the writer's transaction and, atomically for readers, publishes
+        the matching matrix snapshot and invalidates cached results.
+        """
+        with self._snapshot_lock:
+            self.conn.commit()
+            if snapshot is not None:
+                self._snapshot = snapshot
+            if data_changed:
+                self._data_changed()
+
     def _create_table(self):
         """Creates the sentences table with vector support."""
         if not self.conn:
-            print("Cannot create table: Database connection not established.")
+            logger.error("Cannot create table: Database connection not established.")
             return
 
         # Use simple table structure for optimized Python-based search
@@ -43,131 +241,1478 @@ class VectorDB:
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             file_path TEXT NOT NULL,
             sentence_text TEXT NOT NULL,
-            embedding BLOB NOT NULL
+            embedding BLOB NOT NULL,
+            location TEXT,
+            token_start INTEGER,
+            token_end INTEGER
+        );
+        """
+        create_metadata_sql = """
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        """
+        # Manifest of indexed files, used to skip unchanged files on re-index
+        create_files_sql = """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            content_hash TEXT NOT NULL,
+            parser_version TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            sentence_count INTEGER NOT NULL,
+            indexed_at REAL NOT NULL
         );
         """
         try:
             self.cursor.execute(create_table_sql)
+            columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(sentences)")]
+            # Columns added after the first release, missing from older databases
+            for name, column_type in ADDED_SENTENCE_COLUMNS:
+                if name not in columns:
+                    self.cursor.execute(f"ALTER TABLE sentences ADD COLUMN {name} {column_type}")
+            self.cursor.execute(create_metadata_sql)
+            self.cursor.execute(create_files_sql)
+            # Per-file deletes and lookups during incremental re-indexing
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sentences_file_path ON sentences (file_path)"
+            )
             self.conn.commit()
-            print("Table 'sentences' checked/created.")
+            logger.debug("Table 'sentences' checked/created.")
         except sqlite3.Error as e:
-            print(f"Error creating table: {e}")
+            logger.error("Could not create tables: %s", e)
+            return
+        self._create_lexical_index()
 
-    def insert_sentence_embedding(self, file_path, sentence_text, embedding):
-        """Inserts a single sentence and its embedding into the database."""
+    def _create_lexical_index(self):
+        """Creates the FTS5 (BM25) index over sentence_text, filling it from existing rows once."""
+        existed = self.cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sentences_fts'"
+        ).fetchone()
+        try:
+            self.cursor.executescript(CREATE_LEXICAL_INDEX_SQL)
+            if not existed:
+                self.cursor.execute("INSERT INTO sentences_fts (sentences_fts) VALUES ('rebuild')")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.warning("Lexical (FTS5) index unavailable, hybrid search will use vectors only: %s", e)
+            return
+        self.lexical_enabled = True
+        if not existed:
+            count = self.cursor.execute("SELECT COUNT(*) FROM sentences").fetchone()[0]
+            if count:
+                logger.info("Built the lexical index for %s existing sentences.", count)
+
+    def _get_metadata(self, key, default=None, conn=None):
+        """Returns a value from the metadata table, or default if it is not set."""
+        row = (conn or self.cursor).execute(
+            "SELECT value FROM metadata WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else default
+
+    def _set_metadata(self, key, value):
+        """Stores a value in the metadata table (caller commits)."""
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            (key, str(value)),
+        )
+
+    def _check_embedding_format(self):
+        """
+        Reads the embedding format marker and migrates legacy JSON databases.
+        Databases created before the marker existed are treated as JSON if any
+        embedding is still stored as TEXT.
+        """
         if not self.conn:
-            print("Cannot insert: Database connection not established.")
             return
+        try:
+            stored_format = self._get_metadata("embedding_format")
+            if stored_format is None:
+                has_json_rows = self.cursor.execute(
+                    "SELECT 1 FROM sentences WHERE typeof(embedding) = 'text' LIMIT 1"
+                ).fetchone()
+                stored_format = EMBEDDING_FORMAT_JSON if has_json_rows else EMBEDDING_FORMAT_FLOAT32
+            stored_format = int(stored_format)
 
+            if stored_format == EMBEDDING_FORMAT_JSON:
+                self.migrate_embeddings()
+                return
+
+            stored_normalized = self._get_metadata("embedding_normalized")
+            if stored_normalized is None:
+                # Fresh database: record how vectors will be written from now on
+                self._set_metadata("embedding_format", EMBEDDING_FORMAT_FLOAT32)
+                self._set_metadata("embedding_normalized", int(self.normalized))
+                self._set_metadata("embedding_dim", self.embedding_dim)
+                self.conn.commit()
+            else:
+                # The database decides, so old and new rows stay consistent
+                self.normalized = stored_normalized == "1"
+        except sqlite3.Error as e:
+            logger.error("Could not check the embedding format: %s", e)
+
+    def migrate_embeddings(self, vacuum=True):
+        """
+        Rewrites JSON-encoded embeddings in place as float32 BLOBs.
+        Runs in a single transaction, so an interrupted migration leaves the
+        database untouched. The recorded embedding_dim is the length of the
+        stored vectors, which must all agree. Returns the number of rewritten rows.
+        """
+        if not self.conn:
+            logger.error("Cannot migrate: Database connection not established.")
+            return 0
+
+        logger.info("Migrating JSON embeddings to binary float32 storage...")
+        read_cursor = self.conn.cursor()
+        migrated = 0
+        dimension = None  # Taken from the first stored vector, not from the model
         try:
-            # Simple insert for optimized Python-based search
-            self.cursor.execute(
-                "INSERT INTO sentences (file_path, sentence_text, embedding) VALUES (?, ?, ?)",
-                (file_path, sentence_text, json.dumps(embedding)),
+            read_cursor.execute(
+                "SELECT id, embedding FROM sentences WHERE typeof(embedding) = 'text'"
             )
+            while True:
+                rows = read_cursor.fetchmany(READ_BATCH_SIZE)
+                if not rows:
+                    break
+                updates = []
+                for row_id, blob in rows:
+                    vec = decode_embedding(blob)
+                    if dimension is None:
+                        dimension = len(vec)
+                    elif len(vec) != dimension:
+                        raise ValueError(
+                            f"embedding of row {row_id} has {len(vec)} dimensions, expected {dimension}"
+                        )
+                    updates.append((encode_embedding(vec, self.normalized), row_id))
+                self.cursor.executemany(
+                    "UPDATE sentences SET embedding = ? WHERE id = ?", updates
+                )
+                migrated += len(updates)
+
+            if dimension is not None and dimension != self.embedding_dim:
+                # The stored vectors decide, like the normalization flag
+                logger.warning(
+                    "Stored embeddings have %d dimensions, not %d; recording %d.",
+                    dimension, self.embedding_dim, dimension,
+                )
+                self.embedding_dim = dimension
+            self._set_metadata("embedding_format", EMBEDDING_FORMAT_FLOAT32)
+            self._set_metadata("embedding_normalized", int(self.normalized))
+            self._set_metadata("embedding_dim", self.embedding_dim)
             self.conn.commit()
-            return self.cursor.lastrowid
-        except sqlite3.Error as e:
-            print(f"Error inserting data: {e}")
-            print(
-                f"Problematic data: Path='{file_path}', Sentence='{sentence_text[:50]}'"
+        except (sqlite3.Error, ValueError) as e:
+            self.conn.rollback()
+            logger.error("Could not migrate embeddings: %s", e)
+            return 0
+        finally:
+            read_cursor.close()
+
+        if vacuum and migrated:
+            # Reclaim the space freed by the much smaller binary rows
+            self.conn.execute("VACUUM")
+        logger.info("Migrated %s embeddings.", migrated)
+        return migrated
+
+    def _open_vector_store(self):
+        """Opens the memory-mapped vector store and rebuilds it if it is out of sync."""
+        if not self.conn:
+            return
+        store_path = os.path.splitext(self.db_path)[0] + ".vectors"
+        try:
+            self.vector_store = MmapVectorStore(
+                store_path, self.embedding_dim, chunk_rows=Config.MMAP_CHUNK_ROWS
             )
+        except ValueError as e:
+            logger.warning("%s Recreating vector store.", e)
+            os.remove(store_path)
+            self.vector_store = MmapVectorStore(
+                store_path, self.embedding_dim, chunk_rows=Config.MMAP_CHUNK_ROWS
+            )
+
+        row_count, max_id = self.cursor.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM sentences"
+        ).fetchone()
+        if (
+            self.vector_store.live_count != row_count
+            or self.vector_store.last_id() != max_id
+        ):
+            self.rebuild_vector_store()
+
+    def rebuild_vector_store(self):
+        """Rewrites the vector store from the embeddings in the sentences table."""
+        if not self.vector_store:
+            return
+        logger.info("Rebuilding memory-mapped vector store...")
+        with self._write_lock, self._index_lock:
+            self.vector_store.clear()
+            for ids, vectors in self._iter_stored_embeddings():
+                self.vector_store.append(ids, self._normalize_rows(vectors))
+        logger.info("Vector store contains %s embeddings.", self.vector_store.live_count)
+
+    def _iter_stored_embeddings(self, min_id=0, batch_size=READ_BATCH_SIZE):
+        """Yields (ids, vectors) batches of stored embeddings with id > min_id, in id order."""
+        read_cursor = self.conn.cursor()
+        row_size = self.embedding_dim * EMBEDDING_DTYPE.itemsize
+        skipped = 0
+        try:
+            read_cursor.execute(
+                "SELECT id, embedding FROM sentences WHERE id > ? ORDER BY id", (min_id,)
+            )
+            while True:
+                batch = read_cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                rows = [(row_id, blob) for row_id, blob in batch if len(blob) == row_size]
+                skipped += len(batch) - len(rows)
+                if not rows:
+                    continue
+                ids = np.array([row_id for row_id, _ in rows], dtype=np.int64)
+                vectors = np.frombuffer(
+                    b"".join(blob for _, blob in rows), dtype=EMBEDDING_DTYPE
+                ).reshape(len(rows), self.embedding_dim)
+                yield ids, vectors
+        finally:
+            read_cursor.close()
+        if skipped:
+            logger.warning("Skipped %s embeddings with unexpected size.", skipped)
+
+    def _normalize_rows(self, vectors):
+        """Returns unit-length rows, skipping the work if stored vectors already are."""
+        vectors = np.asarray(vectors, dtype=EMBEDDING_DTYPE)
+        if self.normalized:
+            return vectors
+        return self._normalize_rows_always(vectors)
+
+    @staticmethod
+    def _normalize_rows_always(vectors):
+        """Scales every row to unit length (zero rows are left as they are)."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(EMBEDDING_DTYPE, copy=False)
+
+    def insert_sentence_embedding(self, file_path, sentence_text, embedding):
+        """Inserts a single sentence and its embedding into the database."""
+        ids = self.insert_sentence_embeddings(file_path, [sentence_text], [embedding])
+        return ids[0] if ids else None
+
+    def insert_sentence_embeddings(self, file_paths, sentences, embeddings, locations=None, token_spans=None):
+        """
+        Inserts many sentences and their embeddings in a single transaction.
+        file_paths is either one path shared by all sentences or one path per
+        sentence; locations optionally gives each sentence's place in its file
+        ("page 3", "row 12", ...) and token_spans its (token_start, token_end)
+        chunk boundaries. Returns the new row ids, or an empty list on failure.
+        """
+        if not self.conn:
+            logger.error("Cannot insert: Database connection not established.")
+            return []
+        if not sentences:
+            return []
+        rows, vectors = self._sentence_rows(file_paths, sentences, embeddings, locations, token_spans)
+
+        with self._write_lock:
+            started = time.perf_counter()
+            try:
+                if self.conn.in_transaction:
+                    self.conn.commit()
+                # Hold the write lock so the new ids are exactly the ones after max_id
+                self.cursor.execute("BEGIN IMMEDIATE")
+                ids = self._insert_rows(rows)
+                # Search structures mirror what was stored, including normalization
+                snapshot = None
+                if self._snapshot is not None:
+                    snapshot = self._snapshot_with_rows(self._snapshot, ids, vectors)
+                self._commit(snapshot)
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                logger.error("Could not insert data: %s", e)
+                logger.error(
+                    "Problematic batch: %s sentences starting with Path='%s', Sentence='%s'",
+                    len(rows), file_paths[0], sentences[0][:50],
+                )
+                return []
+            METRICS.observe("db_insert_seconds", time.perf_counter() - started)
+            METRICS.inc("db_inserted_rows_total", len(ids))
+            with METRICS.timer("index_update_seconds"):
+                self._index_new_rows(ids, vectors)
+        return ids.tolist()
+
+    def replace_file(
+        self, file_path, sentences, embeddings, locations, token_spans,
+        size, mtime, content_hash, parser_version, model_name,
+    ):
+        """
+        Replaces a file's sentences and records it in the manifest in one
+        transaction, so a failure leaves the previous version and its manifest
+        entry in place and the file is retried next time. Takes the arguments of
+        insert_sentence_embeddings and upsert_file. Returns the new row ids, or
+        None on failure.
+        """
+        if not self.conn:
+            logger.error("Cannot replace %s: Database connection not established.", file_path)
             return None
+        rows, vectors = self._sentence_rows(file_path, sentences, embeddings, locations, token_spans)
+
+        with self._write_lock:
+            started = time.perf_counter()
+            try:
+                if self.conn.in_transaction:
+                    self.conn.commit()
+                self.cursor.execute("BEGIN IMMEDIATE")
+                old_ids = np.array(
+                    [row[0] for row in self.cursor.execute(
+                        "SELECT id FROM sentences WHERE file_path = ?", (file_path,)
+                    )],
+                    dtype=np.int64,
+                )
+                self.cursor.execute("DELETE FROM sentences WHERE file_path = ?", (file_path,))
+                ids = self._insert_rows(rows) if rows else np.empty(0, dtype=np.int64)
+                self._upsert_file_row(
+                    file_path, size, mtime, content_hash, parser_version, model_name, len(rows)
+                )
+                snapshot = None
+                if self._snapshot is not None:
+                    snapshot = self._snapshot_with_rows(
+                        self._snapshot_without_ids(self._snapshot, old_ids) if len(old_ids) else self._snapshot,
+                        ids, vectors,
+                    )
+                self._commit(snapshot, data_changed=len(old_ids) > 0 or len(ids) > 0)
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                logger.error("Could not replace %s: %s", file_path, e)
+                return None
+            METRICS.observe("db_insert_seconds", time.perf_counter() - started)
+            METRICS.inc("db_inserted_rows_total", len(ids))
+            self._remove_from_indexes(old_ids)
+            if len(ids):
+                with METRICS.timer("index_update_seconds"):
+                    self._index_new_rows(ids, vectors)
+        return ids.tolist()
+
+    def _sentence_rows(self, file_paths, sentences, embeddings, locations=None, token_spans=None):
+        """Returns the sentences table rows to insert and their (normalized if stored so) vectors."""
+        if not sentences:
+            return [], np.empty((0, self.embedding_dim), dtype=EMBEDDING_DTYPE)
+        if isinstance(file_paths, str):
+            file_paths = [file_paths] * len(sentences)
+        if locations is None:
+            locations = [None] * len(sentences)
+        if token_spans is None:
+            token_spans = [(None, None)] * len(sentences)
+
+        vectors = np.asarray(embeddings, dtype=EMBEDDING_DTYPE).reshape(len(sentences), -1)
+        if self.normalized:
+            vectors = self._normalize_rows_always(vectors)
+        rows = [
+            (file_path, sentence_text, vector.tobytes(), location, token_start, token_end)
+            for file_path, sentence_text, vector, location, (token_start, token_end) in zip(
+                file_paths, sentences, vectors, locations, token_spans
+            )
+        ]
+        return rows, vectors
+
+    def _insert_rows(self, rows):
+        """Inserts rows inside the caller's write transaction and returns their new ids."""
+        max_id = self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM sentences").fetchone()[0]
+        self.cursor.executemany(
+            "INSERT INTO sentences (file_path, sentence_text, embedding, location, token_start, token_end) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        return np.array(
+            [row[0] for row in self.cursor.execute(
+                "SELECT id FROM sentences WHERE id > ? ORDER BY id", (max_id,)
+            )],
+            dtype=np.int64,
+        )
+
+    def _data_changed(self):
+        """Invalidates cached search results after a write."""
+        self.generation += 1
+        self.result_cache.clear()
+
+    def _index_new_rows(self, ids, vectors):
+        """Adds freshly stored rows to the loaded mmap, ANN and quantized structures."""
+        with self._index_lock:
+            if self.vector_store:
+                self.vector_store.append(ids, self._normalize_rows(vectors))
+            if self.ann_index:
+                self.ann_index.add(ids, self._normalize_rows(vectors))
+            if self.quantized_index:
+                self.quantized_index.add(ids, self._normalize_rows(vectors))
+
+    def _reset_indexes(self):
+        """Empties the loaded mmap, ANN and quantized structures after the table was cleared."""
+        with self._index_lock:
+            if self.vector_store:
+                self.vector_store.clear()
+            if self.ann_index:
+                # Keep the trained centroids; new rows are assigned to them
+                self.ann_index.reset()
+            if self.quantized_index:
+                # Likewise keep the trained codec
+                self.quantized_index.reset()
+
+    def _remove_from_indexes(self, ids):
+        """Drops deleted rows from the loaded mmap, ANN and quantized structures."""
+        if len(ids) == 0:
+            return
+        with self._index_lock:
+            if self.vector_store:
+                self.vector_store.remove(ids)
+            if self.ann_index:
+                self.ann_index.remove(ids)
+            if self.quantized_index:
+                self.quantized_index.remove(ids)
+
+    def get_file_manifest(self):
+        """Returns {path: manifest row as dict} for every indexed file."""
+        if not self.conn:
+            return {}
+        columns = [
+            "path", "size", "mtime", "content_hash", "parser_version",
+            "model_name", "sentence_count", "indexed_at",
+        ]
+        rows = self._reader().execute(f"SELECT {', '.join(columns)} FROM files").fetchall()
+        return {row[0]: dict(zip(columns, row)) for row in rows}
+
+    def upsert_file(self, path, size, mtime, content_hash, parser_version, model_name, sentence_count):
+        """Records (or updates) a file in the manifest."""
+        if not self.conn:
+            logger.error("Cannot update manifest: Database connection not established.")
+            return
+        with self._write_lock:
+            try:
+                self._upsert_file_row(path, size, mtime, content_hash, parser_version, model_name, sentence_count)
+                # The manifest does not affect search results
+                self._commit(data_changed=False)
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                logger.error("Could not update the manifest for %s: %s", path, e)
+
+    def _upsert_file_row(self, path, size, mtime, content_hash, parser_version, model_name, sentence_count):
+        self.cursor.execute(
+            """
+            INSERT OR REPLACE INTO files
+                (path, size, mtime, content_hash, parser_version, model_name, sentence_count, indexed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (path, size, mtime, content_hash, parser_version, model_name, sentence_count, time.time()),
+        )
+
+    @METRICS.timed("db_delete_seconds")
+    def delete_file(self, file_path):
+        """Deletes all sentences of a file and its manifest entry. Returns the number of sentences removed."""
+        if not self.conn:
+            logger.error("Cannot delete: Database connection not established.")
+            return 0
+        with self._write_lock:
+            try:
+                ids = np.array(
+                    [row[0] for row in self.cursor.execute(
+                        "SELECT id FROM sentences WHERE file_path = ?", (file_path,)
+                    )],
+                    dtype=np.int64,
+                )
+                self.cursor.execute("DELETE FROM sentences WHERE file_path = ?", (file_path,))
+                self.cursor.execute("DELETE FROM files WHERE path = ?", (file_path,))
+                snapshot = None
+                if self._snapshot is not None and len(ids):
+                    snapshot = self._snapshot_without_ids(self._snapshot, ids)
+                self._commit(snapshot, data_changed=len(ids) > 0)
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                logger.error("Could not delete %s: %s", file_path, e)
+                return 0
+            self._remove_from_indexes(ids)
+        return len(ids)
 
     def clear_database(self):
         """Clears all data from the sentences table."""
         if not self.conn:
-            print("Cannot clear: Database connection not established.")
+            logger.error("Cannot clear: Database connection not established.")
             return
-        try:
-            self.cursor.execute("DELETE FROM sentences")
-            self.conn.commit()
-            print("Database cleared.")
-        except sqlite3.Error as e:
-            print(f"Error clearing database: {e}")
+        with self._write_lock:
+            try:
+                self.cursor.execute("DELETE FROM sentences")
+                self.cursor.execute("DELETE FROM files")
+                self._commit(self._empty_snapshot() if self._snapshot is not None else None)
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                logger.error("Could not clear the database: %s", e)
+                return
+            self._reset_indexes()
+        logger.info("Database cleared.")
 
+    @METRICS.timed("search_seconds", kind="sentences")
     def search_similar_sentences(
         self, 
         query_embedding, 
         limit=Config.DEFAULT_SEARCH_LIMIT, 
-        distance_threshold=Config.DISTANCE_THRESHOLD
+        distance_threshold=Config.DISTANCE_THRESHOLD,
+        approximate=None,
+        nprobe=None,
     ):
         """
         Searches for sentences most similar to the query embedding using Python-based similarity calculation.
         Only returns results with distance less than distance_threshold.
+        Returns the best sentence of each of the top `limit` files.
+        approximate=True uses the IVF index (scanning nprobe lists), False forces
+        exact search, and None follows Config.ANN_ENABLED.
+        """
+        if not self.conn:
+            logger.error("Cannot search: Database connection not established.")
+            return []
+        if limit <= 0:
+            return []
+
+        approximate = self._use_ann(approximate)
+        cache_key = self._result_cache_key(query_embedding, limit, distance_threshold, approximate, nprobe)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            METRICS.inc("search_result_cache_hits_total", kind="sentences")
+            return [dict(result) for result in cached]
+
+        query_vec = _normalize_query(query_embedding)
+        self._prepare_search(approximate)
+        with self._read_snapshot() as (conn, snapshot):
+            def rank_rows(k):
+                ids, similarities = self._top_k_rows(query_vec, k, conn, snapshot, approximate, nprobe)
+                results = self._build_results(ids, similarities, distance_threshold, conn=conn)
+                return results, len(ids) < k or len(results) < len(ids)
+
+            final_results = self._unique_by_file(self._top_distinct_files(rank_rows, limit))
+
+        self.result_cache.put(cache_key, [dict(result) for result in final_results])
+        return final_results
+
+    @staticmethod
+    def _top_distinct_files(rank_rows, limit):
+        """
+        Returns the first row of each of the top `limit` files. rank_rows(k)
+        returns (best-first rows starting with file_path, exhausted). A file
+        may own several of the best rows, so k is widened until the rows cover
+        `limit` distinct files or nothing is left.
+        """
+        k = limit
+        while True:
+            rows, exhausted = rank_rows(k)
+            seen = set()
+            best = []
+            for row in rows:
+                if row[0] not in seen:
+                    seen.add(row[0])
+                    best.append(row)
+            if len(best) >= limit or exhausted:
+                return best[:limit]
+            k *= FILE_CANDIDATE_GROWTH
+
+    @METRICS.timed("search_seconds", kind="hybrid")
+    def search_hybrid(
+        self,
+        query_text,
+        query_embedding,
+        limit=Config.DEFAULT_SEARCH_LIMIT,
+        distance_threshold=Config.DISTANCE_THRESHOLD,
+        mode=Config.HYBRID_MODE,
+        fallback=True,
+    ):
+        """
+        Combines BM25 keyword matches with vector similarity, one result per
+        file. mode="rrf" fuses the keyword and vector rankings with reciprocal
+        rank fusion and adds the fused "score" to each result; keyword matches
+        count even beyond distance_threshold, so exact identifiers are found
+        when their embeddings are not close. mode="prefilter" only scores the
+        sentences that contain a query term, and falls back to
+        search_similar_sentences (unless fallback=False) when none of them is
+        within the threshold. Queries without keywords, or databases without
+        FTS5, always use search_similar_sentences.
+        """
+        if mode not in HYBRID_MODES:
+            raise ValueError(f"Unknown hybrid mode '{mode}'. Expected one of {HYBRID_MODES}.")
+        if not self.conn:
+            logger.error("Cannot search: Database connection not established.")
+            return []
+        if not self.lexical_enabled or fts_query(query_text) is None:
+            return self.search_similar_sentences(query_embedding, limit, distance_threshold)
+
+        cache_key = self._result_cache_key(query_embedding, limit, distance_threshold, False, None)
+        cache_key += ("hybrid", mode, query_text)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            METRICS.inc("search_result_cache_hits_total", kind="hybrid")
+            return [dict(result) for result in cached]
+
+        query_vec = _normalize_query(query_embedding)
+        self._prepare_search(False)
+        with self._read_snapshot() as (conn, snapshot):
+            if mode == "prefilter":
+                ids, _ = self._lexical_top_k(query_text, Config.PREFILTER_MAX_CANDIDATES, conn)
+                ids, similarities = self._score_ids(query_vec, ids, conn, snapshot)
+                order = np.argsort(-similarities, kind="stable")
+                results = self._build_results(ids[order], similarities[order], distance_threshold, conn=conn)
+                final_results = self._unique_by_file(results)[:limit]
+            else:
+                rows = self._top_distinct_files(
+                    lambda k: self._fused_rows(query_text, query_vec, k, distance_threshold, conn, snapshot),
+                    limit,
+                )
+                final_results = [
+                    {
+                        "file_path": file_path, "sentence": sentence_text, "location": location,
+                        "distance": distance, "score": score,
+                    }
+                    for file_path, sentence_text, location, distance, score in rows
+                ]
+        if not final_results and mode == "prefilter" and fallback:
+            return self.search_similar_sentences(query_embedding, limit, distance_threshold)
+
+        self.result_cache.put(cache_key, [dict(result) for result in final_results])
+        return final_results
+
+    def _fused_rows(self, query_text, query_vec, k, distance_threshold, conn, snapshot):
+        """
+        Reciprocal rank fusion of the vector and BM25 rankings, each taken to
+        at least Config.HYBRID_CANDIDATES rows. Returns best-first
+        (file_path, sentence, location, distance, score) rows and whether both rankings
+        were exhausted.
+        """
+        depth = max(k, Config.HYBRID_CANDIDATES)
+        vector_ids, similarities = self._top_k_rows(query_vec, depth, conn, snapshot)
+        within = (1.0 - similarities) < distance_threshold
+        vector_exhausted = len(vector_ids) < depth or not within.all()
+        lexical_ids, _ = self._lexical_top_k(query_text, depth, conn)
+
+        scores = {}
+        for ranking in (vector_ids[within], lexical_ids):
+            for rank, row_id in enumerate(ranking.tolist(), start=1):
+                scores[row_id] = scores.get(row_id, 0.0) + 1.0 / (Config.RRF_K + rank)
+        ids = np.array(sorted(scores, key=lambda row_id: -scores[row_id]), dtype=np.int64)
+        ids, similarities = self._score_ids(query_vec, ids, conn, snapshot)
+        sentences = self._fetch_sentences(ids, conn)
+        rows = [
+            sentences[row_id] + (1.0 - similarity, scores[row_id])
+            for row_id, similarity in zip(ids.tolist(), similarities.tolist())
+            if row_id in sentences
+        ]
+        return rows, vector_exhausted and len(lexical_ids) < depth
+
+    @METRICS.timed("search_seconds", kind="lexical")
+    def lexical_search(self, query_text, limit=Config.DEFAULT_SEARCH_LIMIT):
         """
+        Keyword-only search ranked by BM25: the best-matching sentence of each
+        of the top `limit` files, with its "bm25" score (lower is better).
+        """
+        if not self.conn or not self.lexical_enabled:
+            return []
+        with self._read_snapshot() as (conn, _):
+            def rank_rows(k):
+                ids, scores = self._lexical_top_k(query_text, k, conn)
+                sentences = self._fetch_sentences(ids, conn)
+                rows = [
+                    sentences[row_id] + (score,)
+                    for row_id, score in zip(ids.tolist(), scores.tolist())
+                    if row_id in sentences
+                ]
+                return rows, len(ids) < k
+
+            rows = self._top_distinct_files(rank_rows, limit)
+        return [
+            {"file_path": file_path, "sentence": sentence_text, "location": location, "bm25": score}
+            for file_path, sentence_text, location, score in rows
+        ]
+
+    def _lexical_top_k(self, query_text, k, conn):
+        """Returns best-first (ids, BM25 scores) of up to k sentences matching any query term."""
+        match = fts_query(query_text)
+        if not self.lexical_enabled or match is None or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        with METRICS.timer("search_phase_seconds", mode="bm25", phase="scan"):
+            rows = conn.execute(
+                "SELECT rowid, bm25(sentences_fts) FROM sentences_fts WHERE sentences_fts MATCH ? "
+                "ORDER BY rank LIMIT ?",
+                (match, int(k)),
+            ).fetchall()
+        return (
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype=np.float64),
+        )
+
+    @METRICS.timed("search_seconds", kind="files")
+    def search_similar_files(
+        self,
+        query_embedding,
+        limit=Config.DEFAULT_SEARCH_LIMIT,
+        distance_threshold=Config.DISTANCE_THRESHOLD,
+        aggregation=Config.FILE_AGGREGATION,
+        top_m=Config.FILE_TOP_M,
+        approximate=None,
+        nprobe=None,
+    ):
+        """
+        Ranks files instead of sentences and returns the top `limit` distinct
+        files, best first, as dicts with the file's aggregate "distance" and all
+        of its "sentences" within distance_threshold. A file scores by its best
+        sentence (aggregation="max") or by the mean similarity of its best
+        top_m sentences ("mean").
+        """
+        if aggregation not in FILE_AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{aggregation}'. Expected one of {FILE_AGGREGATIONS}.")
+        if top_m < 1:
+            raise ValueError(f"top_m must be at least 1, got {top_m}.")
         if not self.conn:
-            print("Cannot search: Database connection not established.")
+            logger.error("Cannot search: Database connection not established.")
+            return []
+        if limit <= 0:
+            return []
+
+        approximate = self._use_ann(approximate)
+        cache_key = self._result_cache_key(query_embedding, limit, distance_threshold, approximate, nprobe)
+        cache_key += ("files", aggregation, top_m)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            METRICS.inc("search_result_cache_hits_total", kind="files")
+            return [dict(result, sentences=list(result["sentences"])) for result in cached]
+
+        query_vec = _normalize_query(query_embedding)
+        self._prepare_search(approximate)
+        with self._read_snapshot() as (conn, snapshot):
+            scored = {}  # file_path -> (score, matching sentences), kept across passes
+            k = limit * (top_m if aggregation == "mean" else 1)
+            while True:
+                ids, similarities = self._top_k_rows(query_vec, k, conn, snapshot, approximate, nprobe)
+                rows = self._build_results(ids, similarities, distance_threshold, conn=conn)
+                exhausted = len(ids) < k or len(rows) < len(ids)
+                files = list(dict.fromkeys(row[0] for row in rows))
+                if exhausted or len(files) >= limit:
+                    new_files = [file_path for file_path in files if file_path not in scored]
+                    scored.update(self._score_files(
+                        query_vec, new_files, distance_threshold, aggregation, top_m, conn, snapshot
+                    ))
+                    ranked = sorted(
+                        (file_path for file_path in files if 1.0 - scored[file_path][0] < distance_threshold),
+                        key=lambda file_path: -scored[file_path][0],
+                    )[:limit]
+                    # Files outside the candidates have no sentence above the
+                    # k-th similarity, so neither their max nor their mean can be
+                    if exhausted or (len(ranked) == limit and scored[ranked[-1]][0] >= similarities[-1]):
+                        break
+                k *= FILE_CANDIDATE_GROWTH
+
+        final_results = [
+            {"file_path": file_path, "distance": 1.0 - scored[file_path][0], "sentences": scored[file_path][1]}
+            for file_path in ranked
+        ]
+        self.result_cache.put(
+            cache_key, [dict(result, sentences=list(result["sentences"])) for result in final_results]
+        )
+        return final_results
+
+    def _score_files(self, query_vec, file_paths, distance_threshold, aggregation, top_m, conn, snapshot):
+        """
+        Scores every sentence of the given files. Returns {file_path: (score,
+        [{"sentence", "location", "distance"}, ...])}, with the sentences within the
+        threshold sorted best first.
+        """
+        scored = {}
+        for start in range(0, len(file_paths), SQLITE_MAX_VARIABLES):
+            chunk = file_paths[start : start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT id, file_path, sentence_text, location FROM sentences WHERE file_path IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            if not rows:
+                continue
+            ids, similarities = self._score_ids(
+                query_vec, np.array([row[0] for row in rows], dtype=np.int64), conn, snapshot
+            )
+            similarity_of = dict(zip(ids.tolist(), similarities.tolist()))
+            by_file = {}
+            for row_id, file_path, sentence_text, location in rows:
+                if row_id in similarity_of:
+                    by_file.setdefault(file_path, []).append((similarity_of[row_id], sentence_text, location))
+            for file_path, sentences in by_file.items():
+                sentences.sort(key=lambda item: -item[0])
+                if aggregation == "max":
+                    score = sentences[0][0]
+                else:
+                    best = sentences[:top_m]
+                    score = sum(item[0] for item in best) / len(best)
+                matches = [
+                    {"sentence": sentence_text, "location": location, "distance": 1.0 - similarity}
+                    for similarity, sentence_text, location in sentences
+                    if 1.0 - similarity < distance_threshold
+                ]
+                scored[file_path] = (score, matches)
+        return scored
+
+    def _score_ids(self, query_vec, ids, conn, snapshot):
+        """
+        Exact similarities of the query to the given rows: looked up in the
+        matrix snapshot when it holds them, else read from the database.
+        """
+        with METRICS.timer("search_phase_seconds", mode=self.search_mode, phase="score"):
+            if snapshot is not None and snapshot.count:
+                matrix_ids = snapshot.ids[: snapshot.count]
+                # Snapshot ids stay in ascending order
+                positions = np.minimum(np.searchsorted(matrix_ids, ids), snapshot.count - 1)
+                if np.array_equal(matrix_ids[positions], ids):
+                    return ids, snapshot.vectors[positions] @ query_vec
+            ids, vectors = self._fetch_embeddings(ids, conn)
+            return ids, vectors @ query_vec
+
+    @METRICS.timed("search_seconds", kind="batch")
+    def search_similar_sentences_batch(
+        self,
+        query_embeddings,
+        limit=Config.DEFAULT_SEARCH_LIMIT,
+        distance_threshold=Config.DISTANCE_THRESHOLD,
+    ):
+        """
+        Searches for several queries at once and returns one result list per
+        query, as search_similar_sentences would. In "matrix" mode all queries
+        are scored with one matrix-matrix product and their sentences are looked
+        up together; other modes search the queries one by one.
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=EMBEDDING_DTYPE)
+        if len(query_embeddings) == 0:
             return []
+        query_embeddings = query_embeddings.reshape(len(query_embeddings), -1)
+        if limit <= 0:
+            return [[] for _ in query_embeddings]
+        if not self.conn or self.search_mode != "matrix" or Config.ANN_ENABLED:
+            return [
+                self.search_similar_sentences(query, limit, distance_threshold)
+                for query in query_embeddings
+            ]
+
+        results = [None] * len(query_embeddings)
+        cache_keys = []
+        pending = []  # Positions of queries not answered from the result cache
+        for i, query in enumerate(query_embeddings):
+            cache_key = self._result_cache_key(query, limit, distance_threshold, False, None)
+            cache_keys.append(cache_key)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                METRICS.inc("search_result_cache_hits_total", kind="batch")
+                results[i] = [dict(result) for result in cached]
+            else:
+                pending.append(i)
+        if not pending:
+            return results
 
-        print("Performing optimized Python-based similarity search.")
-        results = self._fallback_python_search(query_embedding, limit, distance_threshold)
+        with self._read_snapshot_loaded() as (conn, snapshot):
+            ids, similarities = self._matrix_top_k_batch(query_embeddings[pending], limit, snapshot)
+            keep = (1.0 - similarities) < distance_threshold
+            sentences = self._fetch_sentences(np.unique(ids[keep]), conn)
+        for row, i in enumerate(pending):
+            rows = self._build_results(ids[row], similarities[row], distance_threshold, sentences)
+            results[i] = self._unique_by_file(rows)
+            if len(results[i]) < limit and len(rows) == limit:
+                # Some of the best sentences share a file: widen this query on its own
+                results[i] = self.search_similar_sentences(query_embeddings[i], limit, distance_threshold)
+                continue
+            self.result_cache.put(cache_keys[i], [dict(result) for result in results[i]])
+        return results
+
+    def _result_cache_key(self, query_embedding, limit, distance_threshold, approximate, nprobe):
+        query_bytes = np.asarray(query_embedding, dtype=EMBEDDING_DTYPE).tobytes()
+        return (
+            hashlib.sha1(query_bytes).digest(), limit, distance_threshold,
+            bool(approximate), nprobe, self.generation,
+        )
 
-        # Ensure results are unique by file_path for final output
-        unique_file_paths = []
+    @staticmethod
+    def _unique_by_file(results):
+        """Turns (file_path, sentence, location, distance) rows into result dicts, one per file."""
+        unique_file_paths = set()
         final_results = []
-        for row in results:
-            file_path, sentence_text, distance = row
+        for file_path, sentence_text, location, distance in results:
             # Distance filtering already done in search methods, just check for uniqueness
             if file_path not in unique_file_paths:
-                unique_file_paths.append(file_path)
+                unique_file_paths.add(file_path)
                 final_results.append({
                     "file_path": file_path,
                     "sentence": sentence_text,
+                    "location": location,
                     "distance": distance
                 })
         return final_results
 
-    def _fallback_python_search(self, query_embedding, limit, distance_threshold):
+    def stats(self):
+        """Returns a summary of the stored data and the on-disk indexes."""
+        if not self.conn:
+            return {}
+        conn = self._reader()
+        sentences, files = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT file_path) FROM sentences"
+        ).fetchone()
+        chunk_tokens = conn.execute("SELECT AVG(token_end - token_start) FROM sentences").fetchone()[0]
+        parser_versions = [row[0] for row in conn.execute("SELECT DISTINCT parser_version FROM files ORDER BY 1")]
+        indexes = {"ivf": self.ann_index_path}
+        indexes.update({kind: self._quantized_index_path(kind) for kind in QUANTIZED_MODES})
+        return {
+            "db_path": self.db_path,
+            "db_bytes": sum(
+                os.path.getsize(path)
+                for path in (self.db_path, self.db_path + "-wal")
+                if os.path.isfile(path)
+            ),
+            "sentences": sentences,
+            "files": files,
+            "mean_chunk_tokens": round(chunk_tokens, 1) if chunk_tokens is not None else None,
+            "parser_versions": parser_versions,
+            "manifest_files": conn.execute("SELECT COUNT(*) FROM files").fetchone()[0],
+            "embedding_dim": self.embedding_dim,
+            "embedding_format": int(self._get_metadata("embedding_format", EMBEDDING_FORMAT_JSON, conn)),
+            "normalized": self.normalized,
+            "search_mode": self.search_mode,
+            "lexical_index": self.lexical_enabled,
+            "indexes": {
+                name: os.path.getsize(path) if os.path.isfile(path) else None
+                for name, path in indexes.items()
+            },
+        }
+
+    def result_cache_stats(self):
+        """Returns hit/miss statistics of the search result cache."""
+        return dict(self.result_cache.stats(), generation=self.generation)
+
+    def warm_up(self):
+        """Loads the structures the current search mode needs, so the first query is fast."""
+        if not self.conn:
+            return
+        if self.search_mode == "matrix" and self._snapshot is None:
+            self._load_matrix()
+        elif self.search_mode in QUANTIZED_MODES and self.quantized_index is None:
+            with self._write_lock, self._index_lock:
+                if self.quantized_index is None:
+                    self._open_quantized_index()
+
+    def _empty_snapshot(self):
+        return MatrixSnapshot(
+            np.empty((0, self.embedding_dim), dtype=EMBEDDING_DTYPE), np.empty(0, dtype=np.int64), 0
+        )
+
+    def _load_matrix(self):
         """
-        Python-based search using numpy for similarity calculation.
-        Provides accurate results for document collections.
+        Loads every stored embedding into one contiguous, pre-normalized
+        (N, dim) float32 matrix with a parallel array of sentence ids.
         """
-        all_sentences = self.cursor.execute(
-            "SELECT file_path, sentence_text, embedding FROM sentences"
-        ).fetchall()
+        # Holding the write lock keeps commits out while the rows are read
+        with self._write_lock:
+            if self._snapshot is not None:
+                return  # Loaded by another thread meanwhile
+            snapshot = self._empty_snapshot()
+            for ids, vectors in self._iter_stored_embeddings():
+                snapshot = self._snapshot_with_rows(snapshot, ids, vectors)
+            with self._snapshot_lock:
+                self._snapshot = snapshot
+        logger.info("Loaded %s embeddings into the search matrix.", snapshot.count)
 
-        query_vec = np.array(query_embedding)
-        # Normalize query vector for better cosine similarity calculation
-        query_vec = query_vec / np.linalg.norm(query_vec)
+    def _current_snapshot(self):
+        """Returns the latest matrix snapshot, loading the matrix on first use."""
+        if self._snapshot is None:
+            self._load_matrix()
+        return self._snapshot
 
-        all_similarities = []
-        for file_path, sentence_text, stored_embedding_blob in all_sentences:
-            try:
-                # For BLOB, load as JSON, then convert to numpy
-                stored_vec = np.array(json.loads(stored_embedding_blob))
-                # Normalize stored vector for better cosine similarity calculation
-                stored_vec = stored_vec / np.linalg.norm(stored_vec)
+    @contextmanager
+    def _read_snapshot_loaded(self):
+        """_read_snapshot with the search matrix loaded first."""
+        self._current_snapshot()
+        with self._read_snapshot() as (conn, snapshot):
+            yield conn, snapshot
+
+    def _snapshot_with_rows(self, snapshot, ids, vectors):
+        """
+        Returns a snapshot with rows appended, growing capacity geometrically.
+        Spare capacity is filled in place: rows past a published snapshot's
+        count are never read through it.
+        """
+        vectors = self._normalize_rows(vectors)
+        count = snapshot.count
+        needed = count + len(ids)
+        matrix, matrix_ids = snapshot.vectors, snapshot.ids
+        if needed > len(matrix):
+            capacity = max(needed, 2 * len(matrix), 1024)
+            matrix = np.empty((capacity, self.embedding_dim), dtype=EMBEDDING_DTYPE)
+            matrix[:count] = snapshot.vectors[:count]
+            matrix_ids = np.empty(capacity, dtype=np.int64)
+            matrix_ids[:count] = snapshot.ids[:count]
 
+        matrix[count:needed] = vectors
+        matrix_ids[count:needed] = ids
+        return MatrixSnapshot(matrix, matrix_ids, needed)
+
+    @staticmethod
+    def _snapshot_without_ids(snapshot, ids):
+        """Returns a snapshot without the given ids, in new arrays."""
+        keep = ~np.isin(snapshot.ids[: snapshot.count], ids)
+        if keep.all():
+            return snapshot
+        kept_ids = snapshot.ids[: snapshot.count][keep]
+        return MatrixSnapshot(snapshot.vectors[: snapshot.count][keep], kept_ids, len(kept_ids))
+
+    def _fetch_sentences(self, ids, conn=None):
+        """Returns {id: (file_path, sentence_text, location)} for the given sentence ids."""
+        conn = conn or self._reader()
+        found = {}
+        ids = [int(i) for i in ids]
+        with METRICS.timer("search_phase_seconds", mode=self.search_mode, phase="fetch"):
+            for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+                chunk = ids[start : start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                for row_id, file_path, sentence_text, location in conn.execute(
+                    f"SELECT id, file_path, sentence_text, location FROM sentences WHERE id IN ({placeholders})",
+                    chunk,
+                ):
+                    found[row_id] = (file_path, sentence_text, location)
+        return found
+
+    def _matrix_top_k(self, query_vec, k, snapshot=None):
+        """
+        Returns (ids, similarities) of the exact top-k rows of the in-memory
+        matrix, as of the given snapshot (default: the latest).
+        """
+        snapshot = snapshot or self._current_snapshot()
+        count = snapshot.count
+        if count == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=EMBEDDING_DTYPE)
+
+        started = time.perf_counter()
+        similarities = snapshot.vectors[:count] @ query_vec
+        scanned = time.perf_counter()
+        k = min(k, count)
+        if k < count:
+            top = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            top = np.arange(count)
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        METRICS.observe("search_phase_seconds", scanned - started, mode="matrix", phase="scan")
+        METRICS.observe("search_phase_seconds", time.perf_counter() - scanned, mode="matrix", phase="topk")
+        return snapshot.ids[top], similarities[top]
+
+    def _matrix_top_k_batch(self, query_vecs, k, snapshot=None):
+        """
+        Exact top-k for many queries: (Q, k) arrays of ids and similarities,
+        best first, padded with id 0 and similarity -inf when fewer rows exist.
+        Queries are scored in groups so the score matrix stays within
+        BATCH_SCORE_ELEMENTS.
+        """
+        snapshot = snapshot or self._current_snapshot()
+        query_vecs = np.asarray(query_vecs, dtype=EMBEDDING_DTYPE)
+        norms = np.linalg.norm(query_vecs, axis=1, keepdims=True)
+        query_vecs = query_vecs / np.where(norms > 0, norms, 1.0)
+
+        n_queries, count = len(query_vecs), snapshot.count
+        ids = np.zeros((n_queries, k), dtype=np.int64)
+        similarities = np.full((n_queries, k), -np.inf, dtype=EMBEDDING_DTYPE)
+        top_k = min(k, count)
+        if top_k <= 0:
+            return ids, similarities
+
+        group = max(1, BATCH_SCORE_ELEMENTS // count)
+        matrix = snapshot.vectors[:count]
+        scan_seconds = select_seconds = 0.0
+        for start in range(0, n_queries, group):
+            started = time.perf_counter()
+            scores = query_vecs[start : start + group] @ matrix.T  # (group, N)
+            scanned = time.perf_counter()
+            scan_seconds += scanned - started
+            if top_k < count:
+                top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            else:
+                top = np.broadcast_to(np.arange(count), (len(scores), count))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            ids[start : start + len(scores), :top_k] = snapshot.ids[top]
+            similarities[start : start + len(scores), :top_k] = np.take_along_axis(top_scores, order, axis=1)
+            select_seconds += time.perf_counter() - scanned
+        # One observation per batch, so per-query latencies stay apart
+        METRICS.observe("search_phase_seconds", scan_seconds, mode="matrix_batch", phase="scan")
+        METRICS.observe("search_phase_seconds", select_seconds, mode="matrix_batch", phase="topk")
+        return ids, similarities
+
+    def _use_ann(self, approximate):
+        """Resolves the per-query approximate flag against Config.ANN_ENABLED and the built index."""
+        if approximate is None:
+            approximate = Config.ANN_ENABLED
+        if approximate and not (self.ann_index and self.ann_index.is_trained):
+            logger.warning("ANN index has not been built. Falling back to exact search.")
+            approximate = False
+        return approximate
+
+    def _prepare_search(self, approximate):
+        """Loads the structures the search mode needs before a read snapshot is taken."""
+        if approximate:
+            return
+        if self.search_mode == "matrix":
+            self._current_snapshot()
+        elif self.search_mode == "mmap" and not self.vector_store:
+            with self._write_lock, self._index_lock:
+                if not self.vector_store:
+                    self._open_vector_store()
+        elif self.search_mode in QUANTIZED_MODES and self.quantized_index is None:
+            with self._write_lock, self._index_lock:
+                if self.quantized_index is None:
+                    self._open_quantized_index()
+
+    def _top_k_rows(self, query_vec, k, conn, snapshot, approximate=False, nprobe=None):
+        """
+        Returns best-first (ids, similarities) of the k rows closest to the
+        unit-length query, using the IVF index or the current search mode:
+        - "matrix": one matrix-vector product over the in-memory matrix and
+          top-k selection with argpartition
+        - "mmap": chunked scan of the memory-mapped vector store with bounded RAM
+        - "sq8"/"pq": scores against the quantized codes (asymmetric distance),
+          optionally re-ranking the best candidates with full-precision vectors
+        - "python": per-row scan of the stored embeddings
+        """
+        if approximate:
+            with self._index_lock, METRICS.timer("search_phase_seconds", mode="ivf", phase="scan"):
+                return self.ann_index.search(query_vec, k, nprobe or Config.ANN_NPROBE)
+        if self.search_mode == "matrix":
+            return self._matrix_top_k(query_vec, k, snapshot)
+        scan_timer = METRICS.timer("search_phase_seconds", mode=self.search_mode, phase="scan")
+        if self.search_mode == "mmap":
+            with self._index_lock, scan_timer:
+                return self.vector_store.search(query_vec, k)
+        if self.search_mode in QUANTIZED_MODES:
+            if self.quantized_index is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=EMBEDDING_DTYPE)
+            if Config.QUANT_RERANK_FACTOR > 0:
+                with self._index_lock, scan_timer:
+                    candidates, _ = self.quantized_index.search(query_vec, k * Config.QUANT_RERANK_FACTOR)
+                with METRICS.timer("search_phase_seconds", mode=self.search_mode, phase="rerank"):
+                    return self._rerank(query_vec, candidates, k, conn)
+            with self._index_lock, scan_timer:
+                return self.quantized_index.search(query_vec, k)
+        with scan_timer:
+            return self._python_top_k(query_vec, k, conn)
+
+    def _python_top_k(self, query_vec, k, conn):
+        """
+        Python-based search using numpy for similarity calculation. Streams
+        the stored embeddings and keeps the best k in a bounded heap, so the
+        corpus is never sorted.
+        """
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=EMBEDDING_DTYPE)
+        heap = []  # (similarity, -id): the worst kept row is at heap[0]
+        for row_id, stored_embedding_blob in conn.execute("SELECT id, embedding FROM sentences"):
+            try:
+                stored_vec = decode_embedding(stored_embedding_blob)
+                if not self.normalized:
+                    # Normalize stored vector for better cosine similarity calculation
+                    stored_vec = stored_vec / np.linalg.norm(stored_vec)
                 # Cosine similarity with normalized vectors
-                similarity = np.dot(query_vec, stored_vec)
-                distance = 1 - similarity
-                
-                # Store all distances for debugging
-                all_similarities.append((distance, file_path, sentence_text))
+                similarity = float(np.dot(query_vec, stored_vec))
             except json.JSONDecodeError:
-                print(
-                    f"Warning: Could not decode embedding for {file_path} - {sentence_text[:30]}. Skipping."
-                )
+                logger.warning("Could not decode embedding of sentence %s. Skipping.", row_id)
                 continue
             except Exception as e:
-                print(
-                    f"Error calculating similarity for {file_path} - {sentence_text[:30]}: {e}. Skipping."
-                )
+                logger.error("Could not calculate similarity for sentence %s: %s. Skipping.", row_id, e)
                 continue
+            # Ties keep the lower id, like a stable sort would
+            if len(heap) < k:
+                heapq.heappush(heap, (similarity, -row_id))
+            elif (similarity, -row_id) > heap[0]:
+                heapq.heapreplace(heap, (similarity, -row_id))
+
+        best = sorted(heap, reverse=True)
+        return (
+            np.array([-neg_id for _, neg_id in best], dtype=np.int64),
+            np.array([similarity for similarity, _ in best], dtype=EMBEDDING_DTYPE),
+        )
+
+    def _exact_top_k(self, query_vec, k):
+        """Exact top-k through the on-disk store in "mmap" mode, else the in-memory matrix."""
+        if self.search_mode == "mmap" and self.vector_store:
+            with self._index_lock:
+                return self.vector_store.search(query_vec, k)
+        return self._matrix_top_k(query_vec, k)
+
+    def _load_ann_index(self):
+        """Loads a previously built IVF index and catches it up with new rows."""
+        if not self.conn or not os.path.isfile(self.ann_index_path):
+            return
+        try:
+            index = IVFIndex.load(self.ann_index_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not load ANN index '%s': %s", self.ann_index_path, e)
+            return
+        if index.dim != self.embedding_dim:
+            logger.warning("ANN index dimension does not match the database. Ignoring it.")
+            return
+        self.ann_index = index
+
+        row_count, max_id = self.cursor.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM sentences"
+        ).fetchone()
+        indexed_max_id = index.max_id()
+        if indexed_max_id < max_id:
+            # Rows inserted by other processes since the index was saved
+            for ids, vectors in self._iter_stored_embeddings(min_id=indexed_max_id):
+                index.add(ids, self._normalize_rows(vectors))
+        if index.count != row_count:
+            logger.info("ANN index is out of sync with the database. Re-assigning all rows.")
+            index.reset()
+            for ids, vectors in self._iter_stored_embeddings():
+                index.add(ids, self._normalize_rows(vectors))
+        logger.info("Loaded ANN index with %s lists and %s vectors.", index.n_lists, index.count)
+
+    def _sample_stored_embeddings(self, sample_size, seed=0):
+        """Returns a random sample of up to sample_size stored embeddings."""
+        all_ids = np.array(
+            [row[0] for row in self.cursor.execute("SELECT id FROM sentences")], dtype=np.int64
+        )
+        if len(all_ids) == 0:
+            return np.empty((0, self.embedding_dim), dtype=EMBEDDING_DTYPE)
+        rng = np.random.default_rng(seed)
+        sample_ids = rng.choice(all_ids, min(sample_size, len(all_ids)), replace=False)
+        batches = [
+            vectors[np.isin(ids, sample_ids)]
+            for ids, vectors in self._iter_stored_embeddings()
+        ]
+        if not batches:
+            return np.empty((0, self.embedding_dim), dtype=EMBEDDING_DTYPE)
+        return np.concatenate(batches)
 
-        # Sort by distance (ascending) - best matches first
-        all_similarities.sort(key=lambda x: x[0])
-        
-        # Filter by threshold and return
-        filtered_similarities = [(dist, fp, sent) for dist, fp, sent in all_similarities if dist < distance_threshold]
-        return [(fp, sent, dist) for dist, fp, sent in filtered_similarities[:limit]]
+    def build_ann_index(self, n_lists=None, sample_size=None):
+        """
+        Trains IVF centroids on (a sample of) the stored embeddings, assigns every
+        row to a list and saves the index next to the database.
+        """
+        with self._write_lock, self._index_lock:
+            if not self.conn:
+                logger.error("Cannot build index: Database connection not established.")
+                return None
+            row_count = self.cursor.execute("SELECT COUNT(*) FROM sentences").fetchone()[0]
+            if row_count == 0:
+                logger.error("Cannot build index: Database is empty.")
+                return None
+
+            if not n_lists:
+                n_lists = Config.ANN_N_LISTS or int(4 * np.sqrt(row_count))
+            n_lists = max(1, min(n_lists, row_count))
+            sample_size = sample_size or Config.ANN_TRAIN_SAMPLE
+
+            sample = self._sample_stored_embeddings(sample_size)
+            if len(sample) == 0:
+                logger.error("Cannot build index: No embeddings match the database dimension.")
+                return None
+
+            logger.info("Training IVF index with %s lists on %s vectors...", n_lists, len(sample))
+            index = IVFIndex(self.embedding_dim, n_lists)
+            index.train(self._normalize_rows(sample))
+            for ids, vectors in self._iter_stored_embeddings():
+                index.add(ids, self._normalize_rows(vectors))
+            index.save(self.ann_index_path)
+            self.ann_index = index
+            logger.info("ANN index saved to '%s' (%s vectors).", self.ann_index_path, index.count)
+            return index
+
+    def ann_recall_report(self, n_queries=100, k=10, nprobe_values=(1, 2, 4, 8, 16, 32), seed=0):
+        """
+        Compares approximate against exact search on stored embeddings used as
+        queries. Returns one dict per nprobe with recall@k and mean latencies.
+        """
+        with self._write_lock, self._index_lock:
+            if not (self.ann_index and self.ann_index.is_trained):
+                logger.error("Cannot report: ANN index has not been built.")
+                return []
+            queries = self._normalize_rows(self._sample_stored_embeddings(n_queries, seed))
+            if len(queries) == 0:
+                return []
+
+            started = time.perf_counter()
+            exact = [set(self._exact_top_k(query, k)[0].tolist()) for query in queries]
+            exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+            report = []
+            for nprobe in nprobe_values:
+                started = time.perf_counter()
+                approx = [set(self.ann_index.search(query, k, nprobe)[0].tolist()) for query in queries]
+                approx_ms = (time.perf_counter() - started) * 1000 / len(queries)
+                recall = np.mean([
+                    len(found & truth) / max(1, len(truth)) for found, truth in zip(approx, exact)
+                ])
+                report.append({
+                    "nprobe": nprobe,
+                    "recall": float(recall),
+                    "exact_ms": exact_ms,
+                    "approx_ms": approx_ms,
+                    "speedup": exact_ms / approx_ms if approx_ms > 0 else float("inf"),
+                })
+            return report
+
+    def _build_results(self, ids, similarities, distance_threshold, sentences=None, conn=None):
+        """
+        Turns best-first (ids, similarities) into (file_path, sentence, location,
+        distance) rows, dropping those at or above the distance threshold. sentences may
+        hold the rows already fetched by _fetch_sentences; otherwise they are
+        read through conn.
+        """
+        distances = 1.0 - np.asarray(similarities)
+        keep = distances < distance_threshold
+        ids, distances = ids[keep], distances[keep]
+
+        if sentences is None:
+            sentences = self._fetch_sentences(ids, conn)
+        results = []
+        for row_id, distance in zip(ids, distances):
+            if int(row_id) in sentences:
+                results.append(sentences[int(row_id)] + (float(distance),))
+        return results
+
+    def _quantized_index_path(self, kind):
+        return os.path.splitext(self.db_path)[0] + f".{kind}.npz"
+
+    def _open_quantized_index(self):
+        """Loads the codes for the current quantized mode, building them if needed."""
+        if not self.conn:
+            return
+        path = self._quantized_index_path(self.search_mode)
+        index = None
+        if os.path.isfile(path):
+            try:
+                index = QuantizedIndex.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Could not load quantized index '%s': %s", path, e)
+            if index and index.quantizer.dim != self.embedding_dim:
+                logger.warning("Quantized index dimension does not match the database.")
+                index = None
+        if index is None:
+            self.build_quantized_index(self.search_mode)
+            return
+        self.quantized_index = index
+
+        row_count, max_id = self.cursor.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM sentences"
+        ).fetchone()
+        indexed_max_id = index.max_id()
+        if indexed_max_id < max_id:
+            for ids, vectors in self._iter_stored_embeddings(min_id=indexed_max_id):
+                index.add(ids, self._normalize_rows(vectors))
+        if index.count != row_count:
+            logger.info("Quantized index is out of sync with the database. Re-encoding all rows.")
+            index.reset()
+            for ids, vectors in self._iter_stored_embeddings():
+                index.add(ids, self._normalize_rows(vectors))
+
+    def _train_quantized_index(self, kind):
+        """Trains a codec of the given kind on a sample and encodes every stored row."""
+        sample = self._sample_stored_embeddings(Config.QUANT_TRAIN_SAMPLE)
+        if len(sample) == 0:
+            return None
+        quantizer = make_quantizer(kind, self.embedding_dim, Config.PQ_SUBVECTORS)
+        quantizer.train(self._normalize_rows(sample))
+        index = QuantizedIndex(quantizer)
+        for ids, vectors in self._iter_stored_embeddings():
+            index.add(ids, self._normalize_rows(vectors))
+        return index
+
+    def build_quantized_index(self, kind):
+        """Trains a "sq8" or "pq" codec, encodes all embeddings and saves the codes."""
+        with self._write_lock, self._index_lock:
+            if not self.conn:
+                logger.error("Cannot build index: Database connection not established.")
+                return None
+            logger.info("Training '%s' quantizer...", kind)
+            index = self._train_quantized_index(kind)
+            if index is None:
+                # Nothing to train on yet. quantized_index stays unset, so searches
+                # find nothing and the next one tries to build it again
+                logger.warning("No embeddings to train the quantizer on yet.")
+                return None
+            index.save(self._quantized_index_path(kind))
+            if kind == self.search_mode:
+                self.quantized_index = index
+            logger.info(
+                "Encoded %s embeddings with '%s' (%s bytes per vector).", index.count, kind, index.quantizer.code_size
+            )
+            return index
+
+    def _fetch_embeddings(self, ids, conn=None):
+        """Returns full-precision, unit-length vectors for the given ids, in the same order."""
+        conn = conn or self._reader()
+        found = {}
+        ids = [int(i) for i in ids]
+        for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            chunk = ids[start : start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            for row_id, blob in conn.execute(
+                f"SELECT id, embedding FROM sentences WHERE id IN ({placeholders})", chunk
+            ):
+                found[row_id] = decode_embedding(blob)
+        ids = [i for i in ids if i in found]
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.embedding_dim), dtype=EMBEDDING_DTYPE)
+        return np.array(ids, dtype=np.int64), self._normalize_rows(np.stack([found[i] for i in ids]))
+
+    def _rerank(self, query_vec, candidate_ids, k, conn=None):
+        """Re-scores candidates with full-precision vectors and keeps the best k."""
+        ids, vectors = self._fetch_embeddings(candidate_ids, conn)
+        similarities = vectors @ query_vec
+        order = np.argsort(-similarities, kind="stable")[:k]
+        return ids[order], similarities[order]
+
+    def quantization_report(self, n_queries=100, k=10, kinds=QUANTIZED_MODES, seed=0):
+        """
+        Trains each codec on the current data and compares it with exact search.
+        Returns one dict per codec with bytes per vector, compression ratio,
+        recall@k with and without re-ranking, and mean query time.
+        """
+        with self._write_lock, self._index_lock:
+            queries = self._normalize_rows(self._sample_stored_embeddings(n_queries, seed))
+            if len(queries) == 0:
+                return []
+            exact = [set(self._exact_top_k(query, k)[0].tolist()) for query in queries]
+            float_bytes = self.embedding_dim * EMBEDDING_DTYPE.itemsize
+
+            report = []
+            for kind in kinds:
+                index = self._train_quantized_index(kind)
+                code_size = index.quantizer.code_size
+                found, reranked = [], []
+                started = time.perf_counter()
+                for query in queries:
+                    found.append(set(index.search(query, k)[0].tolist()))
+                query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+                for query in queries:
+                    candidates, _ = index.search(query, k * max(1, Config.QUANT_RERANK_FACTOR))
+                    reranked.append(set(self._rerank(query, candidates, k)[0].tolist()))
+                report.append({
+                    "codec": kind,
+                    "bytes_per_vector": code_size,
+                    "compression": float_bytes / code_size,
+                    "recall": float(np.mean([len(f & t) / max(1, len(t)) for f, t in zip(found, exact)])),
+                    "recall_reranked": float(np.mean([len(f & t) / max(1, len(t)) for f, t in zip(reranked, exact)])),
+                    "query_ms": query_ms,
+                })
+            return report
 
     def close(self):
-        """Closes the database connection."""
-        if self.conn:
-            self.conn.close()
-            print("Database connection closed.")
+        """Closes the database connections."""
+        with self._write_lock, self._index_lock:
+            if self.vector_store:
+                self.vector_store.close()
+            if self.ann_index and self.ann_index.dirty:
+                self.ann_index.save(self.ann_index_path)
+            if self.quantized_index and self.quantized_index.dirty:
+                self.quantized_index.save(self._quantized_index_path(self.search_mode))
+            with self._readers_lock:
+                for conn in self._readers:
+                    conn.close()
+                self._readers.clear()
+            if self.conn:
+                self.conn.close()
+                logger.debug("Database connection closed.")
 
 
 # Example usage (for testing this module independently)
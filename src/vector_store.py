@@ -0,0 +1,190 @@
+import os
+import heapq
+import struct
+import numpy as np
+
+# File layout: a fixed-size header followed by append-only records of
+# (int64 sentence id, dim x float32 vector), all little-endian.
+# Removed rows are tombstoned by setting their id to 0.
+MAGIC = b"AIDSVEC\x00"
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct("<8sIIQQ")  # magic, version, dim, count, live
+HEADER_SIZE = 64
+
+DEFAULT_CHUNK_ROWS = 65536
+
+
+def record_dtype(dim):
+    """Returns the numpy record dtype for one stored row."""
+    return np.dtype([("id", "<i8"), ("vector", "<f4", (dim,))])
+
+
+class MmapVectorStore:
+    """
+    Append-only, memory-mapped float32 vector file.
+
+    Rows are addressed by sentence id and scanned in fixed-size chunks, so RAM
+    use is bounded by the chunk size rather than the corpus. The file is mapped
+    read-only for searching, so several search processes share the same OS
+    page cache instead of each holding a private copy.
+    """
+
+    def __init__(self, path, dim, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.path = path
+        self.dim = dim
+        self.chunk_rows = chunk_rows
+        self.dtype = record_dtype(dim)
+        self._map = None
+        self._map_count = 0
+
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            _, file_dim, _, _ = self._read_header()
+            if file_dim != dim:
+                raise ValueError(
+                    f"Vector store '{path}' has dimension {file_dim}, expected {dim}."
+                )
+        else:
+            self._create()
+
+    def _create(self):
+        """Creates an empty store file."""
+        with open(self.path, "wb") as f:
+            f.write(self._pack_header(0, 0))
+
+    def _pack_header(self, count, live):
+        header = HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, self.dim, count, live)
+        return header.ljust(HEADER_SIZE, b"\x00")
+
+    def _read_header(self):
+        """Returns (version, dim, count, live) from the file header."""
+        with open(self.path, "rb") as f:
+            magic, version, dim, count, live = HEADER_STRUCT.unpack(
+                f.read(HEADER_STRUCT.size)
+            )
+        if magic != MAGIC:
+            raise ValueError(f"'{self.path}' is not a vector store file.")
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported vector store version {version} in '{self.path}'."
+            )
+        return version, dim, count, live
+
+    @property
+    def count(self):
+        """Number of rows in the file, including tombstoned ones."""
+        return self._read_header()[2]
+
+    @property
+    def live_count(self):
+        """Number of rows that have not been removed."""
+        return self._read_header()[3]
+
+    def _records(self):
+        """Returns a read-only memory map over all rows, remapping after appends."""
+        count = self.count
+        if count == 0:
+            self._map, self._map_count = None, 0
+            return None
+        if self._map is None or self._map_count != count:
+            self._map = np.memmap(
+                self.path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,)
+            )
+            self._map_count = count
+        return self._map
+
+    def append(self, ids, vectors):
+        """Appends rows to the end of the file and publishes them in the header."""
+        vectors = np.asarray(vectors, dtype="<f4").reshape(-1, self.dim)
+        records = np.empty(len(vectors), dtype=self.dtype)
+        records["id"] = ids
+        records["vector"] = vectors
+
+        _, _, count, live = self._read_header()
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER_SIZE + count * self.dtype.itemsize)
+            f.write(records.tobytes())
+            f.flush()
+            # Rows become visible to readers only once the header count is updated
+            f.seek(0)
+            f.write(self._pack_header(count + len(records), live + len(records)))
+
+    def remove(self, ids):
+        """Tombstones the rows of the given sentence ids. Returns the number removed."""
+        records = self._records()
+        if records is None or len(ids) == 0:
+            return 0
+        ids = np.asarray(ids, dtype=np.int64)
+        removed = 0
+        with open(self.path, "r+b") as f:
+            for start in range(0, len(records), self.chunk_rows):
+                chunk_ids = np.asarray(records["id"][start : start + self.chunk_rows])
+                for offset in np.flatnonzero(np.isin(chunk_ids, ids)):
+                    f.seek(HEADER_SIZE + (start + int(offset)) * self.dtype.itemsize)
+                    f.write(np.int64(0).tobytes())
+                    removed += 1
+            if removed:
+                _, _, count, live = self._read_header()
+                f.seek(0)
+                f.write(self._pack_header(count, live - removed))
+        self._map = None
+        return removed
+
+    def clear(self):
+        """Removes all rows."""
+        self._map, self._map_count = None, 0
+        self._create()
+
+    def last_id(self):
+        """Returns the id of the last appended row, or 0 for an empty store."""
+        records = self._records()
+        if records is None:
+            return 0
+        return int(records["id"][-1])
+
+    def iter_chunks(self):
+        """Yields (ids, vectors) for consecutive chunks of live rows."""
+        records = self._records()
+        if records is None:
+            return
+        for start in range(0, len(records), self.chunk_rows):
+            chunk = records[start : start + self.chunk_rows]
+            ids = np.asarray(chunk["id"])
+            live = ids > 0
+            yield ids[live], np.asarray(chunk["vector"])[live]
+
+    def search(self, query_vec, k):
+        """
+        Scans the store chunk by chunk and returns (ids, similarities) of the
+        k rows with the highest dot product, best first.
+        """
+        records = self._records()
+        if records is None or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query_vec = np.asarray(query_vec, dtype="<f4")
+        heap = []  # (similarity, id) min-heap holding the best k so far
+        for start in range(0, len(records), self.chunk_rows):
+            chunk = records[start : start + self.chunk_rows]
+            chunk_ids = np.asarray(chunk["id"])
+            similarities = np.asarray(chunk["vector"]) @ query_vec
+            similarities[chunk_ids <= 0] = -np.inf
+
+            chunk_k = min(k, len(similarities))
+            top = np.argpartition(-similarities, chunk_k - 1)[:chunk_k]
+            for idx in top:
+                if similarities[idx] == -np.inf:
+                    continue
+                item = (float(similarities[idx]), int(chunk_ids[idx]))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        best = sorted(heap, reverse=True)
+        ids = np.array([row_id for _, row_id in best], dtype=np.int64)
+        similarities = np.array([sim for sim, _ in best], dtype=np.float32)
+        return ids, similarities
+
+    def close(self):
+        """Releases the memory map."""
+        self._map = None
@@ -0,0 +1,49 @@
+"""
+Cosine agreement of the ONNX backend with PyTorch, the same check as
+`python src/onnx_backend.py check`. Skipped when onnxruntime, onnx or the
+PyTorch stack is not installed (pip install -e .[onnx]); the first run
+downloads the model.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from importlib.util import find_spec
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from config import Config  # noqa: E402
+import onnx_backend  # noqa: E402
+
+REQUIRED_MODULES = ("onnxruntime", "onnx", "torch", "transformers", "sentence_transformers")
+MISSING_MODULES = [name for name in REQUIRED_MODULES if find_spec(name) is None]
+
+
+@unittest.skipIf(MISSING_MODULES, f"needs {', '.join(MISSING_MODULES)}")
+class OnnxAgreementTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model_dir = tempfile.mkdtemp(prefix="onnx_agreement_")
+        onnx_backend.export_onnx(Config.MODEL_NAME, cls.model_dir, quantize=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.model_dir, ignore_errors=True)
+
+    def assert_agrees(self, quantized):
+        cosines = onnx_backend.check_agreement(Config.MODEL_NAME, quantized=quantized, model_dir=self.model_dir)
+        self.assertEqual(len(cosines), len(onnx_backend.AGREEMENT_SENTENCES))
+        self.assertGreaterEqual(float(cosines.min()), onnx_backend.min_cosine_bound(quantized))
+
+    def test_fp32_matches_torch(self):
+        self.assert_agrees(quantized=False)
+
+    def test_int8_matches_torch(self):
+        self.assert_agrees(quantized=True)
+
+
+if __name__ == "__main__":
+    unittest.main()